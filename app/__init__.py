@@ -1,4 +1,5 @@
-from flask import Flask
+import hmac
+from flask import Flask, request
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from config import Config
@@ -22,6 +23,7 @@ def create_app(config_class=Config):
     from app.models.product import Product
     from app.models.user_memory import UserMemory
     from app.models.audit import AgentAudit
+    from app.models.agent_job import AgentJob
 
     # Set up basic logging
     logging.basicConfig(level=logging.INFO)
@@ -58,4 +60,18 @@ def create_app(config_class=Config):
     def health_check():
         return {"status": "healthy"}
 
+    from app.services.metrics_service import metrics
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics_snapshot():
+        # Provider health, per-agent cost and queue depths are operational data:
+        # served only to scrapers presenting METRICS_TOKEN, and not at all without one
+        expected = app.config.get("METRICS_TOKEN")
+        if not expected:
+            return {"message": "Not found"}, 404
+        supplied = request.headers.get("Authorization", "")
+        if not hmac.compare_digest(supplied.encode(), f"Bearer {expected}".encode()):
+            return {"message": "Invalid metrics token"}, 401
+        return metrics.snapshot()
+
     return app
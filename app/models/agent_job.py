@@ -0,0 +1,68 @@
+from app import db
+import uuid
+import datetime
+
+
+class AgentJob(db.Model):
+    """
+    Durable record of a queued agent turn (one user message awaiting a bot reply).
+
+    Lifecycle: PENDING → RUNNING → DONE, or back to PENDING for a retry, or
+    FAILED once attempts are exhausted.  `visible_at` is the visibility
+    timeout: a RUNNING job whose lease has expired is considered abandoned
+    (e.g. its worker crashed) and can be claimed again.
+    """
+
+    __tablename__ = "agent_jobs"
+    __table_args__ = (
+        db.Index("ix_agent_jobs_user_idempotency", "user_id", "idempotency_key"),
+        # At most one in-flight job per key: concurrent duplicate submissions
+        # cannot both be enqueued (the loser coalesces onto the winner)
+        db.Index(
+            "uq_agent_jobs_user_idempotency_in_flight", "user_id", "idempotency_key",
+            unique=True,
+            sqlite_where=db.text("status IN ('PENDING', 'RUNNING')"),
+            postgresql_where=db.text("status IN ('PENDING', 'RUNNING')"),
+        ),
+    )
+
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    conversation_id = db.Column(
+        db.String(36), db.ForeignKey("conversations.id"), nullable=False, index=True
+    )
+    user_id = db.Column(db.String(36), db.ForeignKey("users.id"), nullable=False, index=True)
+    # Client-supplied (or content-derived) key used to coalesce duplicate submissions
+    idempotency_key = db.Column(db.String(64))
+    # message, history and attachments for the turn
+    payload = db.Column(db.JSON, default=dict)
+    priority = db.Column(db.Integer, default=1)
+
+    status = db.Column(db.String(16), default=PENDING, nullable=False, index=True)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    max_attempts = db.Column(db.Integer, default=3, nullable=False)
+    visible_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, index=True)
+    locked_by = db.Column(db.String(64))
+    last_error = db.Column(db.Text)
+    # The bot message that answered this turn (set when the job is acked)
+    reply_message_id = db.Column(db.String(36), db.ForeignKey("messages.id"))
+
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "conversation_id": self.conversation_id,
+            "status": self.status,
+            "attempts": self.attempts,
+            "max_attempts": self.max_attempts,
+            "last_error": self.last_error,
+            "reply_message_id": self.reply_message_id,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
@@ -1,15 +1,40 @@
+import contextlib
+import hashlib
+import itertools
 import logging
+import os
 import threading
 from flask import Blueprint, request, jsonify, Response, current_app, stream_with_context
 from app import db
 from app.models.chat import Conversation, Message
+from app.models.user import User
 from app.utils.auth import token_required
 from app.services.llm_service import generate_ai_response, generate_suggested_questions
 from app.services.sse_service import sse_service
+from app.services.worker_pool import AgentWorkerPool, PoolSaturated, agent_pool
+from app.services.job_queue import DuplicateJob, job_queue, default_worker_id
 
 logger = logging.getLogger(__name__)
 bp = Blueprint("chat", __name__)
 
+# How long a synchronous caller waits on an externally-processed job
+SYNC_WAIT_TIMEOUT_S = 120
+
+# Per-user / per-conversation in-flight turn limits (429 + Retry-After when
+# exceeded).  A conversation allows 2 so a follow-up sent while the previous
+# reply is still generating is accepted.
+MAX_IN_FLIGHT_PER_USER = int(os.getenv("CHAT_MAX_IN_FLIGHT_PER_USER", "3"))
+MAX_IN_FLIGHT_PER_CONVERSATION = int(os.getenv("CHAT_MAX_IN_FLIGHT_PER_CONVERSATION", "2"))
+IN_FLIGHT_RETRY_AFTER_S = 2
+
+# How long an explicit Idempotency-Key replays/coalesces onto its original job
+IDEMPOTENCY_WINDOW_S = int(os.getenv("CHAT_IDEMPOTENCY_WINDOW_S", "600"))
+
+# job_id → Future for jobs scheduled by this process, so coalesced
+# synchronous duplicates can wait on the original run
+_in_flight_futures = {}
+_in_flight_lock = threading.Lock()
+
 
 # ---------------------------------------------------------------------------
 # Route: POST /message
@@ -22,7 +47,19 @@ def send_message(current_user):
     Accepts a user message, optionally streams the agent's reasoning via SSE.
 
     - stream=true  → returns 202 immediately; client polls GET /stream/<id>
-    - stream=false → waits for the thread to finish (synchronous, legacy mode)
+    - stream=false → waits for the agent task to finish (synchronous, legacy mode)
+
+    Every turn is persisted as a durable AgentJob before it runs, so a worker
+    restart never loses the reply.  In inline mode the job runs on the bounded
+    agent worker pool; when its backlog is full the request is refused with
+    503 + Retry-After.  In external mode standalone agent workers consume it.
+
+    Duplicate submissions are coalesced onto the original job (and its SSE
+    stream) via the Idempotency-Key header / idempotency_key field, or a
+    content-derived key while an identical turn is still in flight.  Users
+    and conversations are capped on concurrent in-flight turns: past the cap
+    the request is refused with 429 + Retry-After and nothing is persisted,
+    so the client can resend the same message after the delay.
     """
     data = request.get_json()
     if not data or not data.get("message"):
@@ -37,28 +74,73 @@ def send_message(current_user):
     logger.info("[Chat] Incoming message | user=%s conv=%s stream=%s multimodal=%s",
                 current_user.id, conversation_id, is_streaming, bool(attachments))
 
+    # Serialise this user's admissions until the turn's job is committed, so
+    # concurrent submissions cannot both pass the checks below
+    _lock_user_admissions(current_user.id)
+
+    # Coalesce duplicate submissions onto the original job
+    idempotency_key, explicit_key = _resolve_idempotency_key(
+        current_user.id, conversation_id, message_text, data
+    )
+    duplicate = job_queue.find_by_idempotency_key(
+        current_user.id, idempotency_key, IDEMPOTENCY_WINDOW_S, in_flight_only=not explicit_key
+    )
+    if duplicate:
+        return _coalesced_response(duplicate, is_streaming)
+
+    # Admission control — refuse before persisting anything if the pool is saturated
+    if not agent_pool.has_capacity():
+        return _saturated_response(agent_pool.retry_after())
+
     # Resolve or create the conversation
     conversation, error_response = _resolve_conversation(current_user, conversation_id)
     if error_response:
         return error_response
 
-    # Persist the user's message
-    _save_message(conversation.id, message_text, "user")
-
-    # Build history (excluding the message we just saved)
-    history = _load_history(conversation)
-
-    # Launch background agent thread
-    thread = _start_agent_thread(current_user, conversation, message_text, history)
+    # Per-user / per-conversation concurrency limits
+    limit_response = _check_in_flight_limits(current_user.id, conversation_id)
+    if limit_response:
+        db.session.rollback()  # discard a freshly flushed, unused conversation
+        return limit_response
+
+    # Reserve a worker slot before persisting anything, so a rejected turn
+    # never leaves an unanswered user message in the conversation
+    try:
+        slot = agent_pool.reserve() if job_queue.is_inline else None
+    except PoolSaturated as e:
+        db.session.rollback()
+        return _saturated_response(e.retry_after)
+
+    with slot or contextlib.nullcontext():
+        # Stage the user's message; it commits together with the job
+        _save_message(conversation.id, message_text, "user")
+
+        # Build history (excluding the message we just saved)
+        history = _load_history(conversation)
+
+        # Enqueue the agentic pipeline as a durable job
+        priority = (AgentWorkerPool.PRIORITY_STREAMING if is_streaming
+                    else AgentWorkerPool.PRIORITY_INTERACTIVE)
+        try:
+            job, future = _submit_agent_job(
+                current_user, conversation, message_text, history, attachments, priority,
+                idempotency_key=idempotency_key, stream=is_streaming, slot=slot,
+            )
+        except DuplicateJob as e:
+            # A concurrent duplicate won the enqueue; the message was rolled back with ours
+            return _coalesced_response(e.job, is_streaming)
 
     if is_streaming:
         logger.info("[Chat] Streaming mode — returning 202 | conv=%s", conversation.id)
-        return jsonify({"status": "accepted", "conversation_id": conversation.id}), 202
+        return jsonify({
+            "status": "accepted", "conversation_id": conversation.id, "job_id": job.id,
+        }), 202
 
-    # Synchronous (legacy) mode — wait for thread completion
-    logger.info("[Chat] Synchronous mode — waiting for agent thread | conv=%s", conversation.id)
-    thread.join()
-    return _build_sync_response(conversation.id)
+    # Synchronous (legacy) mode — wait for task completion
+    logger.info("[Chat] Synchronous mode — waiting for agent job | conv=%s job=%s",
+                conversation.id, job.id)
+    _wait_for_job(job.id, future)
+    return _build_sync_response(job.id)
 
 
 # ---------------------------------------------------------------------------
@@ -119,85 +201,271 @@ def _resolve_conversation(current_user, conversation_id):
 
 
 def _save_message(conversation_id, content, msg_type):
-    """Persists a single message and commits the session."""
+    """Adds a single message to the session; it is committed with the turn's job."""
     message = Message(conversation_id=conversation_id, content=content, type=msg_type)
     db.session.add(message)
-    db.session.commit()
-    logger.debug("[Chat] Saved %s message | conv=%s", msg_type, conversation_id)
+    logger.debug("[Chat] Staged %s message | conv=%s", msg_type, conversation_id)
     return message
 
 
 def _load_history(conversation, limit=20):
     """
     Loads the N most recent messages, excluding the last one
-    (which is the message the user just sent).
+    (which is the message the user just sent).  The ContextBudgeter fits
+    them into each LLM call's token budget.
     """
-    messages = conversation.messages.order_by(Message.timestamp).limit(limit).all()
-    history = [msg.to_dict() for msg in messages][:-1]
+    messages = conversation.messages.order_by(Message.timestamp.desc()).limit(limit).all()
+    history = [msg.to_dict() for msg in reversed(messages)][:-1]
     logger.debug("[Chat] Loaded %d history messages | conv=%s", len(history), conversation.id)
     return history
 
 
-def _build_sync_response(conversation_id):
-    """Builds the JSON response for synchronous (non-streaming) callers."""
-    latest = (
-        Message.query
-        .filter_by(conversation_id=conversation_id, type="bot")
-        .order_by(Message.timestamp.desc())
-        .first()
-    )
+def _build_sync_response(job_id):
+    """
+    Builds the JSON response for synchronous (non-streaming) callers from the
+    reply recorded on the job — not the newest bot message, which may belong
+    to another turn of the same conversation.
+    """
+    db.session.expire_all()  # the reply was committed by a worker's session
+    job = job_queue.get(job_id)
+    reply = db.session.get(Message, job.reply_message_id) if job.reply_message_id else None
     return jsonify({
         "message": {
-            "id": latest.id if latest else None,
-            "content": latest.content if latest else "Processing failed or timed out",
+            "id": reply.id if reply else None,
+            "content": reply.content if reply else "Processing failed or timed out",
             "type": "bot",
-            "timestamp": latest.timestamp.isoformat() if latest else None,
+            "timestamp": reply.timestamp.isoformat() if reply else None,
         },
-        "conversation_id": conversation_id,
+        "conversation_id": job.conversation_id,
+    })
+
+
+def _resolve_idempotency_key(user_id, conversation_id, message_text, data):
+    """
+    Returns (key, explicit).  Explicit keys come from the Idempotency-Key
+    header or the idempotency_key body field; otherwise the key is derived
+    from the user, target conversation and message text.
+    """
+    explicit = request.headers.get("Idempotency-Key") or data.get("idempotency_key")
+    if explicit:
+        return hashlib.sha256(f"key:{explicit}".encode()).hexdigest(), True
+    fingerprint = f"msg:{user_id}:{conversation_id or ''}:{message_text}"
+    return hashlib.sha256(fingerprint.encode()).hexdigest(), False
+
+
+def _coalesced_response(job, is_streaming):
+    """Attaches a duplicate submission to the original job instead of running it again."""
+    logger.info("[Chat] Duplicate submission coalesced | job=%s conv=%s status=%s",
+                job.id, job.conversation_id, job.status)
+    db.session.rollback()  # nothing to persist; releases the admission lock before any wait
+    if is_streaming:
+        return jsonify({
+            "status": "accepted" if job.status != job.DONE else "completed",
+            "conversation_id": job.conversation_id,
+            "job_id": job.id,
+            "coalesced": True,
+        }), 202
+
+    if job.status != job.DONE:
+        with _in_flight_lock:
+            future = _in_flight_futures.get(job.id)
+        _wait_for_job(job.id, future)
+    return _build_sync_response(job.id)
+
+
+def _lock_user_admissions(user_id):
+    """
+    Row-locks the user (SELECT ... FOR UPDATE) for the rest of the admission
+    transaction, making the duplicate and in-flight checks atomic with the
+    enqueue.  SQLite ignores FOR UPDATE; duplicates are still stopped there
+    by the job table's unique in-flight index.
+    """
+    db.session.execute(db.select(User.id).where(User.id == user_id).with_for_update())
+
+
+def _check_in_flight_limits(user_id, conversation_id):
+    """Returns a 429 response if the user or conversation has too many turns in flight."""
+    if job_queue.count_in_flight(user_id=user_id) >= MAX_IN_FLIGHT_PER_USER:
+        scope = "user"
+    elif conversation_id and \
+            job_queue.count_in_flight(conversation_id=conversation_id) >= MAX_IN_FLIGHT_PER_CONVERSATION:
+        scope = "conversation"
+    else:
+        return None
+
+    logger.warning("[Chat] In-flight limit reached | scope=%s user=%s conv=%s",
+                   scope, user_id, conversation_id)
+    response = jsonify({
+        "message": "A previous message is still being processed. Please wait for its reply.",
+        "retry_after": IN_FLIGHT_RETRY_AFTER_S,
     })
+    response.status_code = 429
+    response.headers["Retry-After"] = str(IN_FLIGHT_RETRY_AFTER_S)
+    return response
+
+
+def _wait_for_job(job_id, future=None):
+    """Blocks a synchronous caller until the job finishes (in-process Future or DB polling)."""
+    if future is not None:
+        future.result()
+    else:
+        job_queue.wait(job_id, timeout=SYNC_WAIT_TIMEOUT_S)
+
+
+def _saturated_response(retry_after):
+    """503 + Retry-After returned when the agent worker pool is at capacity."""
+    logger.warning("[Chat] Agent pool saturated — shedding request | retry_after=%ss", retry_after)
+    response = jsonify({
+        "message": "RetireIQ is handling a high volume of requests. Please retry shortly.",
+        "retry_after": retry_after,
+    })
+    response.status_code = 503
+    response.headers["Retry-After"] = str(retry_after)
+    return response
 
 
 # ---------------------------------------------------------------------------
 # Private — Background task
 # ---------------------------------------------------------------------------
 
-def _start_agent_thread(current_user, conversation, message_text, history, attachments=None):
-    """Spawns the background thread that runs the full agentic pipeline."""
-    thread = threading.Thread(
-        target=_run_agent_task,
-        args=(
-            current_app.app_context(),
-            current_user.to_dict(),
-            message_text,
-            history,
-            conversation.id,
-            attachments
-        ),
-        daemon=True,
+def _submit_agent_job(current_user, conversation, message_text, history, attachments=None,
+                      priority=AgentWorkerPool.PRIORITY_STREAMING, idempotency_key=None,
+                      stream=False, slot=None):
+    """
+    Persists the turn as an AgentJob and, in inline mode, schedules it on the
+    agent worker pool (on the reserved slot when one is given, so scheduling
+    cannot be refused).  Returns (job, future); future is None when external
+    workers consume the queue.  stream=True makes the worker publish "token"
+    SSE events as the answer is generated.
+    """
+    payload = {"message": message_text, "history": history, "attachments": attachments, "stream": stream}
+    job = job_queue.enqueue(
+        conversation.id, current_user.id, payload,
+        priority=priority, lease=job_queue.is_inline, idempotency_key=idempotency_key,
     )
-    thread.start()
-    logger.debug("[Chat] Agent thread started | conv=%s", conversation.id)
-    return thread
+    if not job_queue.is_inline:
+        logger.debug("[Chat] Agent job queued for external workers | conv=%s job=%s",
+                     conversation.id, job.id)
+        return job, None
+
+    _ensure_job_poller()
+    try:
+        future = (slot or agent_pool).submit(
+            _run_agent_job, current_app.app_context(), job.id, priority=priority,
+        )
+    except PoolSaturated:
+        job_queue.cancel(job.id, "Rejected: agent worker pool saturated")
+        raise
+    _track_future(job.id, future)
+    logger.debug("[Chat] Agent job scheduled | conv=%s job=%s priority=%d",
+                 conversation.id, job.id, priority)
+    return job, future
+
+
+def _track_future(job_id, future):
+    """Registers an in-process Future so coalesced duplicates can wait on it."""
+    with _in_flight_lock:
+        _in_flight_futures[job_id] = future
+
+    def _forget(_):
+        with _in_flight_lock:
+            _in_flight_futures.pop(job_id, None)
+
+    future.add_done_callback(_forget)
+
+
+def start_job_poller(app):
+    """
+    Starts the in-process poller that recovers retried and abandoned jobs
+    (inline mode).  Called at process start-up (gunicorn post_worker_init,
+    run.py) so jobs left behind by a restart are picked up without waiting
+    for new traffic; a no-op if it is already running.
+    """
+    if app.testing or not job_queue.is_inline:
+        return
+    job_queue.ensure_poller(app, _schedule_recovered_job, can_claim=agent_pool.has_capacity)
+
+
+def _ensure_job_poller():
+    """Safety net for processes started without start_job_poller()."""
+    start_job_poller(current_app._get_current_object())
 
 
-def _run_agent_task(app_context, user_dict, msg_text, history, conv_id, attachments):
+def _schedule_recovered_job(job):
+    """Poller handler: hands an already-claimed job (and its lease) to the worker pool."""
+    try:
+        agent_pool.submit(
+            _run_agent_job, current_app.app_context(), job.id, lease=job_queue.lease(job),
+            priority=job.priority if job.priority is not None else AgentWorkerPool.PRIORITY_STREAMING,
+        )
+    except PoolSaturated:
+        job_queue.release(job.id)
+
+
+def _run_agent_job(app_context, job_id, lease=None):
     """
-    Background thread target.  Runs inside the Flask app context.
+    Worker pool task.  Runs inside the Flask app context.
+    Claims the job (unless the poller already did, passing its lease) and executes it.
     """
     with app_context:
-        logger.info("[AgentTask] Starting background task | conv=%s", conv_id)
-        try:
-            ai_response = _invoke_agent(user_dict, msg_text, history, conv_id, attachments)
-            bot_message = _persist_bot_response(conv_id, ai_response)
-            _broadcast_final_response(conv_id, ai_response, bot_message.id)
-            _trigger_memory_summarization(user_dict, conv_id)
-        except Exception as e:
-            logger.error("[AgentTask] Unhandled exception in background task: %s | conv=%s",
-                         e, conv_id, exc_info=True)
+        if lease is None:
+            job = job_queue.claim(default_worker_id(), job_id=job_id)
+        else:
+            job = job_queue.get(job_id)
+            if job is not None and job_queue.lease(job) != lease:
+                job = None  # the poller's lease expired while the task was queued
+        if job is None:
+            logger.info("[AgentTask] Job already claimed elsewhere; skipping | job=%s", job_id)
+            return
+        execute_agent_job(job, lease=lease)
+
+
+def execute_agent_job(job, lease=None):
+    """
+    Runs one claimed AgentJob end-to-end: pipeline → persist + ack → broadcast.
+    Shared by the in-process pool and scripts/run_agent_worker.py; must be
+    called inside an app context, straight after the claim (or with the
+    claim's lease).  Only failures before the reply is committed re-queue
+    the job; the ack is fenced on the lease, so a worker whose lease expired
+    discards its reply instead of posting a second one.
+    """
+    conv_id = job.conversation_id
+    payload = job.payload or {}
+    lease = lease or job_queue.lease(job)
+    logger.info("[AgentTask] Starting agent job | conv=%s job=%s attempt=%d",
+                conv_id, job.id, lease.attempt)
+    try:
+        user = db.session.get(User, job.user_id)
+        user_dict = user.to_dict() if user else {"id": job.user_id}
+        on_token = _token_publisher(conv_id, job) if payload.get("stream") else None
+        # Renew the lease while the pipeline runs, so a slow turn is not re-claimed
+        with job_queue.keep_alive(job.id, lease):
+            ai_response = _invoke_agent(
+                user_dict, payload.get("message", ""), payload.get("history") or [],
+                conv_id, payload.get("attachments"), on_token=on_token,
+            )
+        bot_message = _persist_bot_response(conv_id, ai_response, job_id=job.id, lease=lease)
+    except Exception as e:
+        logger.error("[AgentTask] Unhandled exception in agent job: %s | conv=%s job=%s",
+                     e, conv_id, job.id, exc_info=True)
+        db.session.rollback()
+        if not job_queue.fail(job.id, lease, e):
             sse_service.publish(session_id=conv_id, event="error", data={"message": str(e)})
+        return
+
+    if bot_message is None:
+        return  # lease lost — the job's current holder delivers the reply
+
+    # The reply is committed and the job acked; nothing past this point may re-run the turn
+    try:
+        _broadcast_final_response(conv_id, ai_response, bot_message.id)
+        _trigger_memory_summarization(user_dict, conv_id)
+    except Exception as e:
+        logger.error("[AgentTask] Post-reply step failed (reply already saved): %s | conv=%s job=%s",
+                     e, conv_id, job.id, exc_info=True)
 
 
-def _invoke_agent(user_dict, msg_text, history, conv_id, attachments):
+def _invoke_agent(user_dict, msg_text, history, conv_id, attachments, on_token=None):
     """Calls the full agentic pipeline and returns the final response string."""
     logger.info("[AgentTask] Invoking agentic pipeline | conv=%s", conv_id)
     from app.services.llm_service import generate_ai_response
@@ -206,16 +474,48 @@ def _invoke_agent(user_dict, msg_text, history, conv_id, attachments):
         user_profile=user_dict,
         conversation_history=history,
         conversation_id=conv_id,
-        attachments=attachments
+        attachments=attachments,
+        on_token=on_token,
     )
     logger.info("[AgentTask] Agentic pipeline complete | conv=%s", conv_id)
     return response
 
 
-def _persist_bot_response(conv_id, response_text):
-    """Writes the bot's final answer to the database and returns the Message object."""
+def _token_publisher(conv_id, job):
+    """
+    Returns an on_token callback that publishes each text delta as a "token"
+    SSE event.  Events carry the job id, attempt and a running index so a
+    client can discard partial output from a failed attempt when a retry
+    starts streaming again.
+    """
+    index = itertools.count()
+    job_id, attempt = job.id, job.attempts
+
+    def _publish(delta):
+        sse_service.publish(
+            session_id=conv_id,
+            event="token",
+            data={"delta": delta, "index": next(index), "job_id": job_id, "attempt": attempt},
+        )
+
+    return _publish
+
+
+def _persist_bot_response(conv_id, response_text, job_id=None, lease=None):
+    """
+    Writes the bot's final answer to the database and returns the Message object.
+    When job_id is given the job is acked under lease in the same transaction,
+    so a crash can never leave a persisted reply with a job that will be
+    retried.  Returns None (persisting nothing) if the lease was lost.
+    """
     bot_message = Message(conversation_id=conv_id, content=response_text, type="bot")
     db.session.add(bot_message)
+    db.session.flush()
+    if job_id and not job_queue.complete(job_id, lease, commit=False, reply_message_id=bot_message.id):
+        db.session.rollback()
+        logger.warning("[AgentTask] Lease lost before ack — discarding reply | conv=%s job=%s",
+                       conv_id, job_id)
+        return None
     db.session.commit()
     logger.debug("[AgentTask] Bot message persisted | id=%s conv=%s", bot_message.id, conv_id)
     return bot_message
@@ -232,8 +532,17 @@ def _broadcast_final_response(conv_id, response_text, message_id):
 
 
 def _trigger_memory_summarization(user_dict, conv_id):
-    """Fires the background memory summarisation task (non-blocking)."""
+    """
+    Queues the memory summarisation task at background priority (non-blocking).
+    Skipped when the pool is saturated — interactive turns take precedence.
+    """
     from app.services.memory_service import summarize_into_facts
     user_id = user_dict.get("id")
     logger.debug("[AgentTask] Triggering memory summarization | user=%s conv=%s", user_id, conv_id)
-    summarize_into_facts(user_id, conv_id)
+    try:
+        agent_pool.submit(
+            summarize_into_facts, user_id, conv_id,
+            priority=AgentWorkerPool.PRIORITY_BACKGROUND,
+        )
+    except PoolSaturated:
+        logger.warning("[AgentTask] Pool saturated — skipping memory summarization | conv=%s", conv_id)
@@ -0,0 +1,132 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import functools
+import logging
+import threading
+from flask import current_app, has_app_context
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundLoop:
+    """
+    The Async Runtime (The Conductor).
+
+    One long-lived asyncio event loop on a daemon thread that synchronous
+    code (Flask views, pool workers) can hand coroutines to.  Keeping a
+    single loop alive matters: async provider clients and their connection
+    pools are bound to the loop that created them, so a fresh asyncio.run()
+    per call would rebuild them every time.
+    """
+
+    def __init__(self, name="async-runtime"):
+        self.name = name
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    # -----------------------------------------------------------------------
+    # Public API
+    # -----------------------------------------------------------------------
+
+    def run(self, coro, timeout=None):
+        """
+        Runs coro on the background loop and blocks for its result.  The
+        caller's context variables (e.g. the Flask app context) are carried
+        into the task.  Raises TimeoutError (and cancels the task) if timeout
+        elapses.
+        """
+        loop = self._ensure_loop()
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("BackgroundLoop.run() called from the loop thread; await the coroutine instead")
+
+        context = contextvars.copy_context()
+        result = concurrent.futures.Future()
+        task_holder = {}
+
+        def _start():
+            task = loop.create_task(coro, context=context)
+            task_holder["task"] = task
+            task.add_done_callback(lambda t: _transfer(t, result))
+
+        loop.call_soon_threadsafe(_start)
+        try:
+            return result.result(timeout)
+        except concurrent.futures.TimeoutError:
+            loop.call_soon_threadsafe(lambda: task_holder.get("task") and task_holder["task"].cancel())
+            raise TimeoutError(f"Coroutine did not finish within {timeout}s")
+
+    @property
+    def loop(self):
+        return self._ensure_loop()
+
+    def shutdown(self):
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop:
+            loop.call_soon_threadsafe(loop.stop)
+
+    # -----------------------------------------------------------------------
+    # Private
+    # -----------------------------------------------------------------------
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                ready = threading.Event()
+
+                def _serve():
+                    self._loop = asyncio.new_event_loop()
+                    asyncio.set_event_loop(self._loop)
+                    ready.set()
+                    self._loop.run_forever()
+
+                self._thread = threading.Thread(target=_serve, name=self.name, daemon=True)
+                self._thread.start()
+                ready.wait()
+                logger.info("[AsyncRuntime] Event loop started | thread=%s", self.name)
+            return self._loop
+
+
+def _transfer(task, future):
+    if task.cancelled():
+        future.cancel()
+    elif task.exception() is not None:
+        future.set_exception(task.exception())
+    else:
+        future.set_result(task.result())
+
+
+# Single global instance — shared by every sync-to-async bridge
+background_loop = BackgroundLoop()
+
+
+def run_sync(coro, timeout=None):
+    """Blocking bridge from synchronous code into the shared event loop."""
+    return background_loop.run(coro, timeout=timeout)
+
+
+def in_own_app_context(fn):
+    """
+    Wraps fn to run in a fresh app context when the caller has one.  Work
+    handed to another thread copies the caller's context variables, and
+    Flask-SQLAlchemy scopes db.session by app context, so without this the
+    thread would write through the caller's Session.
+    """
+    if not has_app_context():
+        return fn
+    app = current_app._get_current_object()
+
+    @functools.wraps(fn)
+    def _run(*args, **kwargs):
+        with app.app_context():
+            return fn(*args, **kwargs)
+
+    return _run
+
+
+async def to_thread(fn, *args, **kwargs):
+    """asyncio.to_thread() for database work: fn gets its own app context and db.session."""
+    return await asyncio.to_thread(in_own_app_context(fn), *args, **kwargs)
@@ -0,0 +1,216 @@
+import hashlib
+import logging
+import os
+import re
+from collections import OrderedDict
+from threading import Lock
+from app.services.metrics_service import Histogram, metrics
+from app.utils.lazy import lazy_import
+
+logger = logging.getLogger(__name__)
+
+# Optional exact tokenizer for OpenAI-family models; a character heuristic is used without it
+tiktoken = lazy_import("tiktoken")
+
+SUMMARY_HEADER = "Summary of earlier turns in this conversation (oldest first):"
+
+
+class ContextBudgeter:
+    """
+    The Context Budgeter (The Editor).
+
+    Fits conversation history into a per-call token budget before it is
+    sent to a provider, so prompt size and latency stay flat as a
+    conversation grows:
+
+      1. The system prompt and the new message are always sent; the rest
+         of LLM_CONTEXT_BUDGET_TOKENS is available for history.
+      2. The most recent LLM_CONTEXT_KEEP_MESSAGES messages are kept
+         verbatim, newest first, while they fit.
+      3. Everything older (and any recent message that does not fit) is
+         replaced by one rolling summary message: each turn is compressed
+         to a short line once, cached by content, and the newest lines that
+         fit the remaining budget are kept.
+
+    Tokens are counted with tiktoken for OpenAI/Azure models when it is
+    installed, otherwise at ~4 characters per token.
+    """
+
+    MESSAGE_OVERHEAD_TOKENS = 4  # role and separators per chat message
+
+    def __init__(self):
+        self.enabled = os.getenv("LLM_CONTEXT_BUDGET_ENABLED", "true").lower() == "true"
+        self.budget_tokens = int(os.getenv("LLM_CONTEXT_BUDGET_TOKENS", "6000"))
+        self.keep_messages = int(os.getenv("LLM_CONTEXT_KEEP_MESSAGES", "6"))
+        self.summary_line_tokens = int(os.getenv("LLM_CONTEXT_SUMMARY_LINE_TOKENS", "40"))
+        self.summary_max_tokens = int(os.getenv("LLM_CONTEXT_SUMMARY_MAX_TOKENS", "600"))
+        self.cache_max_entries = int(os.getenv("LLM_CONTEXT_SUMMARY_CACHE_MAX_ENTRIES", "4096"))
+
+        self._summaries = OrderedDict()  # content hash -> compressed line
+        self._encodings = {}
+        self._lock = Lock()
+        self._counters = {"fits": 0, "compacted": 0, "summarised_messages": 0,
+                          "summary_hits": 0, "summary_misses": 0, "tokens_saved": 0}
+        self._prompt_tokens = Histogram((500, 1000, 2000, 4000, 8000, 16000, 32000))
+        logger.info("[ContextBudget] Initialised | enabled=%s budget=%d keep=%d",
+                    self.enabled, self.budget_tokens, self.keep_messages)
+
+    # -----------------------------------------------------------------------
+    # Public API
+    # -----------------------------------------------------------------------
+
+    def count_tokens(self, text, provider=None, model=None):
+        """Token count of text for the given provider/model."""
+        if not text:
+            return 0
+        encoding = self._encoding(provider, model)
+        if encoding is not None:
+            return len(encoding.encode(text, disallowed_special=()))
+        return len(text) // 4 + 1
+
+    def fit(self, history, system_prompt, message, provider=None, model=None, budget_tokens=None):
+        """
+        Returns history (list of {"type", "content"} dicts, oldest first)
+        trimmed to the budget.  Older turns come back as a single
+        {"type": "summary"} entry at the front.
+        """
+        history = history or []
+        if not self.enabled or not history:
+            return history
+
+        budget = budget_tokens or self.budget_tokens
+
+        def count(text):
+            return self.count_tokens(text, provider, model) + self.MESSAGE_OVERHEAD_TOKENS
+
+        available = budget - count(system_prompt) - count(message)
+        original = sum(count(msg.get("content", "")) for msg in history)
+
+        kept, remaining = [], available
+        for index in range(len(history) - 1, -1, -1):
+            if len(kept) >= self.keep_messages:
+                break
+            cost = count(history[index].get("content", ""))
+            if cost > remaining:
+                break
+            kept.append(history[index])
+            remaining -= cost
+        kept.reverse()
+        older = history[:len(history) - len(kept)]
+
+        fitted = kept
+        if older:
+            summary = self._summary(older, provider, model, remaining - self.MESSAGE_OVERHEAD_TOKENS)
+            if summary:
+                fitted = [{"type": "summary", "content": summary}] + kept
+
+        final = sum(count(msg["content"]) for msg in fitted)
+        self._prompt_tokens.observe(budget - available + final)
+        with self._lock:
+            self._counters["fits"] += 1
+            if older:
+                self._counters["compacted"] += 1
+                self._counters["summarised_messages"] += len(older)
+                self._counters["tokens_saved"] += max(0, original - final)
+        if older:
+            logger.debug("[ContextBudget] Compacted history | kept=%d summarised=%d tokens %d -> %d",
+                         len(kept), len(older), original, final)
+        return fitted
+
+    def reset(self):
+        with self._lock:
+            self._summaries.clear()
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            cached = len(self._summaries)
+        return {
+            "enabled": self.enabled,
+            "budget_tokens": self.budget_tokens,
+            "summary_cache_size": cached,
+            **counters,
+            "prompt_tokens": self._prompt_tokens.snapshot(),
+        }
+
+    # -----------------------------------------------------------------------
+    # Private — Rolling summary
+    # -----------------------------------------------------------------------
+
+    def _summary(self, older, provider, model, budget):
+        """Newest compressed lines that fit min(budget, summary_max_tokens), oldest first."""
+        budget = min(budget, self.summary_max_tokens) - self.count_tokens(SUMMARY_HEADER, provider, model)
+        lines = []
+        for msg in reversed(older):
+            line = self._compressed(msg)
+            cost = self.count_tokens(line, provider, model) + 1
+            if cost > budget:
+                break
+            lines.append(line)
+            budget -= cost
+        if not lines:
+            return None
+        return "\n".join([SUMMARY_HEADER] + lines[::-1])
+
+    def _compressed(self, msg):
+        """One short line per turn, computed once per distinct message."""
+        speaker = "User" if msg.get("type") == "user" else "Assistant"
+        content = msg.get("content", "")
+        key = hashlib.sha256(f"{speaker}\0{content}".encode("utf-8")).hexdigest()
+        with self._lock:
+            line = self._summaries.get(key)
+            if line is not None:
+                self._summaries.move_to_end(key)
+                self._counters["summary_hits"] += 1
+                return line
+            self._counters["summary_misses"] += 1
+
+        line = f"- {speaker}: {self._clip(content)}"
+        with self._lock:
+            self._summaries[key] = line
+            while len(self._summaries) > self.cache_max_entries:
+                self._summaries.popitem(last=False)
+        return line
+
+    def _clip(self, text):
+        """Leading sentences up to ~summary_line_tokens, cut on a word boundary."""
+        text = re.sub(r"\s+", " ", text).strip()
+        limit = self.summary_line_tokens * 4
+        if len(text) <= limit:
+            return text
+        sentences = re.split(r"(?<=[.!?])\s", text)
+        clipped = sentences[0]
+        for sentence in sentences[1:]:
+            if len(clipped) + 1 + len(sentence) > limit:
+                break
+            clipped = f"{clipped} {sentence}"
+        if len(clipped) > limit:
+            clipped = clipped[:limit].rsplit(" ", 1)[0]
+        return f"{clipped} …"
+
+    # -----------------------------------------------------------------------
+    # Private — Tokenizers
+    # -----------------------------------------------------------------------
+
+    def _encoding(self, provider, model):
+        if provider not in ("openai", "azure_openai") or not tiktoken:
+            return None
+        with self._lock:
+            if model in self._encodings:
+                return self._encodings[model]
+        try:
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                encoding = tiktoken.get_encoding("o200k_base")
+        except Exception as e:  # BPE files unavailable (offline build)
+            logger.warning("[ContextBudget] tiktoken unavailable for %s (%s); estimating tokens", model, e)
+            encoding = None
+        with self._lock:
+            self._encodings[model] = encoding
+        return encoding
+
+
+# Single global instance — shared by the general LLM path and the Dispatcher's classifier
+context_budgeter = ContextBudgeter()
+metrics.register_collector("context_budget", context_budgeter.stats)
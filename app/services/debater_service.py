@@ -1,9 +1,10 @@
+import asyncio
 import os
 import logging
 import json
-import threading
 from typing import List, Dict, Any, Optional
 from app.services.audit_service import historian
+from app.services.llm_telemetry import llm_telemetry
 
 logger = logging.getLogger(__name__)
 
@@ -44,44 +45,50 @@ class DebaterAgent:
         
         return consensus
 
+    VIEWPOINT_TIMEOUT_S = float(os.getenv("DEBATE_VIEWPOINT_TIMEOUT_S", "20"))
+
     def _gather_viewpoints(self, scenario: str, profile: Dict[str, Any], conv_id: str) -> List[Dict[str, str]]:
         """
-        Calls 3 models concurrently.
+        Calls 3 models concurrently (blocking wrapper around _agather_viewpoints).
+        """
+        from app.services.async_runtime import run_sync
+        responses = run_sync(self._agather_viewpoints(scenario, profile, conv_id))
+        # Logged here rather than on the event loop so the write uses this thread's db.session
+        self._log_observation(conv_id, f"Gathered {len(responses)} viewpoints for ensemble moderation.")
+        return responses
+
+    async def _agather_viewpoints(self, scenario: str, profile: Dict[str, Any], conv_id: str) -> List[Dict[str, str]]:
+        """
+        Calls 3 models concurrently on the event loop.  Each viewpoint is
+        bounded by VIEWPOINT_TIMEOUT_S; slow or failing models are dropped
+        rather than holding up the debate.
         """
         from app.services import llm_service
-        responses = []
-        threads = []
+        prompt = f"Analyze this high-stakes retirement scenario for user {profile.get('first_name', 'Client')}: {scenario}. Provide a definitive recommendation."
 
-        def call_model(name, provider, model, func):
+        async def call_model(name, provider, model, func):
             logger.info("[Debater] Calling %s viewpoint...", name)
-            prompt = f"Analyze this high-stakes retirement scenario for user {profile.get('first_name', 'Client')}: {scenario}. Provide a definitive recommendation."
-            
             try:
                 if provider == "vertex_ai":
-                    res = func(prompt, model_name=model)
+                    call = func(prompt, model_name=model)
                 else:
                     messages = [{"role": "system", "content": "You are a professional financial advisor."}, {"role": "user", "content": prompt}]
-                    res = func(messages, model, 0.7)
-                responses.append({"model": name, "opinion": res})
+                    call = func(messages, model, 0.7)
+                res = await asyncio.wait_for(call, timeout=self.VIEWPOINT_TIMEOUT_S)
+                return {"model": name, "opinion": res}
             except Exception as e:
-                logger.error("[Debater] Model %s failed: %s", name, e)
+                logger.error("[Debater] Model %s failed: %s", name, e or type(e).__name__)
+                return None
 
         models = [
-            ("Model A (Gemini)", "vertex_ai", "gemini-1.5-pro", llm_service.call_vertex_ai_api),
-            ("Model B (GPT-4)", "openai", "gpt-4o", llm_service.call_openai_api),
-            ("Model C (Llama)", "ollama", "llama3", llm_service.call_ollama_api)
+            ("Model A (Gemini)", "vertex_ai", "gemini-1.5-pro", llm_service.acall_vertex_ai_api),
+            ("Model B (GPT-4)", "openai", "gpt-4o", llm_service.acall_openai_api),
+            ("Model C (Llama)", "ollama", "llama3", llm_service.acall_ollama_api)
         ]
 
-        for name, prov, mdl, fn in models:
-            t = threading.Thread(target=call_model, args=(name, prov, mdl, fn))
-            t.start()
-            threads.append(t)
-
-        for t in threads:
-            t.join(timeout=20)
-
-        self._log_observation(conv_id, f"Gathered {len(responses)} viewpoints for ensemble moderation.")
-        return responses
+        with llm_telemetry.tag(agent="Debater", session_id=conv_id):
+            results = await asyncio.gather(*(call_model(*m) for m in models))
+        return [r for r in results if r]
 
     def _moderate_consensus(self, scenario: str, results: List[Dict[str, str]], authority: Dict[str, Any], conv_id: str) -> str:
         """
@@ -114,7 +121,8 @@ class DebaterAgent:
         self._log_thought(conv_id, f"Moderating viewpoints. Ensuring {authority['primary']} is given priority for this domain.")
 
         # Use Flash for moderation
-        moderation_result = llm_service.call_vertex_ai_api(moderator_prompt, model_name="gemini-1.5-flash")
+        with llm_telemetry.tag(agent="Debater", session_id=conv_id):
+            moderation_result = llm_service.call_vertex_ai_api(moderator_prompt, model_name="gemini-1.5-flash")
         
         self._log_observation(conv_id, "Consensus finalized with weighted authority profiles.")
         return moderation_result
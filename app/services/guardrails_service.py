@@ -4,6 +4,9 @@ import json
 import re
 import logging
 from typing import Optional, Dict, Any
+from app.services.llm_telemetry import llm_telemetry
+from app.services.rate_governor import rate_governor
+from app.utils.lazy import register_warmup
 
 logger = logging.getLogger(__name__)
 
@@ -22,9 +25,26 @@ class GuardrailsService:
 
     def __init__(self):
         self._is_enabled = True
-        self.instructions = self._load_instructions()
-        self.refusal_map = self._load_refusal_map()
-        logger.info("[The Shield 2.0] Hybrid Guardrails initialized from config.yml.")
+        # Policy files are parsed on first use (or by warmup()), not at import
+        self._instructions = None
+        self._refusal_map = None
+
+    @property
+    def instructions(self) -> str:
+        if self._instructions is None:
+            self._instructions = self._load_instructions()
+            logger.info("[The Shield 2.0] Hybrid Guardrails initialized from config.yml.")
+        return self._instructions
+
+    @property
+    def refusal_map(self) -> Dict[str, str]:
+        if self._refusal_map is None:
+            self._refusal_map = self._load_refusal_map()
+        return self._refusal_map
+
+    def warmup(self):
+        """Parses the policy files now rather than on the first safety check."""
+        return self.instructions, self.refusal_map
 
     def _load_instructions(self) -> str:
         """Parses the 'instructions' section from config.yml."""
@@ -75,37 +95,52 @@ class GuardrailsService:
 
         # Resolve model tiering for the safety check
         from app.services.llm_service import call_ollama_api, call_openai_api, call_azure_openai_api_with_key
-        provider = os.getenv("LLM_PROVIDER", "azure_openai")
-        model = os.getenv("LLM_MODEL_NAME_FLASH", "gpt-4o")
-
-        system_prompt = self._build_safety_prompt()
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_query}
-        ]
+        provider, model, messages = self._safety_request(user_query)
 
         try:
             logger.info("[The Shield 2.0] Analyzing safety for query: %s...", user_query[:40])
             
-            if provider == "openai":
-                response = call_openai_api(messages, model, 0.0)
-            elif provider == "azure_openai":
-                response = call_azure_openai_api_with_key(messages, model, 0.0)
-            else:
-                response = call_ollama_api(messages, model, 0.0)
-
-            result = self._parse_safety_json(response)
-            
-            if result.get("verdict") == "BLOCK":
-                category = result.get("category", "").lower()
-                logger.warning("[The Shield] BLOCK | category=%s", category)
-                return self.refusal_map.get(category, self.DEFAULT_REFUSAL)
-            
-            return None
+            # Safety checks are served ahead of queued interactive/background calls
+            with rate_governor.priority("critical"), llm_telemetry.tag(agent="Shield"):
+                if provider == "openai":
+                    response = call_openai_api(messages, model, 0.0)
+                elif provider == "azure_openai":
+                    response = call_azure_openai_api_with_key(messages, model, 0.0)
+                else:
+                    response = call_ollama_api(messages, model, 0.0)
+
+            return self.evaluate_response(response)
         except Exception as e:
             logger.error("[The Shield] Safety check failed: %s", e, exc_info=True)
             return None
 
+    def _safety_request(self, user_query: str):
+        """Returns (provider, model, messages) for a safety check."""
+        provider = os.getenv("LLM_PROVIDER", "azure_openai")
+        model = os.getenv("LLM_MODEL_NAME_FLASH", "gpt-4o")
+        messages = [
+            {"role": "system", "content": self._build_safety_prompt()},
+            {"role": "user", "content": user_query}
+        ]
+        return provider, model, messages
+
+    def evaluate_response(self, raw_response: str) -> Optional[str]:
+        """
+        Maps a raw safety-classifier response to the canonical refusal from
+        main.co (or DEFAULT_REFUSAL), or None when the query may proceed.
+        Unparseable responses fall back to PASS.  Also used by the
+        Dispatcher's fused safety + intent mode.
+        """
+        if not self._is_enabled:
+            return None
+
+        result = self._parse_safety_json(raw_response)
+        if result.get("verdict") == "BLOCK":
+            category = (result.get("category") or "").lower()
+            logger.warning("[The Shield] BLOCK | category=%s", category)
+            return self.refusal_map.get(category, self.DEFAULT_REFUSAL)
+        return None
+
     def _build_safety_prompt(self) -> str:
         """Internal assembly of the centralized policy instructions."""
         return f"""
@@ -147,3 +182,4 @@ class GuardrailsService:
 
 # Singleton Instance
 guardrails_service = GuardrailsService()
+register_warmup("guardrails_policy", guardrails_service.warmup)
@@ -0,0 +1,326 @@
+import logging
+import os
+import random
+import re
+import time
+import zlib
+from dataclasses import dataclass
+from threading import Lock
+from typing import Dict, List, Optional
+import numpy as np
+from app.services.metrics_service import Histogram, metrics
+
+logger = logging.getLogger(__name__)
+
+
+# Labelled example utterances the nearest-neighbour index is built from.
+# Every intent is represented so near-misses land on the right label, but
+# only FAST_PATH_INTENTS may skip the LLM (see IntentRouter).
+LABELLED_EXAMPLES: Dict[str, List[str]] = {
+    "KNOWLEDGE_BASE": [
+        "What is a 401k?",
+        "How does a Roth IRA work?",
+        "What is the difference between a Roth and a traditional IRA?",
+        "What are the 401k contribution limits this year?",
+        "Can I withdraw from my 401k early?",
+        "What is the early withdrawal penalty?",
+        "What are required minimum distributions?",
+        "When do I have to start taking RMDs?",
+        "How does employer matching work?",
+        "What is vesting?",
+        "Explain catch-up contributions",
+        "What is a pension annuity?",
+        "How is my pension taxed?",
+        "What does the retirement policy say about hardship withdrawals?",
+        "Explain what an index fund is",
+        "What is the state pension age?",
+    ],
+    "RETIREMENT_SIMULATION": [
+        "Will I have enough to retire?",
+        "Can I retire at 60?",
+        "Can I afford to retire early?",
+        "How much do I need to save for retirement?",
+        "Run a retirement projection for me",
+        "Run a Monte Carlo simulation",
+        "What if I retire five years earlier?",
+        "What if I increase my contributions by 2%?",
+        "Will my savings last until I'm 90?",
+        "Project my retirement income",
+        "What are my chances of running out of money?",
+        "Simulate my retirement with a market crash",
+        "How long will my money last in retirement?",
+        "Am I on track for retirement?",
+    ],
+    "GENERAL": [
+        "Hello",
+        "Hi there",
+        "Hey, how are you?",
+        "Good morning",
+        "Thanks",
+        "Thank you so much",
+        "Thanks for your help",
+        "Goodbye",
+        "Bye, see you later",
+        "Who are you?",
+        "What can you help me with?",
+        "Ok great",
+    ],
+    "PORTFOLIO_ANALYSIS": [
+        "What is my account balance?",
+        "How are my investments performing?",
+        "Show me my portfolio",
+        "How much is in my 401k right now?",
+        "Am I on track to hit my savings goal?",
+        "What is my asset allocation?",
+    ],
+    "MARKET_INTELLIGENCE": [
+        "What is the price of Apple stock?",
+        "How is the stock market doing today?",
+        "What is the current inflation rate?",
+        "Are interest rates going up?",
+        "Is the economy heading for a recession?",
+        "What are the latest market trends?",
+    ],
+    "TRANSACTIONAL": [
+        "Buy 10 shares of AAPL",
+        "Sell all my bonds",
+        "Sell everything",
+        "Transfer money to my savings account",
+        "Change my address",
+        "Update my beneficiary",
+        "Open a new IRA account",
+    ],
+}
+
+# Intents obvious and low-risk enough to skip the LLM; trades, account data
+# and live-market questions always get the full classifier.
+FAST_PATH_INTENTS = frozenset({"KNOWLEDGE_BASE", "RETIREMENT_SIMULATION", "GENERAL"})
+
+# A message that also asks for a trade or account action ("explain index
+# funds and buy me one") must reach the classifier even when its question
+# half matches a fast-path intent confidently.
+VETO_INTENTS = frozenset({"TRANSACTIONAL", "PORTFOLIO_ANALYSIS"})
+ACTION_VERBS = frozenset({
+    "buy", "buying", "bought", "sell", "selling", "sold",
+    "transfer", "transferring", "move", "moving", "withdraw", "withdrawing",
+    "update", "updating", "change", "changing",
+})
+
+
+@dataclass
+class RouteDecision:
+    intent: str
+    confidence: float  # cosine similarity to the nearest labelled example, 0.0-1.0
+    margin: float      # lead over the best example of any other intent
+    accepted: bool     # True when the LLM classifier can be skipped
+
+
+class IntentRouter:
+    """
+    The Local Intent Router (The Switchboard).
+
+    A fast path in front of the Dispatcher's LLM classifier.  Messages are
+    embedded locally with an IDF-weighted, hashed word/character n-gram
+    vectoriser and matched against a nearest-neighbour index of
+    LABELLED_EXAMPLES.  When the best match is a FAST_PATH_INTENTS label,
+    clears `threshold` and leads the best other intent by `min_margin`, the
+    LLM call is skipped — ~1 ms instead of a round trip.  The fast path is
+    vetoed when the message contains an ACTION_VERBS word, or any word that
+    on its own leans towards a VETO_INTENTS label by at least `veto_floor`.
+
+    To tune the threshold, every LLM classification is compared against the
+    router's own best guess, and a sample (`shadow_rate`) of fast-path hits
+    is re-checked by the LLM in the background; agreement is reported per
+    confidence band in stats().
+    """
+
+    DIMENSIONS = 2 ** 12
+    CONFIDENCE_BANDS = (0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9)
+    LATENCY_BUCKETS_MS = (0.25, 0.5, 1, 2, 5, 10)
+    # Short replies ("yes", "do it") only make sense with the conversation
+    MIN_TOKENS_WITH_HISTORY = 3
+
+    def __init__(self, examples: Optional[Dict[str, List[str]]] = None):
+        self.enabled = os.getenv("INTENT_ROUTER_ENABLED", "true").lower() == "true"
+        self.threshold = float(os.getenv("INTENT_ROUTER_THRESHOLD", "0.6"))
+        self.min_margin = float(os.getenv("INTENT_ROUTER_MIN_MARGIN", "0.1"))
+        self.shadow_rate = float(os.getenv("INTENT_ROUTER_SHADOW_RATE", "0.05"))
+        self.veto_floor = float(os.getenv("INTENT_ROUTER_VETO_FLOOR", "0.3"))
+
+        self._lock = Lock()
+        self._counters = {"lookups": 0, "fast_path": 0, "fallback": 0, "skipped": 0, "vetoed": 0}
+        # band label -> [compared, agreed]
+        self._agreement = {self._band(c): [0, 0] for c in (0.0,) + self.CONFIDENCE_BANDS}
+        self._latency_ms = Histogram(self.LATENCY_BUCKETS_MS)
+
+        self._build_index(examples or LABELLED_EXAMPLES)
+        logger.info("[IntentRouter] Initialised | intents=%d threshold=%.2f margin=%.2f shadow_rate=%.2f",
+                    len(self.labels), self.threshold, self.min_margin, self.shadow_rate)
+
+    # -----------------------------------------------------------------------
+    # Public API
+    # -----------------------------------------------------------------------
+
+    def route(self, message: str, history=None) -> Optional[RouteDecision]:
+        """
+        Scores the message against the example index.  Returns None when the
+        router is disabled or the message needs conversational context;
+        otherwise a RouteDecision whose `accepted` flag says whether the LLM
+        classifier may be skipped.
+        """
+        if not self.enabled or not message:
+            return None
+
+        started = time.perf_counter()
+        tokens = self._tokenize(message)
+        if not tokens or (history and len(tokens) < self.MIN_TOKENS_WITH_HISTORY):
+            self._incr("skipped")
+            return None
+
+        similarities = self._examples @ self._embed(tokens)
+        # Best (1-NN) score per intent
+        scores = np.full(len(self.labels), -1.0)
+        np.maximum.at(scores, self._example_labels, similarities)
+        order = np.argsort(scores)[::-1]
+        best = float(scores[order[0]])
+        runner_up = float(scores[order[1]]) if len(order) > 1 else 0.0
+        intent = self.labels[order[0]]
+        accepted = (intent in FAST_PATH_INTENTS
+                    and best >= self.threshold
+                    and best - runner_up >= self.min_margin)
+        if accepted and self._vetoed(tokens):
+            accepted = False
+            self._incr("vetoed")
+        decision = RouteDecision(
+            intent=intent,
+            confidence=round(max(best, 0.0), 3),
+            margin=round(best - runner_up, 3),
+            accepted=accepted,
+        )
+
+        self._latency_ms.observe((time.perf_counter() - started) * 1000)
+        self._incr("lookups")
+        self._incr("fast_path" if decision.accepted else "fallback")
+        logger.debug("[IntentRouter] %s | intent=%s confidence=%.3f margin=%.3f",
+                     "HIT" if decision.accepted else "MISS",
+                     decision.intent, decision.confidence, decision.margin)
+        return decision
+
+    def should_shadow(self) -> bool:
+        """Samples fast-path hits to re-check against the LLM."""
+        return self.shadow_rate > 0 and random.random() < self.shadow_rate
+
+    def record_llm_outcome(self, decision: RouteDecision, llm_intent: str):
+        """Records whether the router's guess matched the LLM's intent."""
+        agreed = decision.intent == llm_intent
+        with self._lock:
+            band = self._agreement[self._band(decision.confidence)]
+            band[0] += 1
+            band[1] += int(agreed)
+        if not agreed:
+            logger.info("[IntentRouter] Disagreement | router=%s llm=%s confidence=%.3f accepted=%s",
+                        decision.intent, llm_intent, decision.confidence, decision.accepted)
+
+    def stats(self):
+        """Hit rate, per-band agreement with the LLM and routing latency."""
+        with self._lock:
+            counters = dict(self._counters)
+            bands = {
+                band: {
+                    "compared": compared,
+                    "agreement": round(agreed / compared, 3) if compared else None,
+                }
+                for band, (compared, agreed) in self._agreement.items()
+            }
+        lookups = counters["lookups"]
+        return {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "min_margin": self.min_margin,
+            "veto_floor": self.veto_floor,
+            **counters,
+            "hit_rate": round(counters["fast_path"] / lookups, 3) if lookups else 0.0,
+            "agreement_by_confidence": bands,
+            "latency_ms": self._latency_ms.snapshot(),
+        }
+
+    # -----------------------------------------------------------------------
+    # Private — Embedding
+    # -----------------------------------------------------------------------
+
+    def _build_index(self, examples):
+        self.labels = list(examples.keys())
+        corpus = [(i, self._tokenize(text)) for i, label in enumerate(self.labels) for text in examples[label]]
+
+        # Inverse document frequency over the example corpus so filler
+        # ("what", "is", "my") weighs less than the words that decide intent
+        document_freq = np.zeros(self.DIMENSIONS, dtype=np.float32)
+        for _, tokens in corpus:
+            document_freq[list(set(self._hashed_features(tokens)))] += 1.0
+        self._idf = np.log((1.0 + len(corpus)) / (1.0 + document_freq)) + 1.0
+
+        self._example_labels = np.array([i for i, _ in corpus])
+        self._examples = np.stack([self._embed(tokens) for _, tokens in corpus])
+        # Example rows per intent group, for the per-word veto
+        self._veto_rows = np.isin(self._example_labels, self._label_ids(VETO_INTENTS))
+        self._fast_rows = np.isin(self._example_labels, self._label_ids(FAST_PATH_INTENTS))
+
+    def _label_ids(self, intents):
+        return [i for i, label in enumerate(self.labels) if label in intents]
+
+    def _vetoed(self, tokens):
+        """
+        True when a word is an action verb, or on its own scores at least
+        veto_floor higher against a VETO_INTENTS example than against any
+        fast-path example (so words every intent uses, like "my", don't count).
+        """
+        if ACTION_VERBS.intersection(tokens):
+            return True
+        if not self._veto_rows.any():
+            return False
+        words = sorted(set(tokens))
+        similarities = np.stack([self._embed([word]) for word in words]) @ self._examples.T
+        veto = similarities[:, self._veto_rows].max(axis=1)
+        fast = similarities[:, self._fast_rows].max(axis=1) if self._fast_rows.any() else 0.0
+        return bool(np.any(veto - fast >= self.veto_floor))
+
+    @staticmethod
+    def _tokenize(text):
+        return re.findall(r"[a-z0-9]+", text.lower())
+
+    def _hashed_features(self, tokens):
+        """Bucket indices of word unigrams, bigrams and character trigrams."""
+        features = list(tokens)
+        features += [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        for token in tokens:
+            padded = f"<{token}>"
+            features += [f"#{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+        return [zlib.crc32(feature.encode()) % self.DIMENSIONS for feature in features]
+
+    def _embed(self, tokens):
+        """Sublinear-TF x IDF hashed vector, L2-normalised."""
+        vector = np.zeros(self.DIMENSIONS, dtype=np.float32)
+        np.add.at(vector, self._hashed_features(tokens), 1.0)
+        return self._normalise(np.sqrt(vector) * self._idf)
+
+    @staticmethod
+    def _normalise(vector):
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _band(self, confidence):
+        lower = 0.0
+        for bound in self.CONFIDENCE_BANDS:
+            if confidence < bound:
+                break
+            lower = bound
+        return f">={lower:g}"
+
+    def _incr(self, key):
+        with self._lock:
+            self._counters[key] += 1
+
+
+# Single global instance — consulted by the Dispatcher before the LLM classifier
+intent_router = IntentRouter()
+metrics.register_collector("intent_router", intent_router.stats)
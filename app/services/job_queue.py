@@ -0,0 +1,435 @@
+import datetime
+import logging
+import os
+import socket
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models.agent_job import AgentJob
+from app.services.async_runtime import in_own_app_context
+from app.services.metrics_service import metrics
+
+logger = logging.getLogger(__name__)
+
+
+# Identity of one claim.  complete()/fail() only apply while it still holds, so
+# a worker whose lease expired cannot settle a job another worker re-claimed.
+Lease = namedtuple("Lease", "worker_id attempt")
+
+
+class DuplicateJob(Exception):
+    """Raised by JobQueue.enqueue when the idempotency key already has a job in flight."""
+
+    def __init__(self, job):
+        super().__init__(f"Job {job.id} is already in flight for this idempotency key")
+        self.job = job
+
+
+def _utcnow():
+    return datetime.datetime.utcnow()
+
+
+def default_worker_id():
+    """host:pid:thread — unique enough to attribute a lease to its holder."""
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}"
+
+
+class JobQueue:
+    """
+    The Durable Job Queue (The Ledger).
+
+    Persists every agent turn as an AgentJob row so that a worker restart
+    mid-turn never loses the bot's reply.  Claims are leases: a claimed job
+    becomes invisible for `visibility_timeout_s`; if its worker dies, the
+    lease expires and any other worker re-claims it.  Failed attempts are
+    retried with linear backoff until `max_attempts`.
+
+    Modes (AGENT_QUEUE_MODE):
+      - inline   — the web process that enqueues a job runs it on its own
+                   worker pool; a background poller picks up retries and
+                   jobs abandoned by crashed processes.
+      - external — the web tier only enqueues; scripts/run_agent_worker.py
+                   processes consume the queue and scale independently.
+
+    Claims use an optimistic compare-and-set on (status, attempts), which is
+    safe across processes on both SQLite and Postgres.  complete() and fail()
+    are fenced the same way on the claim's Lease (holder + attempt).  While a
+    job runs, keep_alive() renews its lease every `heartbeat_s`, so a slow
+    turn (rate-governor queueing, failover) is not re-claimed and run twice.
+    """
+
+    MODE_INLINE = "inline"
+    MODE_EXTERNAL = "external"
+    CLAIM_BATCH = 10
+
+    def __init__(self):
+        self.mode = os.getenv("AGENT_QUEUE_MODE", self.MODE_INLINE)
+        self.visibility_timeout_s = int(os.getenv("AGENT_JOB_VISIBILITY_TIMEOUT_S", "300"))
+        self.max_attempts = int(os.getenv("AGENT_JOB_MAX_ATTEMPTS", "3"))
+        self.retry_backoff_s = int(os.getenv("AGENT_JOB_RETRY_BACKOFF_S", "5"))
+        self.poll_interval_s = float(os.getenv("AGENT_JOB_POLL_INTERVAL_S", "2"))
+        self.heartbeat_s = float(os.getenv("AGENT_JOB_HEARTBEAT_S", str(self.visibility_timeout_s / 3)))
+
+        self._lock = threading.Lock()
+        self._poller = None
+        self._stop_event = threading.Event()
+        logger.info("[JobQueue] Initialised | mode=%s visibility_timeout=%ss max_attempts=%d",
+                    self.mode, self.visibility_timeout_s, self.max_attempts)
+
+    @property
+    def is_inline(self):
+        return self.mode != self.MODE_EXTERNAL
+
+    # -----------------------------------------------------------------------
+    # Public API — Producer
+    # -----------------------------------------------------------------------
+
+    def enqueue(self, conversation_id, user_id, payload, priority=1, lease=False,
+                idempotency_key=None):
+        """
+        Persists a new PENDING job and returns it, committing the session
+        (and with it anything the caller added for the same turn).
+
+        With lease=True the job starts invisible for one visibility timeout,
+        reserving it for the enqueuing process (which claims it by id); other
+        workers only see it if that process never gets to it.
+
+        Raises DuplicateJob, after rolling the session back, when another job
+        with the same (user_id, idempotency_key) is still in flight — enforced
+        by a unique partial index, so concurrent duplicates cannot both win.
+        """
+        now = _utcnow()
+        visible_at = now + datetime.timedelta(seconds=self.visibility_timeout_s) if lease else now
+        job = AgentJob(
+            conversation_id=conversation_id,
+            user_id=user_id,
+            payload=payload,
+            priority=priority,
+            idempotency_key=idempotency_key,
+            max_attempts=self.max_attempts,
+            visible_at=visible_at,
+            created_at=now,
+            updated_at=now,
+        )
+        db.session.add(job)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            existing = idempotency_key and self.find_by_idempotency_key(
+                user_id, idempotency_key, in_flight_only=True
+            )
+            if not existing:
+                raise
+            logger.info("[JobQueue] Duplicate enqueue rejected | job=%s key=%s", existing.id, idempotency_key[:12])
+            raise DuplicateJob(existing)
+        logger.info("[JobQueue] Job enqueued | job=%s conv=%s lease=%s", job.id, conversation_id, lease)
+        return job
+
+    # -----------------------------------------------------------------------
+    # Public API — Consumer
+    # -----------------------------------------------------------------------
+
+    def claim(self, worker_id, job_id=None):
+        """
+        Leases one job and returns it (status RUNNING), or None.
+
+        Without job_id, picks the highest-priority visible job — either
+        PENDING or RUNNING with an expired lease.  With job_id, claims that
+        specific PENDING job regardless of its lease (used by the enqueuer).
+        """
+        now = _utcnow()
+        query = AgentJob.query
+        if job_id:
+            query = query.filter(AgentJob.id == job_id, AgentJob.status == AgentJob.PENDING)
+        else:
+            query = query.filter(
+                AgentJob.status.in_([AgentJob.PENDING, AgentJob.RUNNING]),
+                AgentJob.visible_at <= now,
+            ).order_by(AgentJob.priority, AgentJob.created_at)
+
+        for job in query.limit(self.CLAIM_BATCH).all():
+            if job.attempts >= job.max_attempts:
+                self._dead_letter(job, job.last_error or "Lease expired on final attempt")
+                continue
+            if self._try_lease(job, worker_id, now):
+                claimed = db.session.get(AgentJob, job.id)
+                logger.info("[JobQueue] Job claimed | job=%s worker=%s attempt=%d",
+                            claimed.id, worker_id, claimed.attempts)
+                return claimed
+        return None
+
+    @staticmethod
+    def lease(job):
+        """
+        The Lease of a freshly claimed job.  Capture it straight after claim():
+        any later commit refreshes the row, and with it the current holder.
+        """
+        return Lease(job.locked_by, job.attempts)
+
+    def complete(self, job_id, lease, commit=True, reply_message_id=None):
+        """
+        Marks a job DONE (recording the Message that answered it) if lease
+        still holds it; returns whether it did.  commit=False lets callers ack
+        in the same transaction as their result (and roll that result back
+        when the lease was lost).
+        """
+        acked = self._update_leased(job_id, lease, {
+            "status": AgentJob.DONE, "locked_by": None, "reply_message_id": reply_message_id,
+        }, commit=commit)
+        if acked:
+            logger.info("[JobQueue] Job completed | job=%s", job_id)
+        else:
+            logger.warning("[JobQueue] Lease lost; completion ignored | job=%s worker=%s attempt=%d",
+                           job_id, lease.worker_id, lease.attempt)
+        return acked
+
+    def fail(self, job_id, lease, error):
+        """
+        Records a failed attempt.  Reschedules with backoff if attempts remain,
+        otherwise marks the job FAILED.  Returns False only when the job is now
+        FAILED, i.e. when the caller should report the failure; if the lease
+        was lost the job is left to its current holder (returns True).
+        """
+        job = db.session.get(AgentJob, job_id)
+        if not job:
+            return False
+        if lease.attempt < job.max_attempts:
+            delay = self.retry_backoff_s * max(1, lease.attempt)
+            retried = self._update_leased(job_id, lease, {
+                "status": AgentJob.PENDING,
+                "locked_by": None,
+                "last_error": str(error)[:2000],
+                "visible_at": _utcnow() + datetime.timedelta(seconds=delay),
+            })
+            if retried:
+                logger.warning("[JobQueue] Job failed; retrying in %ss | job=%s attempt=%d/%d",
+                               delay, job_id, lease.attempt, job.max_attempts)
+            else:
+                logger.warning("[JobQueue] Lease lost; failure ignored | job=%s worker=%s attempt=%d",
+                               job_id, lease.worker_id, lease.attempt)
+            return True
+        return not self._dead_letter(job, error, lease=lease)
+
+    def renew(self, job_id, lease):
+        """Extends a running job's lease by one visibility timeout; returns whether lease still held it."""
+        return self._update_leased(job_id, lease, {
+            "visible_at": _utcnow() + datetime.timedelta(seconds=self.visibility_timeout_s),
+        })
+
+    @contextmanager
+    def keep_alive(self, job_id, lease):
+        """
+        Renews the lease on a heartbeat thread for the duration of the block.
+        The thread gets its own app context (and db.session); it stops on
+        exit, or as soon as a renewal finds the lease lost.
+        """
+        stop = threading.Event()
+
+        def _beat():
+            try:
+                while not stop.wait(self.heartbeat_s):
+                    if not self.renew(job_id, lease):
+                        logger.warning("[JobQueue] Lease lost; heartbeat stopped | job=%s worker=%s attempt=%d",
+                                       job_id, lease.worker_id, lease.attempt)
+                        return
+            except Exception as e:
+                logger.error("[JobQueue] Heartbeat failed | job=%s error=%s", job_id, e)
+
+        heartbeat = threading.Thread(target=in_own_app_context(_beat), name=f"agent-job-heartbeat-{job_id}",
+                                     daemon=True)
+        heartbeat.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            heartbeat.join()
+
+    def release(self, job_id):
+        """Hands a leased job back without consuming an attempt (e.g. it could not be scheduled)."""
+        self._update(job_id, {
+            "status": AgentJob.PENDING,
+            "locked_by": None,
+            "attempts": AgentJob.attempts - 1,
+            "visible_at": _utcnow(),
+        })
+        logger.info("[JobQueue] Job released | job=%s", job_id)
+
+    def cancel(self, job_id, reason):
+        """Marks a job FAILED without running it."""
+        self._update(job_id, {"status": AgentJob.FAILED, "locked_by": None, "last_error": reason})
+        logger.info("[JobQueue] Job cancelled | job=%s reason=%s", job_id, reason)
+
+    def get(self, job_id):
+        return db.session.get(AgentJob, job_id)
+
+    def find_by_idempotency_key(self, user_id, key, window_s=None, in_flight_only=False):
+        """
+        Returns the newest job for (user_id, key) created within window_s
+        (any age when None), or None.  FAILED jobs never match so a failed
+        turn can be resubmitted.
+        """
+        statuses = [AgentJob.PENDING, AgentJob.RUNNING]
+        if not in_flight_only:
+            statuses.append(AgentJob.DONE)
+        query = AgentJob.query.filter(
+            AgentJob.user_id == user_id,
+            AgentJob.idempotency_key == key,
+            AgentJob.status.in_(statuses),
+        )
+        if window_s is not None:
+            query = query.filter(AgentJob.created_at >= _utcnow() - datetime.timedelta(seconds=window_s))
+        return query.order_by(AgentJob.created_at.desc()).first()
+
+    def count_in_flight(self, user_id=None, conversation_id=None):
+        """Counts PENDING/RUNNING jobs for a user and/or conversation."""
+        query = AgentJob.query.filter(AgentJob.status.in_([AgentJob.PENDING, AgentJob.RUNNING]))
+        if user_id is not None:
+            query = query.filter(AgentJob.user_id == user_id)
+        if conversation_id is not None:
+            query = query.filter(AgentJob.conversation_id == conversation_id)
+        return query.count()
+
+    def wait(self, job_id, timeout):
+        """Polls until the job reaches DONE/FAILED or timeout elapses.  Returns the final status or None."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            db.session.expire_all()
+            job = db.session.get(AgentJob, job_id)
+            if job and job.status in (AgentJob.DONE, AgentJob.FAILED):
+                return job.status
+            time.sleep(min(0.5, self.poll_interval_s))
+        return None
+
+    def run_worker(self, handler, worker_id=None, stop_event=None, can_claim=None):
+        """
+        Consumer loop: claims visible jobs and passes each to handler(job)
+        until stop_event is set.  Must run inside an app context.
+        can_claim() is consulted before every claim to apply back-pressure.
+        """
+        worker_id = worker_id or default_worker_id()
+        stop_event = stop_event or self._stop_event
+        logger.info("[JobQueue] Worker started | worker=%s", worker_id)
+
+        while not stop_event.is_set():
+            job = None
+            try:
+                if can_claim is None or can_claim():
+                    job = self.claim(worker_id)
+            except Exception as e:
+                logger.error("[JobQueue] Claim failed: %s", e, exc_info=True)
+                db.session.rollback()
+
+            if job is None:
+                stop_event.wait(self.poll_interval_s)
+                continue
+
+            try:
+                handler(job)
+            except Exception as e:
+                logger.error("[JobQueue] Handler raised for job=%s: %s", job.id, e, exc_info=True)
+                db.session.rollback()
+            finally:
+                db.session.remove()
+
+        logger.info("[JobQueue] Worker stopped | worker=%s", worker_id)
+
+    def ensure_poller(self, app, handler, can_claim=None):
+        """
+        Starts (once per process) the in-process recovery poller (inline mode)
+        that feeds retried and abandoned jobs to handler(job).
+        """
+        with self._lock:
+            if self._poller and self._poller.is_alive():
+                return
+
+            def _poll():
+                with app.app_context():
+                    self.run_worker(handler, stop_event=self._stop_event, can_claim=can_claim)
+
+            self._stop_event.clear()
+            self._poller = threading.Thread(target=_poll, name="agent-job-poller", daemon=True)
+            self._poller.start()
+
+    def shutdown(self):
+        """Stops the in-process poller."""
+        self._stop_event.set()
+
+    def stats(self):
+        """Job counts by status (requires an app context)."""
+        rows = db.session.query(AgentJob.status, func.count(AgentJob.id)).group_by(AgentJob.status).all()
+        counts = {status: 0 for status in (AgentJob.PENDING, AgentJob.RUNNING, AgentJob.DONE, AgentJob.FAILED)}
+        counts.update({status: count for status, count in rows})
+        return {"mode": self.mode, **{k.lower(): v for k, v in counts.items()}}
+
+    # -----------------------------------------------------------------------
+    # Private
+    # -----------------------------------------------------------------------
+
+    def _try_lease(self, job, worker_id, now):
+        """Compare-and-set on (status, attempts) so only one claimer can win."""
+        updated = (
+            AgentJob.query
+            .filter(
+                AgentJob.id == job.id,
+                AgentJob.status == job.status,
+                AgentJob.attempts == job.attempts,
+            )
+            .update({
+                "status": AgentJob.RUNNING,
+                "attempts": AgentJob.attempts + 1,
+                "locked_by": worker_id,
+                "visible_at": now + datetime.timedelta(seconds=self.visibility_timeout_s),
+                "updated_at": now,
+            }, synchronize_session=False)
+        )
+        db.session.commit()
+        return updated == 1
+
+    def _dead_letter(self, job, error, lease=None):
+        """Marks a job FAILED (only while lease holds, when given); returns whether it did."""
+        values = {"status": AgentJob.FAILED, "locked_by": None, "last_error": str(error)[:2000]}
+        if lease is None:
+            self._update(job.id, values)
+            attempts = job.attempts
+        elif self._update_leased(job.id, lease, values):
+            attempts = lease.attempt
+        else:
+            logger.warning("[JobQueue] Lease lost; failure ignored | job=%s worker=%s attempt=%d",
+                           job.id, lease.worker_id, lease.attempt)
+            return False
+        logger.error("[JobQueue] Job FAILED after %d attempt(s) | job=%s error=%s",
+                     attempts, job.id, str(error)[:120])
+        return True
+
+    def _update(self, job_id, values, commit=True):
+        values.setdefault("updated_at", _utcnow())
+        AgentJob.query.filter(AgentJob.id == job_id).update(values, synchronize_session=False)
+        if commit:
+            db.session.commit()
+
+    def _update_leased(self, job_id, lease, values, commit=True):
+        """Applies values only while the job is RUNNING under lease; returns whether it was."""
+        values.setdefault("updated_at", _utcnow())
+        updated = (
+            AgentJob.query
+            .filter(
+                AgentJob.id == job_id,
+                AgentJob.status == AgentJob.RUNNING,
+                AgentJob.locked_by == lease.worker_id,
+                AgentJob.attempts == lease.attempt,
+            )
+            .update(values, synchronize_session=False)
+        )
+        if commit:
+            db.session.commit()
+        return updated == 1
+
+
+# Single global instance — shared by the chat routes and agent workers
+job_queue = JobQueue()
+metrics.register_collector("agent_jobs", job_queue.stats)
@@ -1,17 +1,23 @@
+import hashlib
 import os
+import logging
 import requests
 import json
+import time
+from datetime import timedelta
+from threading import Lock
 from app import db
 from app.models.knowledge import KnowledgeChunk
+from app.services.metrics_service import metrics
+from app.utils.lazy import lazy_import
+
+logger = logging.getLogger(__name__)
+
+# Vertex AI SDK is imported on first use, not at import
+vertexai = lazy_import("vertexai")
+caching = lazy_import("vertexai.preview.caching")
+TextEmbeddingModel = lazy_import("vertexai.language_models", "TextEmbeddingModel")
 
-try:
-    from vertexai.generative_models import GenerativeModel, Part
-    from vertexai.preview import caching
-    from vertexai.language_models import TextEmbeddingModel
-    import vertexai
-except ImportError:
-    vertexai = None
-    GenerativeModel = Part = caching = TextEmbeddingModel = None
 
 class KnowledgeService:
     @staticmethod
@@ -84,32 +90,88 @@ class KnowledgeService:
 
 class VertexCacheManager:
     """
-    Manages long-lived context caches for the Scholar Agent.
-    Reduces 90% of token costs for identical large policy lookups.
+    Manages long-lived Gemini context caches: large policy documents for
+    the Scholar Agent and static system-prompt prefixes for the advisor.
+    Caches are keyed by content hash and reused until shortly before they
+    expire, so identical content is uploaded once per TTL instead of once
+    per call.  Content below VERTEX_CACHE_MIN_TOKENS (the provider minimum)
+    is not cached.  Reduces 90% of token costs for identical large lookups.
     """
-    @staticmethod
-    def create_policy_cache(policy_text, ttl_seconds=3600):
+
+    REFRESH_MARGIN_S = 60
+
+    def __init__(self):
+        self.min_tokens = int(os.getenv("VERTEX_CACHE_MIN_TOKENS", "32768"))
+        self.ttl_s = int(os.getenv("VERTEX_CACHE_TTL_S", "3600"))
+        self._caches = {}  # content hash -> (cache name, expires_at)
+        self._lock = Lock()
+        self._counters = {"hits": 0, "created": 0, "below_minimum": 0, "failed": 0}
+
+    def create_policy_cache(self, policy_text, ttl_seconds=3600):
+        model_name = os.getenv("VERTEX_AI_MODEL_PRO", "gemini-1.5-pro")
+        return self.get_or_create(
+            model_name,
+            system_instruction="You are a RetireIQ policy expert. Use the provided text to answer questions.",
+            contents=[policy_text],
+            ttl_seconds=ttl_seconds,
+        )
+
+    def prefix_cache(self, model_name, system_instruction):
+        """Cache name for a static system-prompt prefix, or None when it is too small to cache."""
+        if len(system_instruction) // 4 < self.min_tokens:
+            with self._lock:
+                self._counters["below_minimum"] += 1
+            return None
+        return self.get_or_create(model_name, system_instruction)
+
+    def get_or_create(self, model_name, system_instruction, contents=None, ttl_seconds=None):
+        """Returns the cached-content name for this content, creating it on first use."""
+        ttl_seconds = ttl_seconds or self.ttl_s
+        key = hashlib.sha256(
+            json.dumps([model_name, system_instruction, contents], default=str).encode("utf-8")
+        ).hexdigest()
+        now = time.time()
+        with self._lock:
+            entry = self._caches.get(key)
+            if entry and entry[1] - self.REFRESH_MARGIN_S > now:
+                self._counters["hits"] += 1
+                return entry[0]
+
         if not vertexai:
             return None
-        
+
         try:
             project_id = os.getenv("GCP_PROJECT_ID")
             location = os.getenv("GCP_REGION", "us-central1")
             vertexai.init(project=project_id, location=location)
-            
-            model_name = os.getenv("VERTEX_AI_MODEL_PRO", "gemini-1.5-pro")
-            
+
             # Context caching typically requires > 32k tokens
             cache = caching.CachedContent.create(
                 model_name=model_name,
-                contents=[policy_text],
-                system_instruction="You are a RetireIQ policy expert. Use the provided text to answer questions.",
-                ttl=ttl_seconds,
+                contents=contents,
+                system_instruction=system_instruction,
+                ttl=timedelta(seconds=ttl_seconds),
             )
-            return cache.name
         except Exception as e:
-            print(f"Failed to create Vertex AI context cache: {e}")
+            with self._lock:
+                self._counters["failed"] += 1
+            logger.warning("Failed to create Vertex AI context cache: %s", e)
             return None
 
+        with self._lock:
+            self._caches[key] = (cache.name, now + ttl_seconds)
+            self._counters["created"] += 1
+        logger.info("Vertex AI context cache created | model=%s cache=%s ttl=%ss", model_name, cache.name, ttl_seconds)
+        return cache.name
+
+    def reset(self):
+        with self._lock:
+            self._caches = {}
+
+    def stats(self):
+        with self._lock:
+            return {"caches": len(self._caches), "min_tokens": self.min_tokens, **self._counters}
+
 knowledge_service = KnowledgeService()
 cache_manager = VertexCacheManager()
+metrics.register_collector("vertex_context_cache", cache_manager.stats)
@@ -0,0 +1,289 @@
+import contextvars
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from threading import Lock
+from app.services.metrics_service import metrics
+
+logger = logging.getLogger(__name__)
+
+_memory_only = contextvars.ContextVar("llm_cache_memory_only", default=False)
+
+
+class ProviderErrorText(str):
+    """
+    Fallback text a provider adapter returns instead of a real completion
+    (missing credentials, transport errors).  Behaves like a plain str for
+    callers, but is never cached.
+    """
+
+
+class GovernorBusyText(ProviderErrorText):
+    """
+    ProviderErrorText for a call the rate governor gave up queueing locally:
+    the provider was never asked, so it says nothing about its health.
+    """
+
+
+class LLMResponseCache:
+    """
+    The Deterministic Response Cache (The Archivist).
+
+    Content-addressed cache for temperature-0 completions: the key is a
+    SHA-256 over (provider, model, temperature, messages/prompt and any other
+    adapter arguments), so identical deterministic calls — greetings, FAQs,
+    repeated safety/intent checks — skip the provider round trip.
+
+    Two tiers:
+      - memory — per-process LRU bounded by LLM_CACHE_MAX_ENTRIES.
+      - disk   — optional, enabled by LLM_CACHE_DIR; one JSON file per key,
+                 written atomically so several processes (gunicorn workers,
+                 agent workers) on a host can share it.  Bounded by
+                 LLM_CACHE_DISK_MAX_ENTRIES (oldest files pruned first).
+
+    Both tiers honour LLM_CACHE_TTL_S.  Only calls at or below
+    LLM_CACHE_MAX_TEMPERATURE (default 0.0) are cached.  The disk tier is
+    plaintext and outlives the process, so calls whose prompts carry raw
+    customer data run under memory_only().
+    """
+
+    PRUNE_EVERY_WRITES = 100
+
+    def __init__(self):
+        self.enabled = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+        self.max_temperature = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "0.0"))
+        self.ttl_s = int(os.getenv("LLM_CACHE_TTL_S", "3600"))
+        self.max_entries = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+        self.disk_dir = os.getenv("LLM_CACHE_DIR") or None
+        self.disk_max_entries = int(os.getenv("LLM_CACHE_DISK_MAX_ENTRIES", "10000"))
+
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = Lock()
+        self._disk_writes = 0
+        self._counters = {
+            "memory_hits": 0, "disk_hits": 0, "misses": 0, "bypassed": 0,
+            "stores": 0, "evictions": 0, "expired": 0,
+        }
+        logger.info("[LLMCache] Initialised | enabled=%s ttl=%ss max_entries=%d disk=%s",
+                    self.enabled, self.ttl_s, self.max_entries, self.disk_dir or "off")
+
+    # -----------------------------------------------------------------------
+    # Public API
+    # -----------------------------------------------------------------------
+
+    def is_cacheable(self, temperature):
+        return self.enabled and temperature is not None and float(temperature) <= self.max_temperature
+
+    @contextmanager
+    def memory_only(self):
+        """Keeps the enclosed calls (in this thread/task) off the disk tier."""
+        token = _memory_only.set(True)
+        try:
+            yield
+        finally:
+            _memory_only.reset(token)
+
+    @staticmethod
+    def make_key(provider, **call_args):
+        """Stable content hash of a provider call."""
+        payload = json.dumps({"provider": provider, **call_args}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key, now=None):
+        """Returns the cached completion, or None on a miss."""
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return value
+                del self._entries[key]
+                self._counters["expired"] += 1
+
+        value = None if _memory_only.get() else self._disk_get(key, now)
+        with self._lock:
+            if value is None:
+                self._counters["misses"] += 1
+                return None
+            self._counters["disk_hits"] += 1
+        self._memory_put(key, value, now + self.ttl_s)
+        return value
+
+    def put(self, key, value, now=None):
+        """Stores a completion in both tiers.  Empty and error responses are ignored."""
+        if not value or isinstance(value, ProviderErrorText) or not isinstance(value, str):
+            return
+        now = time.time() if now is None else now
+        expires_at = now + self.ttl_s
+        self._memory_put(key, value, expires_at)
+        if not _memory_only.get():
+            self._disk_put(key, value, expires_at)
+        with self._lock:
+            self._counters["stores"] += 1
+
+    def record_bypass(self):
+        with self._lock:
+            self._counters["bypassed"] += 1
+
+    def clear(self):
+        """Drops the in-process tier (the disk tier is left to its TTL)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            size = len(self._entries)
+        hits = counters["memory_hits"] + counters["disk_hits"]
+        lookups = hits + counters["misses"]
+        return {
+            "enabled": self.enabled,
+            "size": size,
+            "max_entries": self.max_entries,
+            "disk": bool(self.disk_dir),
+            **counters,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+        }
+
+    # -----------------------------------------------------------------------
+    # Private — Memory tier
+    # -----------------------------------------------------------------------
+
+    def _memory_put(self, key, value, expires_at):
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    # -----------------------------------------------------------------------
+    # Private — Disk tier
+    # -----------------------------------------------------------------------
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _disk_get(self, key, now):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("expires_at", 0) <= now:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            with self._lock:
+                self._counters["expired"] += 1
+            return None
+        return entry.get("value")
+
+    def _disk_put(self, key, value, expires_at):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"expires_at": expires_at, "value": value}, f)
+            os.replace(tmp_path, path)  # atomic — readers never see a partial file
+        except OSError as e:
+            logger.warning("[LLMCache] Disk write failed: %s", e)
+            return
+
+        with self._lock:
+            self._disk_writes += 1
+            due = self._disk_writes % self.PRUNE_EVERY_WRITES == 0
+        if due:
+            self._prune_disk()
+
+    def _prune_disk(self):
+        """Removes the oldest files beyond disk_max_entries."""
+        try:
+            files = [
+                os.path.join(root, name)
+                for root, _, names in os.walk(self.disk_dir)
+                for name in names if name.endswith(".json")
+            ]
+            excess = len(files) - self.disk_max_entries
+            if excess <= 0:
+                return
+            files.sort(key=lambda p: os.path.getmtime(p))
+            for path in files[:excess]:
+                os.remove(path)
+            with self._lock:
+                self._counters["evictions"] += excess
+            logger.info("[LLMCache] Pruned %d disk entries", excess)
+        except OSError as e:
+            logger.warning("[LLMCache] Disk prune failed: %s", e)
+
+
+def cached_completion(provider):
+    """
+    Decorator for llm_service provider adapters, sync or async.  Serves
+    deterministic (temperature <= LLM_CACHE_MAX_TEMPERATURE) calls from
+    llm_cache; all other calls pass straight through.  Sync and async
+    adapters with the same provider name and signature share entries.
+    """
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        def _lookup(args, kwargs):
+            """Returns (key, cached) — key is None when the call is not cacheable."""
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            call_args = dict(bound.arguments)
+            if not llm_cache.is_cacheable(call_args.get("temperature")):
+                llm_cache.record_bypass()
+                return None, None
+            key = llm_cache.make_key(provider, **call_args)
+            cached = llm_cache.get(key)
+            if cached is not None:
+                logger.debug("[LLMCache] HIT | provider=%s key=%s", provider, key[:12])
+            return key, cached
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                key, cached = _lookup(args, kwargs)
+                if cached is not None:
+                    return cached
+                response = await fn(*args, **kwargs)
+                if key:
+                    llm_cache.put(key, response)
+                return response
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key, cached = _lookup(args, kwargs)
+            if cached is not None:
+                return cached
+            response = fn(*args, **kwargs)
+            if key:
+                llm_cache.put(key, response)
+            return response
+
+        return wrapper
+    return decorator
+
+
+# Single global instance — shared by every provider adapter
+llm_cache = LLMResponseCache()
+metrics.register_collector("llm_cache", llm_cache.stats)
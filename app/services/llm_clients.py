@@ -0,0 +1,170 @@
+import asyncio
+import hashlib
+import logging
+import os
+import weakref
+from threading import RLock
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from app.services.metrics_service import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderClientRegistry:
+    """
+    The Provider Client Registry (The Switchboard Operator).
+
+    Holds one long-lived client per (provider, endpoint[, model]) so LLM calls
+    reuse pooled keep-alive connections instead of paying a TLS handshake and
+    SDK construction on every request.  Clients are created lazily on first
+    use; creation is serialised per registry, so concurrent first calls never
+    build duplicates.  The underlying httpx/requests pools are thread-safe.
+
+    Async clients (AsyncOpenAI, httpx.AsyncClient) are bound to the event
+    loop that created them, so get_async() keeps a separate set per running
+    loop; they are dropped together with their loop.
+
+    Callers pass the factory, which keeps SDK imports (and test patches) in
+    the adapter modules:
+
+        client = provider_clients.get(("openai", base_url), lambda: openai.OpenAI(...))
+    """
+
+    def __init__(self):
+        self.max_connections = int(os.getenv("LLM_HTTP_POOL_MAX_CONNECTIONS", "20"))
+        self.max_keepalive = int(os.getenv("LLM_HTTP_POOL_MAX_KEEPALIVE", "10"))
+        self.keepalive_expiry_s = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY_S", "30"))
+        self.timeout_s = float(os.getenv("LLM_HTTP_TIMEOUT_S", "60"))
+
+        self._clients = {}
+        self._versions = {}  # key -> version of the client built by get_current()
+        self._loop_clients = weakref.WeakKeyDictionary()  # loop -> {key: client}
+        self._lock = RLock()  # factories may call http_client() while creating
+        self._created = 0
+        logger.info("[ProviderClients] Initialised | max_connections=%d keepalive=%d",
+                    self.max_connections, self.max_keepalive)
+
+    # -----------------------------------------------------------------------
+    # Public API
+    # -----------------------------------------------------------------------
+
+    def get(self, key, factory):
+        """Returns the client registered under key, creating it with factory() on first use."""
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = factory()
+                self._clients[key] = client
+                self._created += 1
+                logger.info("[ProviderClients] Client created | key=%s", self._describe(key))
+        return client
+
+    def get_current(self, key, version, factory):
+        """
+        Like get(), but the client is rebuilt and replaces the pooled one
+        whenever version changes (e.g. a model bound to a context cache that
+        has rotated), so one key never holds more than one client.
+        """
+        client = self._clients.get(key)
+        if client is not None and self._versions.get(key) == version:
+            return client
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None or self._versions.get(key) != version:
+                replaced = client is not None
+                client = factory()
+                self._clients[key] = client
+                self._versions[key] = version
+                self._created += 1
+                logger.info("[ProviderClients] Client %s | key=%s",
+                            "replaced" if replaced else "created", self._describe(key))
+        return client
+
+    def get_async(self, key, factory):
+        """Like get(), but scoped to the running event loop.  Must be called from a coroutine."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = self._loop_clients.setdefault(loop, {})
+            client = clients.get(key)
+            if client is None:
+                client = factory()
+                clients[key] = client
+                self._created += 1
+                logger.info("[ProviderClients] Async client created | key=%s", self._describe(key))
+        return client
+
+    def async_http_client(self):
+        """Pooled httpx.AsyncClient for the running loop (async SDKs, Ollama)."""
+        return self.get_async(("httpx_async",), lambda: httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive,
+                keepalive_expiry=self.keepalive_expiry_s,
+            ),
+            timeout=self.timeout_s,
+        ))
+
+    def http_client(self):
+        """Shared pooled httpx.Client for the OpenAI/Azure OpenAI SDKs."""
+        return self.get(("httpx",), lambda: httpx.Client(
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive,
+                keepalive_expiry=self.keepalive_expiry_s,
+            ),
+            timeout=self.timeout_s,
+        ))
+
+    def requests_session(self, base_url):
+        """Pooled keep-alive requests.Session for a plain-HTTP provider (e.g. Ollama)."""
+        def _build():
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_connections)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            return session
+        return self.get(("requests", base_url), _build)
+
+    @staticmethod
+    def fingerprint(secret):
+        """Short, non-reversible tag so clients can be keyed per credential without storing it."""
+        return hashlib.sha256((secret or "").encode("utf-8")).hexdigest()[:12]
+
+    def reset(self):
+        """Closes and forgets every client (credential rotation, tests)."""
+        with self._lock:
+            clients, self._clients = self._clients, {}
+            self._versions = {}
+            self._loop_clients = weakref.WeakKeyDictionary()
+        for client in clients.values():
+            close = getattr(client, "close", None)
+            if callable(close):
+                try:
+                    close()
+                except Exception as e:
+                    logger.debug("[ProviderClients] Close failed: %s", e)
+
+    def stats(self):
+        with self._lock:
+            keys = [self._describe(key) for key in self._clients]
+            async_clients = sum(len(clients) for clients in self._loop_clients.values())
+            created = self._created
+        return {"clients": len(keys), "async_clients": async_clients, "created_total": created, "keys": keys}
+
+    # -----------------------------------------------------------------------
+    # Private
+    # -----------------------------------------------------------------------
+
+    @staticmethod
+    def _describe(key):
+        return ":".join(str(part) for part in key if part is not None)
+
+
+# Single global instance — shared by every LLM provider adapter
+provider_clients = ProviderClientRegistry()
+metrics.register_collector("llm_clients", provider_clients.stats)
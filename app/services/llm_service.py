@@ -2,41 +2,84 @@ import os
 import json
 import re
 import logging
+import threading
+import time
 import requests
 from app.services.agent_service import call_agent_api
 from app.services.audit_service import historian
 from app.services.orchestrator import dispatcher
+from app.utils.lazy import lazy_import, register_warmup
+from app.utils.pii_sanitizer import PIISanitizer
+from app.services.llm_cache import GovernorBusyText, ProviderErrorText, cached_completion
+from app.services.llm_clients import provider_clients
+from app.services.provider_router import provider_router
+from app.services.rate_governor import GovernorTimeout, governed, rate_governor
+from app.services.llm_telemetry import instrumented, llm_telemetry
+from app.services.knowledge_service import cache_manager
+from app.services.context_budget import context_budgeter
+from app.services.metrics_service import Histogram, metrics
 
 logger = logging.getLogger(__name__)
 
-try:
-    import openai
-except ImportError:
-    pass
-
-try:
-    import anthropic
-except ImportError:
-    pass
-
-try:
-    import vertexai
-    from vertexai.generative_models import GenerativeModel, Part, Content, GenerationConfig
-    from vertexai.preview import caching
-    from vertexai.language_models import TextEmbeddingModel
-except ImportError:
-    vertexai = None
-    GenerativeModel = Part = Content = GenerationConfig = caching = TextEmbeddingModel = None
-
-from app.utils.pii_sanitizer import sanitizer
+# Provider SDKs are imported on first use (or by warmup()), not at import
+openai = lazy_import("openai")
+vertexai = lazy_import("vertexai")
+GenerativeModel = lazy_import("vertexai.generative_models", "GenerativeModel")
+Part = lazy_import("vertexai.generative_models", "Part")
+GenerationConfig = lazy_import("vertexai.generative_models", "GenerationConfig")
 
 
 # ---------------------------------------------------------------------------
 # Prompt Builders
 # ---------------------------------------------------------------------------
 
+# Static advisor instructions.  Kept byte-identical across users and turns
+# and placed first, so provider prompt caches (OpenAI/Azure automatic prefix
+# caching, Gemini context caches) can reuse them; everything per-user goes
+# after it.
+ADVISOR_INSTRUCTIONS = """As RetireIQ, a retirement agent chatbot with access to the customer's structured personal and
+financial data in JSON format, begin a short, personalized conversation to guide the customer
+toward the sub-intent "Choose retirement investments." First, extract the customer's first name
+from the field personal_details.first_name and use it naturally to address them throughout the
+interaction. Acknowledge their current financial stage without repeating known details.
+Ask if they're currently more focused on growing long-term retirement savings or keeping flexibility for
+short-term needs. Based on their response, follow up to understand whether they prefer a hands-on
+investment style or an automated, guided approach. If needed, ask if they have specific
+preferences or exclusions (e.g., ESG, sectors to avoid). Keep the conversation friendly and
+concise, ask only relevant questions (up to five), and stop once enough information is gathered
+to recommend suitable retirement investment options tailored to their goals and preferences.
+Follow any tone guidance given with the customer context below.
+
+Once intent and sub-intent are known, output your understanding in the following structured JSON
+format only and don't add any other text anywhere in response:
+{
+    "intent": "<detected primary intent>",
+    "sub_intent": "<detected sub-intent details>",
+    "summary": "<short natural-language summary of what the customer wants>"
+}"""
+
+
+class LayeredPrompt(str):
+    """
+    A system prompt split into a cacheable static `prefix` and a per-user
+    `context` suffix.  Behaves like the plain joined str for callers that
+    do not care; the adapters use the split to send the prefix as its own
+    system message / Gemini system instruction.
+    """
+
+    def __new__(cls, prefix, context):
+        prompt = super().__new__(cls, f"{prefix}\n\n{context}" if context else prefix)
+        prompt.prefix = prefix
+        prompt.context = context
+        return prompt
+
+
 def build_system_prompt(user_profile_string=""):
-    """Builds the base RetireIQ advisor system prompt from an anonymised profile."""
+    """
+    Builds the RetireIQ advisor system prompt from an anonymised profile:
+    the static ADVISOR_INSTRUCTIONS followed by the per-user tone guidance,
+    memories and profile.
+    """
     try:
         parsed = json.loads(user_profile_string)
     except Exception:
@@ -44,34 +87,19 @@ def build_system_prompt(user_profile_string=""):
         parsed = {}
 
     memories = parsed.get("memories", [])
-    tone_instruction = _apply_behavioral_tone(parsed)
-
-    return f"""
-    As RetireIQ, a retirement agent chatbot with access to the customer's structured personal and
-    financial data in JSON format, begin a short, personalized conversation to guide the customer
-    toward the sub-intent "Choose retirement investments." First, extract the customer's first name
-    from the field personal_details.first_name and use it naturally to address them throughout the
-    interaction. Acknowledge their current financial stage without repeating known details.{tone_instruction}
-    Ask if they're currently more focused on growing long-term retirement savings or keeping flexibility for
-    short-term needs. Based on their response, follow up to understand whether they prefer a hands-on
-    investment style or an automated, guided approach. If needed, ask if they have specific
-    preferences or exclusions (e.g., ESG, sectors to avoid). Keep the conversation friendly and
-    concise, ask only relevant questions (up to five), and stop once enough information is gathered
-    to recommend suitable retirement investment options tailored to their goals and preferences.
-
-    Once intent and sub-intent are known, output your understanding in the following structured JSON
-    format only and don't add any other text anywhere in response:
-    {{
-        "intent": "<detected primary intent>",
-        "sub_intent": "<detected sub-intent details>",
-        "summary": "<short natural-language summary of what the customer wants>"
-    }}
-
-    Historical Context / Permanent Memories:
-    {json.dumps(memories)}
-
-    User Profile Data: {user_profile_string}
-    """
+    tone_instruction = _apply_behavioral_tone(parsed).strip()
+
+    sections = ["Customer context:"]
+    if tone_instruction:
+        sections.append(tone_instruction)
+    sections += [
+        "",
+        "Historical Context / Permanent Memories:",
+        json.dumps(memories),
+        "",
+        f"User Profile Data: {user_profile_string}",
+    ]
+    return LayeredPrompt(ADVISOR_INSTRUCTIONS, "\n".join(sections))
 
 
 def _apply_behavioral_tone(profile):
@@ -91,12 +119,22 @@ def _apply_behavioral_tone(profile):
 
 
 def prepare_openai_messages(system_prompt, conversation_history, message):
-    """Assembles the messages list in OpenAI chat-completion format."""
-    messages = [{"role": "system", "content": system_prompt}]
+    """
+    Assembles the messages list in OpenAI chat-completion format.  A
+    LayeredPrompt becomes two system messages, static prefix first, so the
+    provider's prefix cache covers it.
+    """
+    if isinstance(system_prompt, LayeredPrompt):
+        messages = [{"role": "system", "content": system_prompt.prefix}]
+        if system_prompt.context:
+            messages.append({"role": "system", "content": system_prompt.context})
+    else:
+        messages = [{"role": "system", "content": system_prompt}]
 
     if conversation_history:
         for msg in conversation_history:
-            role = "user" if msg["type"] == "user" else "assistant"
+            # A compacted-history summary (ContextBudgeter) is context, not a turn
+            role = {"user": "user", "summary": "system"}.get(msg["type"], "assistant")
             messages.append({"role": role, "content": msg["content"]})
 
     messages.append({"role": "user", "content": message})
@@ -113,26 +151,143 @@ def prepare_azure_openai_messages(system_prompt, conversation_history, message):
 # LLM Provider Adapters
 # ---------------------------------------------------------------------------
 
+def _openai_client():
+    """Pooled OpenAI client for the configured API key."""
+    api_key = os.environ.get("OPENAI_API_KEY")
+    return provider_clients.get(
+        ("openai", provider_clients.fingerprint(api_key)),
+        lambda: openai.OpenAI(api_key=api_key, http_client=provider_clients.http_client()),
+    )
+
+
+def _azure_openai_client():
+    """Pooled AzureOpenAI client, or None when the credentials are incomplete."""
+    api_key = os.getenv("AZURE_OPENAI_API_KEY")
+    api_base = os.getenv("AZURE_OPENAI_ENDPOINT")
+    api_version = os.getenv("AZURE_OPENAI_API_VERSION", "2023-12-01-preview")
+    if not api_key or not api_base:
+        return None
+    return provider_clients.get(
+        ("azure_openai", api_base, api_version, provider_clients.fingerprint(api_key)),
+        lambda: openai.AzureOpenAI(
+            api_key=api_key, azure_endpoint=api_base, api_version=api_version,
+            http_client=provider_clients.http_client(),
+        ),
+    )
+
+
+def _vertex_model(model_name, system_instruction=None):
+    """
+    Initialises Vertex AI once per project/region and returns a pooled model
+    handle.  A system instruction of at least VERTEX_CACHE_MIN_TOKENS (Gemini
+    1.5's context-cache minimum) is served from a VertexCacheManager cache;
+    smaller ones, including ADVISOR_INSTRUCTIONS (~425 tokens), are set on
+    the model.  One model is pooled per (model, instruction); it is rebuilt
+    in place when its cache rotates, so expired cache names don't pile up.
+    """
+    project_id = os.getenv("GCP_PROJECT_ID")
+    location = os.getenv("GCP_REGION", "us-central1")
+    provider_clients.get(
+        ("vertex_ai_init", project_id, location),
+        lambda: vertexai.init(project=project_id, location=location) or True,
+    )
+    if not system_instruction:
+        return provider_clients.get(
+            ("vertex_ai", project_id, location, model_name),
+            lambda: GenerativeModel(model_name),
+        )
+
+    key = ("vertex_ai", project_id, location, model_name, provider_clients.fingerprint(system_instruction))
+    cached_content = cache_manager.prefix_cache(model_name, system_instruction)
+    if cached_content:
+        return provider_clients.get_current(
+            key, cached_content, lambda: GenerativeModel.from_cached_content(cached_content=cached_content),
+        )
+    return provider_clients.get_current(
+        key, None, lambda: GenerativeModel(model_name, system_instruction=system_instruction),
+    )
+
+
+def _vertex_prompt(system_prompt, message):
+    """(prompt, system_instruction) for Gemini: a LayeredPrompt's static prefix becomes the system instruction."""
+    if isinstance(system_prompt, LayeredPrompt):
+        return f"{system_prompt.context}\n\nUser: {message}", system_prompt.prefix
+    return f"{system_prompt}\n\nUser: {message}", None
+
+
+def _openai_cache_options(messages):
+    """
+    Routes requests sharing a static system prefix to the same OpenAI prompt
+    cache (prompt_cache_key), which raises prefix-cache hit rates.
+    """
+    if os.getenv("OPENAI_PROMPT_CACHE_KEY", "true").lower() != "true":
+        return {}
+    if not messages or messages[0].get("role") != "system":
+        return {}
+    key = provider_clients.fingerprint(messages[0]["content"])
+    return {"extra_body": {"prompt_cache_key": f"retireiq-{key}"}}
+
+
+def _record_openai_usage(response):
+    usage = getattr(response, "usage", None)
+    llm_telemetry.record_usage(
+        getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None),
+        cached_tokens=getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None),
+    )
+
+
+def _record_vertex_usage(response):
+    usage = getattr(response, "usage_metadata", None)
+    llm_telemetry.record_usage(
+        getattr(usage, "prompt_token_count", None), getattr(usage, "candidates_token_count", None),
+        cached_tokens=getattr(usage, "cached_content_token_count", None),
+    )
+
+
+def _record_ollama_usage(body):
+    llm_telemetry.record_usage(body.get("prompt_eval_count"), body.get("eval_count"))
+
+
+def _vertex_contents(prompt, attachments):
+    """Assembles multimodal Gemini content from a prompt and attachments."""
+    contents = [prompt]
+    for att in attachments or []:
+        if isinstance(att, str):  # Assume base64 or URI
+            if att.startswith("gs://"):
+                contents.append(Part.from_uri(att, mime_type="application/pdf"))
+            else:
+                contents.append(Part.from_data(att, mime_type="image/jpeg"))
+    return contents
+
+
+@cached_completion("openai")
+@governed("openai")
+@instrumented("openai")
 def call_openai_api(messages, model, temperature):
     """Calls the OpenAI Chat Completions API and returns the response text."""
     logger.info("Calling OpenAI API | model=%s temperature=%s", model, temperature)
     try:
-        client = openai.OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+        client = _openai_client()
         if not client.api_key:
             logger.warning("OPENAI_API_KEY is not configured.")
-            return "I'm sorry, the OpenAI API key is not configured correctly."
+            return ProviderErrorText("I'm sorry, the OpenAI API key is not configured correctly.")
 
         response = client.chat.completions.create(
-            model=model, messages=messages, temperature=temperature, max_tokens=500
+            model=model, messages=messages, temperature=temperature, max_tokens=500,
+            **_openai_cache_options(messages),
         )
         content = response.choices[0].message.content
+        _record_openai_usage(response)
         logger.debug("OpenAI response received (first 80 chars): %s", content[:80])
         return content
     except Exception as e:
         logger.error("OpenAI API call failed: %s", e, exc_info=True)
-        return f"I'm sorry, I encountered an error processing your request: {e}"
+        return ProviderErrorText(f"I'm sorry, I encountered an error processing your request: {e}")
 
 
+@cached_completion("ollama")
+@governed("ollama")
+@instrumented("ollama")
 def call_ollama_api(messages, model, temperature):
     """Calls a locally-running Ollama instance and returns the response text."""
     base_url = os.environ.get("OLLAMA_HOST", "http://host.docker.internal:11434")
@@ -146,54 +301,247 @@ def call_ollama_api(messages, model, temperature):
         "options": {"temperature": temperature},
     }
     try:
-        response = requests.post(url, json=payload, timeout=30)
+        session = provider_clients.requests_session(base_url)
+        response = session.post(url, json=payload, timeout=30)
         response.raise_for_status()
-        content = response.json().get("message", {}).get("content", "")
+        body = response.json()
+        _record_ollama_usage(body)
+        content = body.get("message", {}).get("content", "")
         logger.debug("Ollama response received (first 80 chars): %s", content[:80])
         return content
     except Exception as e:
         logger.error("Ollama API call failed: %s", e, exc_info=True)
-        return f"I'm sorry, I encountered an error with the local Ollama service: {e}"
+        return ProviderErrorText(f"I'm sorry, I encountered an error with the local Ollama service: {e}")
 
 
-def call_vertex_ai_api(prompt, model_name="gemini-1.5-pro", temperature=0.7, attachments=None):
+@cached_completion("vertex_ai")
+@governed("vertex_ai")
+@instrumented("vertex_ai")
+def call_vertex_ai_api(prompt, model_name="gemini-1.5-pro", temperature=0.7, attachments=None,
+                       system_instruction=None):
     """
     Calls Google Cloud Vertex AI (Gemini 1.5) and returns the response text.
     Supports multimodal inputs if attachments (list of base64 data) are provided.
+    A system_instruction (static prompt prefix) may be served from a context cache.
     """
     if not vertexai:
         logger.warning("Vertex AI SDK not installed. Returning fallback.")
-        return "Vertex AI SDK not installed. Please check requirements.txt."
+        return ProviderErrorText("Vertex AI SDK not installed. Please check requirements.txt.")
 
-    project_id = os.getenv("GCP_PROJECT_ID")
-    location = os.getenv("GCP_REGION", "us-central1")
     logger.info("Calling Vertex AI | model=%s multimodal=%s", model_name, bool(attachments))
 
     try:
-        vertexai.init(project=project_id, location=location)
-        model = GenerativeModel(model_name)
+        # SDK initialisation and model handles are built once and reused
+        model = _vertex_model(model_name, system_instruction)
         config = GenerationConfig(temperature=temperature, max_output_tokens=2048)
         
-        # Assemble multimodal content
-        contents = [prompt]
-        if attachments:
-            for att in attachments:
-                if isinstance(att, str): # Assume base64 or URI
-                    if att.startswith("gs://"):
-                        contents.append(Part.from_uri(att, mime_type="application/pdf"))
-                    else:
-                        contents.append(Part.from_data(att, mime_type="image/jpeg"))
-
-        response = model.generate_content(contents, generation_config=config)
+        response = model.generate_content(_vertex_contents(prompt, attachments), generation_config=config)
+        _record_vertex_usage(response)
         return response.text
     except Exception as e:
         logger.error("Vertex AI call failed: %s", e)
-        return f"Vertex AI Error: {str(e)}"
+        return ProviderErrorText(f"Vertex AI Error: {str(e)}")
 
 
+@cached_completion("azure_openai")
+@governed("azure_openai")
+@instrumented("azure_openai")
 def call_azure_openai_api_with_key(messages, model, temperature=0.7, max_tokens=500):
-    """Calls Azure-hosted OpenAI via the legacy ChatCompletion API."""
+    """Calls Azure-hosted OpenAI via a pooled AzureOpenAI client."""
     logger.info("Calling Azure OpenAI | model=%s temperature=%s", model, temperature)
+    try:
+        client = _azure_openai_client()
+        if client is None:
+            logger.warning("Azure OpenAI credentials are not fully configured.")
+            return ProviderErrorText("I'm sorry, the Azure OpenAI API key or endpoint is not configured correctly.")
+
+        response = client.chat.completions.create(
+            model=model, messages=messages, temperature=temperature, max_tokens=max_tokens
+        )
+        content = response.choices[0].message.content
+        _record_openai_usage(response)
+        logger.debug("Azure OpenAI response received (first 80 chars): %s", content[:80])
+        return content
+    except Exception as e:
+        logger.error("Azure OpenAI API call failed: %s", e, exc_info=True)
+        return ProviderErrorText(f"I'm sorry, I encountered an error processing your request: {e}")
+
+
+# ---------------------------------------------------------------------------
+# Streaming LLM Provider Adapters
+# ---------------------------------------------------------------------------
+# Generators yielding text deltas as the provider produces them.  Unlike the
+# blocking adapters they raise on failure, so the caller can fall back to a
+# blocking call when nothing has been streamed yet.
+
+def stream_openai_api(messages, model, temperature):
+    """Streams an OpenAI chat completion (stream=True), yielding text deltas."""
+    logger.info("Streaming OpenAI API | model=%s temperature=%s", model, temperature)
+    client = _openai_client()
+    if not client.api_key:
+        raise RuntimeError("OPENAI_API_KEY is not configured.")
+    stream = client.chat.completions.create(
+        model=model, messages=messages, temperature=temperature, max_tokens=500, stream=True,
+        **_openai_cache_options(messages),
+    )
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+def stream_azure_openai_api_with_key(messages, model, temperature=0.7, max_tokens=500):
+    """Streams an Azure OpenAI chat completion (stream=True), yielding text deltas."""
+    logger.info("Streaming Azure OpenAI | model=%s temperature=%s", model, temperature)
+    client = _azure_openai_client()
+    if client is None:
+        raise RuntimeError("Azure OpenAI credentials are not fully configured.")
+    stream = client.chat.completions.create(
+        model=model, messages=messages, temperature=temperature, max_tokens=max_tokens, stream=True
+    )
+    for chunk in stream:
+        # Azure sends a leading content-filter chunk with no choices
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+def stream_ollama_api(messages, model, temperature):
+    """Streams an Ollama chat (stream: true, NDJSON lines), yielding text deltas."""
+    base_url = os.environ.get("OLLAMA_HOST", "http://host.docker.internal:11434")
+    url = f"{base_url}/api/chat"
+    logger.info("Streaming Ollama API | url=%s model=%s", url, model)
+
+    payload = {
+        "model": model,
+        "messages": messages,
+        "stream": True,
+        "options": {"temperature": temperature},
+    }
+    session = provider_clients.requests_session(base_url)
+    with session.post(url, json=payload, timeout=30, stream=True) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            content = chunk.get("message", {}).get("content")
+            if content:
+                yield content
+            if chunk.get("done"):
+                break
+
+
+def stream_vertex_ai_api(prompt, model_name="gemini-1.5-pro", temperature=0.7, attachments=None,
+                         system_instruction=None):
+    """Streams a Vertex AI (Gemini) generation (stream=True), yielding text deltas."""
+    if not vertexai:
+        raise RuntimeError("Vertex AI SDK not installed.")
+    logger.info("Streaming Vertex AI | model=%s multimodal=%s", model_name, bool(attachments))
+    model = _vertex_model(model_name, system_instruction)
+    config = GenerationConfig(temperature=temperature, max_output_tokens=2048)
+    for chunk in model.generate_content(
+        _vertex_contents(prompt, attachments), generation_config=config, stream=True
+    ):
+        try:
+            text = chunk.text
+        except ValueError:  # safety-filtered or empty candidate
+            continue
+        if text:
+            yield text
+
+
+# ---------------------------------------------------------------------------
+# Async LLM Provider Adapters
+# ---------------------------------------------------------------------------
+# Same signatures, return values and cache entries as the blocking adapters
+# above, but driven by the event loop: no thread is held while waiting on
+# the provider.  Clients are pooled per running loop.  Used where several
+# providers are called at once (the Debater's viewpoints); the chat pipeline
+# itself stays blocking.
+
+@cached_completion("openai")
+@governed("openai")
+@instrumented("openai")
+async def acall_openai_api(messages, model, temperature):
+    """Async variant of call_openai_api."""
+    logger.info("Calling OpenAI API (async) | model=%s temperature=%s", model, temperature)
+    try:
+        api_key = os.environ.get("OPENAI_API_KEY")
+        client = provider_clients.get_async(
+            ("openai", provider_clients.fingerprint(api_key)),
+            lambda: openai.AsyncOpenAI(api_key=api_key, http_client=provider_clients.async_http_client()),
+        )
+        if not client.api_key:
+            logger.warning("OPENAI_API_KEY is not configured.")
+            return ProviderErrorText("I'm sorry, the OpenAI API key is not configured correctly.")
+
+        response = await client.chat.completions.create(
+            model=model, messages=messages, temperature=temperature, max_tokens=500,
+            **_openai_cache_options(messages),
+        )
+        _record_openai_usage(response)
+        return response.choices[0].message.content
+    except Exception as e:
+        logger.error("OpenAI API call failed: %s", e, exc_info=True)
+        return ProviderErrorText(f"I'm sorry, I encountered an error processing your request: {e}")
+
+
+@cached_completion("ollama")
+@governed("ollama")
+@instrumented("ollama")
+async def acall_ollama_api(messages, model, temperature):
+    """Async variant of call_ollama_api."""
+    base_url = os.environ.get("OLLAMA_HOST", "http://host.docker.internal:11434")
+    url = f"{base_url}/api/chat"
+    logger.info("Calling Ollama API (async) | url=%s model=%s", url, model)
+
+    payload = {
+        "model": model,
+        "messages": messages,
+        "stream": False,
+        "options": {"temperature": temperature},
+    }
+    try:
+        response = await provider_clients.async_http_client().post(url, json=payload, timeout=30)
+        response.raise_for_status()
+        body = response.json()
+        _record_ollama_usage(body)
+        return body.get("message", {}).get("content", "")
+    except Exception as e:
+        logger.error("Ollama API call failed: %s", e, exc_info=True)
+        return ProviderErrorText(f"I'm sorry, I encountered an error with the local Ollama service: {e}")
+
+
+@cached_completion("vertex_ai")
+@governed("vertex_ai")
+@instrumented("vertex_ai")
+async def acall_vertex_ai_api(prompt, model_name="gemini-1.5-pro", temperature=0.7, attachments=None,
+                              system_instruction=None):
+    """Async variant of call_vertex_ai_api."""
+    if not vertexai:
+        logger.warning("Vertex AI SDK not installed. Returning fallback.")
+        return ProviderErrorText("Vertex AI SDK not installed. Please check requirements.txt.")
+
+    logger.info("Calling Vertex AI (async) | model=%s multimodal=%s", model_name, bool(attachments))
+
+    try:
+        model = _vertex_model(model_name, system_instruction)
+        config = GenerationConfig(temperature=temperature, max_output_tokens=2048)
+        response = await model.generate_content_async(
+            _vertex_contents(prompt, attachments), generation_config=config
+        )
+        _record_vertex_usage(response)
+        return response.text
+    except Exception as e:
+        logger.error("Vertex AI call failed: %s", e)
+        return ProviderErrorText(f"Vertex AI Error: {str(e)}")
+
+
+@cached_completion("azure_openai")
+@governed("azure_openai")
+@instrumented("azure_openai")
+async def acall_azure_openai_api_with_key(messages, model, temperature=0.7, max_tokens=500):
+    """Async variant of call_azure_openai_api_with_key."""
+    logger.info("Calling Azure OpenAI (async) | model=%s temperature=%s", model, temperature)
     try:
         api_key = os.getenv("AZURE_OPENAI_API_KEY")
         api_base = os.getenv("AZURE_OPENAI_ENDPOINT")
@@ -201,22 +549,23 @@ def call_azure_openai_api_with_key(messages, model, temperature=0.7, max_tokens=
 
         if not api_key or not api_base:
             logger.warning("Azure OpenAI credentials are not fully configured.")
-            return "I'm sorry, the Azure OpenAI API key or endpoint is not configured correctly."
-
-        openai.api_type = "azure"
-        openai.api_key = api_key
-        openai.api_base = api_base
-        openai.api_version = api_version
-
-        response = openai.ChatCompletion.create(
-            engine=model, messages=messages, temperature=temperature, max_tokens=max_tokens
+            return ProviderErrorText("I'm sorry, the Azure OpenAI API key or endpoint is not configured correctly.")
+
+        client = provider_clients.get_async(
+            ("azure_openai", api_base, api_version, provider_clients.fingerprint(api_key)),
+            lambda: openai.AsyncAzureOpenAI(
+                api_key=api_key, azure_endpoint=api_base, api_version=api_version,
+                http_client=provider_clients.async_http_client(),
+            ),
         )
-        content = response["choices"][0]["message"]["content"]
-        logger.debug("Azure OpenAI response received (first 80 chars): %s", content[:80])
-        return content
+        response = await client.chat.completions.create(
+            model=model, messages=messages, temperature=temperature, max_tokens=max_tokens
+        )
+        _record_openai_usage(response)
+        return response.choices[0].message.content
     except Exception as e:
         logger.error("Azure OpenAI API call failed: %s", e, exc_info=True)
-        return f"I'm sorry, I encountered an error processing your request: {e}"
+        return ProviderErrorText(f"I'm sorry, I encountered an error processing your request: {e}")
 
 
 # ---------------------------------------------------------------------------
@@ -237,6 +586,20 @@ def _resolve_llm_config():
 def _call_llm_provider(
     provider, model, temperature, system_prompt, history, sanitized_message, 
     attachments=None
+):
+    """
+    Calls the configured provider through the provider router, which fails
+    over to LLM_FALLBACK_PROVIDERS when the primary errors or its circuit
+    is open.
+    """
+    return provider_router.call(provider, model, lambda p, m: _call_provider_adapter(
+        p, m, temperature, system_prompt, history, sanitized_message, attachments
+    ))
+
+
+def _call_provider_adapter(
+    provider, model, temperature, system_prompt, history, sanitized_message,
+    attachments=None
 ):
     """Routes to the correct LLM provider adapter. Supports multimodal for Vertex AI."""
     logger.info("Routing to LLM provider: %s | multimodal=%s", provider, bool(attachments))
@@ -250,8 +613,9 @@ def _call_llm_provider(
         return call_azure_openai_api_with_key(messages, model, temperature)
 
     elif provider == "vertex_ai":
-        full_prompt = f"{system_prompt}\n\nUser: {sanitized_message}"
-        return call_vertex_ai_api(full_prompt, model, temperature, attachments=attachments)
+        prompt, system_instruction = _vertex_prompt(system_prompt, sanitized_message)
+        return call_vertex_ai_api(prompt, model, temperature, attachments=attachments,
+                                  system_instruction=system_instruction)
 
     elif provider == "ollama":
         messages = prepare_openai_messages(system_prompt, history, sanitized_message)
@@ -262,9 +626,99 @@ def _call_llm_provider(
         return None
 
 
-def _run_pii_scrub(message, user_profile, conversation_id):
+_stream_stats = {"streams": 0, "fallbacks": 0, "failed": 0}
+_stream_lock = threading.Lock()
+_ttft_ms = Histogram((100, 250, 500, 1000, 2000, 5000, 10000))
+
+
+def _incr_stream_stat(key):
+    with _stream_lock:
+        _stream_stats[key] += 1
+
+
+def _stream_llm_provider(
+    provider, model, temperature, system_prompt, history, sanitized_message,
+    on_token, attachments=None
+):
+    """
+    Streaming variant of _call_llm_provider: passes each text delta to
+    on_token(delta) as it arrives and returns the full response.  If the
+    stream fails before the first token, falls back to the blocking adapter;
+    a failure mid-stream is raised, since a truncated answer must not be
+    persisted.  A provider whose circuit is open is not streamed from; the
+    blocking router call fails over instead.
+    """
+    if not provider_router.is_available(provider, model):
+        return _call_llm_provider(provider, model, temperature, system_prompt, history,
+                                  sanitized_message, attachments=attachments)
+
+    if provider == "openai":
+        streamer = stream_openai_api
+        args = (prepare_openai_messages(system_prompt, history, sanitized_message), model, temperature)
+    elif provider == "azure_openai":
+        streamer = stream_azure_openai_api_with_key
+        args = (prepare_azure_openai_messages(system_prompt, history, sanitized_message), model, temperature)
+    elif provider == "vertex_ai":
+        streamer = stream_vertex_ai_api
+        prompt, system_instruction = _vertex_prompt(system_prompt, sanitized_message)
+        args = (prompt, model, temperature, attachments, system_instruction)
+    elif provider == "ollama":
+        streamer = stream_ollama_api
+        args = (prepare_openai_messages(system_prompt, history, sanitized_message), model, temperature)
+    else:
+        return _call_llm_provider(provider, model, temperature, system_prompt, history,
+                                  sanitized_message, attachments=attachments)
+
+    logger.info("Streaming from LLM provider: %s", provider)
+    _incr_stream_stat("streams")
+    started = time.monotonic()
+    chunks = []
+    call = None
+    try:
+        with rate_governor.slot(provider, model, rate_governor.estimate_tokens(args[0])), \
+                llm_telemetry.track(provider, model, args[0], streamed=True) as call:
+            for delta in streamer(*args):
+                if not chunks:
+                    _ttft_ms.observe((time.monotonic() - started) * 1000)
+                    call.first_byte()
+                chunks.append(delta)
+                on_token(delta)
+            call.response = "".join(chunks)
+    except GovernorTimeout:
+        logger.warning("LLM stream not admitted before its deadline | provider=%s", provider)
+        return GovernorBusyText("I'm sorry, our AI service is busy right now. Please try again in a moment.")
+    except Exception as e:
+        provider_router.record(provider, model, False, (time.monotonic() - started) * 1000)
+        if chunks:
+            _incr_stream_stat("failed")
+            logger.error("LLM stream failed after %d chunk(s): %s", len(chunks), e, exc_info=True)
+            raise
+        _incr_stream_stat("fallbacks")
+        logger.warning("LLM stream failed before the first token (%s); falling back to a blocking call.", e)
+        return _call_llm_provider(provider, model, temperature, system_prompt, history,
+                                  sanitized_message, attachments=attachments)
+    finally:
+        if call is not None:
+            llm_telemetry.audit(call)
+
+    provider_router.record(provider, model, True, (time.monotonic() - started) * 1000)
+    return "".join(chunks)
+
+
+def stream_stats():
+    """Stream counters and time-to-first-token histogram."""
+    with _stream_lock:
+        counters = dict(_stream_stats)
+    return {**counters, "ttft_ms": _ttft_ms.snapshot()}
+
+
+metrics.register_collector("llm_streaming", stream_stats)
+
+
+def _run_pii_scrub(pii, message, user_profile, conversation_id):
     """
-    Step 1 — Guardian Agent: Anonymises the incoming message and profile.
+    Step 1 — Guardian Agent: Anonymises the incoming message and profile
+    into the request's own Ghost Map (pii).
     Returns (sanitized_message, anonymized_profile_string).
     """
     logger.debug("[Guardian] Starting PII anonymisation | conv=%s", conversation_id)
@@ -275,10 +729,8 @@ def _run_pii_scrub(message, user_profile, conversation_id):
         content="Initializing PII sanitization for user profile and message.",
     )
 
-    sanitizer.clear_mapping()
-    anonymized_profile = sanitizer.sanitize_profile_to_string(user_profile if user_profile else {})
-    sanitized_message, message_mapping = sanitizer.sanitize_text(message)
-    sanitizer.mapping.update(message_mapping)
+    anonymized_profile = pii.sanitize_profile_to_string(user_profile if user_profile else {})
+    sanitized_message, message_mapping = pii.sanitize_text(message)
 
     logger.info(
         "[Guardian] Anonymisation complete | entities_masked=%d conv=%s",
@@ -300,7 +752,8 @@ def _run_dispatch(sanitized_message, user_profile, history, conversation_id):
     Returns the agent response string, or None to fall through to general LLM.
     """
     logger.info("[Dispatcher] Dispatching message | conv=%s", conversation_id)
-    agent_response = dispatcher.dispatch(sanitized_message, user_profile, history, conversation_id)
+    with llm_telemetry.tag(session_id=conversation_id):
+        agent_response = dispatcher.dispatch(sanitized_message, user_profile, history, conversation_id)
 
     if agent_response:
         logger.info("[Dispatcher] Specialist agent responded | conv=%s", conversation_id)
@@ -312,18 +765,28 @@ def _run_dispatch(sanitized_message, user_profile, history, conversation_id):
 
 def _run_general_llm(
     provider, model, temperature, anonymized_profile, history, sanitized_message, 
-    attachments=None
+    attachments=None, on_token=None, conversation_id=None
 ):
     """
     Step 3 — General LLM Fallback: Handles small-talk and non-domain queries.
-    Returns the raw (still anonymised) response string.
+    Returns the raw (still anonymised) response string.  With on_token, the
+    completion is streamed and each delta is passed to on_token as it arrives.
     """
-    logger.info("[General LLM] Generating fallback response | provider=%s", provider)
+    logger.info("[General LLM] Generating fallback response | provider=%s stream=%s",
+                provider, bool(on_token))
     system_prompt = build_system_prompt(anonymized_profile)
-    response = _call_llm_provider(
-        provider, model, temperature, system_prompt, history, sanitized_message,
-        attachments=attachments
-    )
+    history = context_budgeter.fit(history, system_prompt, sanitized_message, provider, model)
+    with llm_telemetry.tag(agent="GeneralLLM", session_id=conversation_id):
+        if on_token:
+            response = _stream_llm_provider(
+                provider, model, temperature, system_prompt, history, sanitized_message,
+                on_token, attachments=attachments
+            )
+        else:
+            response = _call_llm_provider(
+                provider, model, temperature, system_prompt, history, sanitized_message,
+                attachments=attachments
+            )
 
     if response is None:
         logger.error("[General LLM] Unsupported provider '%s'; returning error message.", provider)
@@ -332,13 +795,13 @@ def _run_general_llm(
     return response
 
 
-def _run_deanonymise(ai_response, conversation_id):
+def _run_deanonymise(pii, ai_response, conversation_id):
     """
     Step 4 — Guardian Agent: Re-hydrates PII tokens back into the response.
     Returns the final clean response.
     """
     logger.debug("[Guardian] Starting de-anonymisation | conv=%s", conversation_id)
-    final_response = sanitizer.deanonymize_response(ai_response)
+    final_response = pii.deanonymize_response(ai_response)
     historian.log_step(
         session_id=conversation_id,
         agent_name="Guardian",
@@ -353,20 +816,29 @@ def _run_deanonymise(ai_response, conversation_id):
 # Main Entry Point
 # ---------------------------------------------------------------------------
 
+def _emit_token(on_token, text):
+    if text:
+        on_token(text)
+
+
 def generate_ai_response(
     message, user_profile=None, conversation_history=None, llm_config=None, 
-    conversation_id=None, attachments=None
+    conversation_id=None, attachments=None, on_token=None
 ):
     """
     Full agentic pipeline for a single user message.
     Orchestrates the Guardian, Dispatcher, and Specialist Agents in a single flow.
+    With on_token, general-LLM answers are streamed: each de-anonymised text
+    delta is passed to on_token(delta) before the full response is returned.
     """
     logger.info("generate_ai_response started | conv=%s multimodal=%s", 
                 conversation_id, bool(attachments))
 
     # Phase 1: Preparation & PII Anonymisation
+    # The Ghost Map is scoped to this call, so concurrent turns never share it
     config = _resolve_llm_config()
-    sanitized_message, anonymized_profile = _run_pii_scrub(message, user_profile, conversation_id)
+    pii = PIISanitizer()
+    sanitized_message, anonymized_profile = _run_pii_scrub(pii, message, user_profile, conversation_id)
 
     # Phase 2: Intent-based Routing (Specialist Agents)
     # The Dispatcher internally handles Empath sentiment analysis and Guardrails
@@ -375,14 +847,21 @@ def generate_ai_response(
         return agent_response
 
     # Phase 3: General Intelligence Fallback (Multimodal-ready)
+    # Streamed deltas are re-hydrated incrementally; a placeholder split
+    # across chunks is held back until it is complete.
+    rehydrator = pii.stream_deanonymizer() if on_token else None
     ai_response = _run_general_llm(
         config["provider"], config["modelName"], config["temperature"],
         anonymized_profile, conversation_history, sanitized_message, 
-        attachments=attachments
+        attachments=attachments,
+        on_token=(lambda delta: _emit_token(on_token, rehydrator.feed(delta))) if on_token else None,
+        conversation_id=conversation_id,
     )
+    if rehydrator:
+        _emit_token(on_token, rehydrator.flush())
 
     # Phase 4: PII De-anonymisation
-    final_response = _run_deanonymise(ai_response, conversation_id)
+    final_response = _run_deanonymise(pii, ai_response, conversation_id)
 
     logger.info("generate_ai_response complete | conv=%s", conversation_id)
     return final_response
@@ -426,3 +905,14 @@ def generate_suggested_questions(message, response):
         {"id": str(uuid.uuid4()), "text": "How does inflation affect my retirement?", "category": "planning"},
         {"id": str(uuid.uuid4()), "text": "What are tax advantages of retirement accounts?", "category": "investment"},
     ]
+
+
+def _warm_provider_sdk():
+    """Imports the configured provider's SDK (Ollama needs none)."""
+    sdk = {"openai": openai, "azure_openai": openai, "vertex_ai": GenerativeModel}.get(
+        os.getenv("LLM_PROVIDER", "azure_openai")
+    )
+    return sdk.resolve() if sdk is not None else None
+
+
+register_warmup("llm_sdk", _warm_provider_sdk)
@@ -0,0 +1,304 @@
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from threading import Lock
+from app.services import async_runtime
+from app.services.llm_cache import ProviderErrorText
+from app.services.metrics_service import Histogram, metrics
+
+logger = logging.getLogger(__name__)
+
+# USD per million (input, output, cached input) tokens; LLM_PRICING overrides or extends it
+DEFAULT_PRICING = {
+    "gpt-4o": (2.50, 10.00, 1.25),
+    "gpt-4o-mini": (0.15, 0.60, 0.075),
+    "gemini-1.5-pro": (1.25, 5.00, 0.3125),
+    "gemini-1.5-flash": (0.075, 0.30, 0.01875),
+}
+
+LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2000, 5000, 10000, 30000)
+
+_tags = contextvars.ContextVar("llm_tags", default={})
+_active_call = contextvars.ContextVar("llm_active_call", default=None)
+
+
+class LLMCall:
+    """Measurements for one provider call, filled in while it runs."""
+
+    __slots__ = ("provider", "model", "agent", "session_id", "streamed", "started",
+                 "wall_ms", "ttfb_ms", "prompt_tokens", "completion_tokens",
+                 "cached_tokens", "tokens_estimated", "cost_usd", "ok", "payload", "response")
+
+    def __init__(self, provider, model, payload, streamed=False):
+        tags = _tags.get()
+        self.provider = provider
+        self.model = model
+        self.agent = tags.get("agent") or "Unattributed"
+        self.session_id = tags.get("session_id")
+        self.streamed = streamed
+        self.started = time.perf_counter()
+        self.payload = payload
+        self.response = None
+        self.wall_ms = self.ttfb_ms = None
+        self.prompt_tokens = self.completion_tokens = None
+        self.cached_tokens = 0
+        self.tokens_estimated = False
+        self.cost_usd = 0.0
+        self.ok = False
+
+    def first_byte(self):
+        if self.ttfb_ms is None:
+            self.ttfb_ms = (time.perf_counter() - self.started) * 1000
+
+    def as_metadata(self):
+        return {
+            "provider": self.provider,
+            "model_name": self.model,
+            "latency_ms": round(self.wall_ms, 1),
+            "ttfb_ms": round(self.ttfb_ms, 1) if self.ttfb_ms is not None else None,
+            "streamed": self.streamed,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
+            "tokens_estimated": self.tokens_estimated,
+            "cost_usd": round(self.cost_usd, 6),
+            "ok": self.ok,
+        }
+
+
+class LLMTelemetry:
+    """
+    The LLM Telemetry Recorder (The Accountant).
+
+    Wraps every provider call (blocking, async and streaming) and records
+    wall time, time to first token for streams, prompt/completion tokens
+    (from the provider's usage block, else estimated at 4 chars per token)
+    and estimated cost from a per-model price table.  Calls are attributed to
+    the agent and session set with tag():
+
+        with llm_telemetry.tag(agent="Dispatcher", session_id=conversation_id):
+            ...
+
+    Aggregates per agent and per provider:model are served from /metrics.
+    Each call in a tagged session is also written to the Historian as an
+    LLM_CALL step, with step_metadata holding model_name, tokens, latency
+    and cost.  LLM_TELEMETRY_AUDIT=false turns that off.
+    """
+
+    def __init__(self):
+        self.audit_enabled = os.getenv("LLM_TELEMETRY_AUDIT", "true").lower() == "true"
+        self.pricing = {**DEFAULT_PRICING, **self._parse_pricing(os.getenv("LLM_PRICING", ""))}
+        self._lock = Lock()
+        self._by_agent = {}
+        self._by_model = {}
+        logger.info("[LLMTelemetry] Initialised | audit=%s priced_models=%d",
+                    self.audit_enabled, len(self.pricing))
+
+    # -----------------------------------------------------------------------
+    # Public API
+    # -----------------------------------------------------------------------
+
+    @contextmanager
+    def tag(self, agent=None, session_id=None):
+        """Attributes the enclosed LLM calls to an agent and/or session (nested tags merge)."""
+        current = _tags.get()
+        token = _tags.set({
+            "agent": agent or current.get("agent"),
+            "session_id": session_id or current.get("session_id"),
+        })
+        try:
+            yield
+        finally:
+            _tags.reset(token)
+
+    @contextmanager
+    def track(self, provider, model, payload, streamed=False):
+        """
+        Measures the enclosed provider call.  Set call.response before the
+        block ends; the record is aggregated on exit.  Audit writing is left
+        to the caller (audit()), so async callers can move it off the loop.
+        """
+        call = LLMCall(provider, model, payload, streamed)
+        token = _active_call.set(call)
+        try:
+            yield call
+        finally:
+            _active_call.reset(token)
+            self._finish(call)
+
+    def record_usage(self, prompt_tokens=None, completion_tokens=None, cached_tokens=None):
+        """
+        Called by adapters with the provider-reported token usage; cached_tokens
+        is the part of the prompt served from the provider's prompt cache.
+        """
+        call = _active_call.get()
+        if call is None:
+            return
+        if _is_count(prompt_tokens):
+            call.prompt_tokens = prompt_tokens
+        if _is_count(completion_tokens):
+            call.completion_tokens = completion_tokens
+        if _is_count(cached_tokens):
+            call.cached_tokens = cached_tokens
+
+    def audit(self, call):
+        """Writes the call to the Historian when it belongs to a session."""
+        if not (self.audit_enabled and call.session_id):
+            return
+        from app.services.audit_service import historian
+        historian.log_step(
+            session_id=call.session_id,
+            agent_name=call.agent,
+            step_type="LLM_CALL",
+            content=f"{call.provider}:{call.model} call {'succeeded' if call.ok else 'failed'} "
+                    f"in {call.wall_ms:.0f} ms",
+            step_metadata=call.as_metadata(),
+        )
+
+    def estimate_cost(self, model, prompt_tokens, completion_tokens, cached_tokens=0):
+        input_price, output_price, cached_price = self.pricing.get(model, (0.0, 0.0, 0.0))
+        cached_tokens = min(cached_tokens, prompt_tokens)
+        return (
+            (prompt_tokens - cached_tokens) * input_price
+            + cached_tokens * cached_price
+            + completion_tokens * output_price
+        ) / 1_000_000
+
+    def reset(self):
+        with self._lock:
+            self._by_agent = {}
+            self._by_model = {}
+
+    def stats(self):
+        with self._lock:
+            by_agent = {name: self._snapshot(entry) for name, entry in self._by_agent.items()}
+            by_model = {name: self._snapshot(entry) for name, entry in self._by_model.items()}
+        return {
+            "calls": sum(entry["calls"] for entry in by_model.values()),
+            "cost_usd": round(sum(entry["cost_usd"] for entry in by_model.values()), 6),
+            "by_agent": by_agent,
+            "by_model": by_model,
+        }
+
+    # -----------------------------------------------------------------------
+    # Private — Aggregation
+    # -----------------------------------------------------------------------
+
+    def _finish(self, call):
+        call.wall_ms = (time.perf_counter() - call.started) * 1000
+        call.ok = call.response is not None and not isinstance(call.response, ProviderErrorText)
+        if call.prompt_tokens is None or call.completion_tokens is None:
+            call.tokens_estimated = True
+            if call.prompt_tokens is None:
+                call.prompt_tokens = _estimate_tokens(call.payload)
+            if call.completion_tokens is None:
+                call.completion_tokens = _estimate_tokens(call.response) if call.ok else 0
+        call.cost_usd = self.estimate_cost(call.model, call.prompt_tokens, call.completion_tokens, call.cached_tokens)
+        call.payload = call.response = None  # never hold prompts past the call
+
+        with self._lock:
+            for table, key in ((self._by_agent, call.agent), (self._by_model, f"{call.provider}:{call.model}")):
+                entry = table.get(key)
+                if entry is None:
+                    entry = table[key] = {
+                        "calls": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                        "cached_tokens": 0, "cost_usd": 0.0, "latency_ms": Histogram(LATENCY_BUCKETS_MS),
+                        "ttfb_ms": Histogram(LATENCY_BUCKETS_MS),
+                    }
+                entry["calls"] += 1
+                entry["errors"] += not call.ok
+                entry["prompt_tokens"] += call.prompt_tokens
+                entry["completion_tokens"] += call.completion_tokens
+                entry["cached_tokens"] += call.cached_tokens
+                entry["cost_usd"] += call.cost_usd
+                entry["latency_ms"].observe(call.wall_ms)
+                if call.ttfb_ms is not None:
+                    entry["ttfb_ms"].observe(call.ttfb_ms)
+
+        logger.debug("[LLMTelemetry] %s | agent=%s %s", call.provider, call.agent, call.as_metadata())
+
+    @staticmethod
+    def _snapshot(entry):
+        return {
+            **{k: v for k, v in entry.items() if not isinstance(v, Histogram)},
+            "cost_usd": round(entry["cost_usd"], 6),
+            "latency_ms": entry["latency_ms"].snapshot(),
+            "ttfb_ms": entry["ttfb_ms"].snapshot(),
+        }
+
+    @staticmethod
+    def _parse_pricing(spec):
+        """Parses "model=input/output[/cached input],..." (USD per million tokens)."""
+        pricing = {}
+        for entry in filter(None, (part.strip() for part in spec.split(","))):
+            model, _, prices = entry.partition("=")
+            try:
+                values = [float(p) for p in prices.split("/")]
+                if len(values) not in (2, 3):
+                    raise ValueError(prices)
+            except ValueError:
+                logger.warning("[LLMTelemetry] Ignoring malformed LLM_PRICING entry: %s", entry)
+                continue
+            input_price, output_price = values[:2]
+            pricing[model.strip()] = (input_price, output_price, values[2] if len(values) == 3 else input_price)
+        return pricing
+
+
+def _is_count(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _estimate_tokens(payload):
+    if not payload:
+        return 0
+    text = payload if isinstance(payload, str) else json.dumps(payload, default=str)
+    return len(text) // 4
+
+
+def instrumented(provider):
+    """
+    Decorator for llm_service provider adapters, sync or async.  Records
+    the call through llm_telemetry; applied innermost, so cache hits and
+    rate-governor queueing are not counted as provider latency.
+    """
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        def _request(args, kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            call_args = bound.arguments
+            model = call_args.get("model") or call_args.get("model_name")
+            return model, call_args.get("messages") or call_args.get("prompt")
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                model, payload = _request(args, kwargs)
+                with llm_telemetry.track(provider, model, payload) as call:
+                    response = call.response = await fn(*args, **kwargs)
+                if llm_telemetry.audit_enabled and call.session_id:
+                    await async_runtime.to_thread(llm_telemetry.audit, call)
+                return response
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            model, payload = _request(args, kwargs)
+            with llm_telemetry.track(provider, model, payload) as call:
+                response = call.response = fn(*args, **kwargs)
+            llm_telemetry.audit(call)
+            return response
+
+        return wrapper
+    return decorator
+
+
+# Single global instance — shared by every provider adapter
+llm_telemetry = LLMTelemetry()
+metrics.register_collector("llm_telemetry", llm_telemetry.stats)
@@ -3,7 +3,10 @@ import logging
 from app import db, create_app
 from app.models.chat import Conversation
 from app.models.user_memory import UserMemory
+from app.services.llm_cache import llm_cache
 from app.services.llm_service import call_openai_api, call_azure_openai_api_with_key
+from app.services.llm_telemetry import llm_telemetry
+from app.services.rate_governor import rate_governor
 import os
 
 logger = logging.getLogger(__name__)
@@ -91,7 +94,7 @@ def _call_memory_llm(transcript, conversation_id):
     """
     provider = os.getenv("LLM_PROVIDER", "azure_openai")
     model = os.getenv("LLM_MODEL_NAME", "gpt-4o")
-    temperature = 0.2  # Low temperature for structured extraction
+    temperature = 0.0  # Deterministic extraction (cacheable by llm_cache, in memory only)
 
     logger.info("[MemoryService] Calling LLM for fact extraction | provider=%s model=%s conv=%s",
                 provider, model, conversation_id)
@@ -100,10 +103,14 @@ def _call_memory_llm(transcript, conversation_id):
     messages = [{"role": "system", "content": prompt}]
 
     try:
-        if provider == "openai":
-            raw = call_openai_api(messages, model, temperature)
-        else:
-            raw = call_azure_openai_api_with_key(messages, model, temperature)
+        # Summarisation yields to user-facing calls when the provider is saturated.
+        # The transcript is unsanitized, so it never reaches the disk cache tier.
+        with rate_governor.priority("background"), llm_cache.memory_only(), \
+                llm_telemetry.tag(agent="Memory", session_id=conversation_id):
+            if provider == "openai":
+                raw = call_openai_api(messages, model, temperature)
+            else:
+                raw = call_azure_openai_api_with_key(messages, model, temperature)
 
         return _parse_facts(raw, conversation_id)
 
@@ -0,0 +1,128 @@
+import logging
+import time
+from bisect import bisect_left
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------------
+# Primitives
+# ---------------------------------------------------------------------------
+
+class Histogram:
+    """
+    Fixed-bucket histogram.  Thread-safe; O(log buckets) per observation.
+
+    Bucket bounds are inclusive upper limits; values above the last bound
+    land in the "+Inf" overflow bucket.
+    """
+
+    def __init__(self, buckets):
+        self.bounds = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.bounds) + 1)
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+        self._lock = Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self._counts[bisect_left(self.bounds, value)] += 1
+            self._count += 1
+            self._sum += value
+            if value > self._max:
+                self._max = value
+
+    def snapshot(self):
+        with self._lock:
+            labels = [f"<={b:g}" for b in self.bounds] + ["+Inf"]
+            return {
+                "count": self._count,
+                "sum": round(self._sum, 3),
+                "mean": round(self._sum / self._count, 3) if self._count else 0.0,
+                "max": round(self._max, 3),
+                "buckets": dict(zip(labels, self._counts)),
+            }
+
+
+class RateMeter:
+    """
+    Rolling event rate over the last `window_s` seconds, kept as a ring of
+    one-second slots so marking and reading are both O(1) amortised.
+    """
+
+    def __init__(self, window_s=60):
+        self.window_s = window_s
+        self._slots = [0] * window_s
+        self._slot_ts = [0] * window_s
+        self._total = 0
+        self._lock = Lock()
+
+    def mark(self, n=1, now=None):
+        second = int(time.monotonic() if now is None else now)
+        idx = second % self.window_s
+        with self._lock:
+            if self._slot_ts[idx] != second:
+                self._slot_ts[idx] = second
+                self._slots[idx] = 0
+            self._slots[idx] += n
+            self._total += n
+
+    def rate(self, now=None):
+        """Events per second averaged over the window."""
+        second = int(time.monotonic() if now is None else now)
+        with self._lock:
+            recent = sum(
+                count for count, ts in zip(self._slots, self._slot_ts)
+                if second - ts < self.window_s
+            )
+        return round(recent / self.window_s, 3)
+
+    @property
+    def total(self):
+        return self._total
+
+
+# ---------------------------------------------------------------------------
+# Registry
+# ---------------------------------------------------------------------------
+
+class MetricsRegistry:
+    """
+    Process-wide metrics surface served by GET /metrics.
+
+    Components own their own counters and register a zero-argument collector
+    that returns a JSON-serialisable dict; the registry simply namespaces and
+    aggregates those snapshots on read.
+    """
+
+    def __init__(self):
+        self._collectors = {}
+        self._lock = Lock()
+
+    def register_collector(self, name, collector):
+        with self._lock:
+            self._collectors[name] = collector
+        logger.debug("[Metrics] Collector registered | name=%s", name)
+
+    def unregister_collector(self, name):
+        with self._lock:
+            self._collectors.pop(name, None)
+
+    def snapshot(self):
+        with self._lock:
+            collectors = list(self._collectors.items())
+
+        result = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}
+        for name, collector in collectors:
+            try:
+                result[name] = collector()
+            except Exception as e:
+                logger.error("[Metrics] Collector '%s' failed: %s", name, e, exc_info=True)
+                result[name] = {"error": str(e)}
+        return result
+
+
+# Single global instance — components register their collectors at import time
+metrics = MetricsRegistry()
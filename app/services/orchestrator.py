@@ -1,13 +1,21 @@
+import contextvars
 import os
 import json
 import re
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from app.services.async_runtime import in_own_app_context
 from app.services.audit_service import historian
 from app.services.agent_service import call_agent_api
 from app.services.knowledge_service import knowledge_service
 from app.services.sentinel_service import sentinel
 from app.services.actuarial_service import actuarial
 from app.services.guardrails_service import guardrails_service
+from app.services.intent_router import intent_router
+from app.services.provider_router import provider_router
+from app.services.rate_governor import rate_governor
+from app.services.llm_telemetry import llm_telemetry
+from app.services.context_budget import context_budgeter
 from app.services.oracle_service import oracle
 from app.services.debater_service import debater
 from app.services.forensic_service import forensic
@@ -25,10 +33,7 @@ class Orchestrator:
     # Constants
     # -----------------------------------------------------------------------
 
-    CLASSIFICATION_SYSTEM_PROMPT = """
-    You are the RetireIQ Dispatcher Agent. Your ONLY job is to classify the user's
-    intent into exactly one of these categories:
-
+    INTENT_TAXONOMY = """
     1. KNOWLEDGE_BASE: Questions about retirement policies, 401k rules, or general
        financial education.
     2. PORTFOLIO_ANALYSIS: Requests for account balances, investment performance,
@@ -40,7 +45,12 @@ class Orchestrator:
     5. MARKET_INTELLIGENCE: Questions about current stock prices, market trends,
        inflation, interest rates, or the economy.
     6. GENERAL: Greetings, thanks, or unrelated chit-chat.
+    """
 
+    CLASSIFICATION_SYSTEM_PROMPT = """
+    You are the RetireIQ Dispatcher Agent. Your ONLY job is to classify the user's
+    intent into exactly one of these categories:
+    """ + INTENT_TAXONOMY + """
     Output ONLY a JSON object with no extra text:
     {
         "intent": "CATEGORY",
@@ -49,8 +59,57 @@ class Orchestrator:
     }
     """
 
+    # Fused mode: one T=0 call answers both the Shield and the Dispatcher
+    FUSED_SYSTEM_PROMPT = """
+    You are the RetireIQ Safety Gate and Dispatcher Agent. For the user's LATEST
+    message, in a single pass:
+    (a) decide whether it must be blocked under the governance policy, and
+    (b) classify its intent.
+
+    GOVERNANCE POLICY:
+    {policy}
+
+    BLOCK CATEGORIES to Detect:
+    {categories}
+
+    INTENT CATEGORIES:
+    {taxonomy}
+    Output ONLY a JSON object with no extra text:
+    {{
+        "verdict": "PASS" | "BLOCK",
+        "category": "exact block category name from list, or empty when PASS",
+        "intent": "CATEGORY",
+        "sub_intent": "brief description",
+        "confidence": 0.0-1.0
+    }}
+    """
+
+    INTENT_KEYS = ("intent", "sub_intent", "confidence")
+
     FALLBACK_INTENT = {"intent": "GENERAL", "sub_intent": "fallback", "confidence": 0.0}
 
+    def __init__(self):
+        # Concurrent pre-routing: the Shield and the intent classifier (two LLM
+        # round trips) run in parallel with the local Oracle/Empath steps.
+        self.concurrent_pre_routing = (
+            os.getenv("DISPATCH_CONCURRENT_PRE_ROUTING", "true").lower() == "true"
+        )
+        # Fused mode: safety verdict + intent from one structured-output call
+        self.fused_safety_classification = (
+            os.getenv("DISPATCH_FUSED_SAFETY_CLASSIFICATION", "false").lower() == "true"
+        )
+        # Hedged classification: a second request goes out once the first has
+        # outlived the provider's rolling p95 (see ProviderRouter)
+        self.hedge_classification = (
+            os.getenv("LLM_HEDGE_CLASSIFICATION", "false").lower() == "true"
+        )
+        # Classification only needs recent turns; older ones are summarised
+        self.classification_budget_tokens = int(os.getenv("LLM_CONTEXT_CLASSIFICATION_BUDGET_TOKENS", "2000"))
+        self._executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("DISPATCH_PRE_ROUTING_WORKERS", "16")),
+            thread_name_prefix="pre-routing",
+        )
+
     # -----------------------------------------------------------------------
     # Public API
     # -----------------------------------------------------------------------
@@ -65,15 +124,45 @@ class Orchestrator:
 
         self._log_dispatch_start(sanitized_message, history, conversation_id)
 
-        # 1. Market Awareness (The Oracle)
+        # In concurrent mode the LLM-bound stages start first and overlap
+        # with the local Oracle/Empath work below.
+        pending = self._start_llm_stages(sanitized_message, user_profile, history)
+
+        # 1. Market Awareness (The Oracle) & Behavioral Analysis (The Empath)
+        context_profile = self._build_context_profile(user_profile, sanitized_message, conversation_id)
+
+        # 2. Conversational Guardrails (The Shield)
+        # Filters jailbreaks, medical/legal queries, and off-topic chat
+        guardrails_refusal = self._await_guardrails(pending, sanitized_message, history)
+        if guardrails_refusal:
+            intent_future = pending.get("intent")
+            if intent_future and not intent_future.cancel():
+                logger.debug("[Dispatcher] Discarding in-flight classification for blocked query | conv=%s",
+                             conversation_id)
+            self._log_guardrails_block(guardrails_refusal, conversation_id)
+            return guardrails_refusal
+
+        # 3. Intent Classification
+        intent_data = self._await_intent(pending, sanitized_message, context_profile, history)
+        intent = self._resolve_intent(intent_data, conversation_id)
+
+        return self._route(intent, intent_data, sanitized_message, context_profile, conversation_id)
+
+    # -----------------------------------------------------------------------
+    # Private — Pre-routing stages
+    # -----------------------------------------------------------------------
+
+    def _build_context_profile(self, user_profile, message, conversation_id):
+        """
+        Runs the local Oracle and Empath steps and returns a copy of the profile
+        enriched with market context and behavioral sentiment.
+        """
         # Injects real-time context into the advisor's world view
         market_data = oracle.get_market_context(conversation_id)
-        
-        # 1. Behavioral Analysis (The Empath)
+
         from app.services.empath_service import empath_agent
-        sentiment = empath_agent.analyze(sanitized_message, conversation_id)
-        
-        # Add sentiment and market context for subsequent agents
+        sentiment = empath_agent.analyze(message, conversation_id)
+
         context_profile = (user_profile or {}).copy()
         context_profile["market_context"] = market_data.__dict__
         context_profile["behavioral_sentiment"] = {
@@ -81,32 +170,46 @@ class Orchestrator:
             "bias": sentiment.bias,
             "suggested_tone": sentiment.suggested_tone
         }
+        return context_profile
 
-        # 2. Conversational Guardrails (The Shield)
-        # Filters jailbreaks, medical/legal queries, and off-topic chat
-        guardrails_refusal = guardrails_service.check_query_sync(sanitized_message)
-        if guardrails_refusal:
-            logger.warning("[Dispatcher] Query BLOCKED by The Shield | conv=%s", conversation_id)
-            historian.log_step(
-                session_id=conversation_id,
-                agent_name="Guardian",
-                step_type="ACTION",
-                content="Guardrails triggered: Refusing off-topic or unsafe query.",
-                step_metadata={"refusal_preview": guardrails_refusal[:60]}
-            )
-            return guardrails_refusal
-
-        # 3. Intent Classification
-        intent_data = self._classify_intent(sanitized_message, context_profile, history)
-        intent = intent_data.get("intent", "GENERAL")
-        confidence = intent_data.get("confidence", 0.0)
-
-        logger.info("[Dispatcher] Intent resolved: %s (confidence=%.2f) | conv=%s",
-                    intent, confidence, conversation_id)
-
-        self._log_intent_action(intent_data, conversation_id)
+    def _start_llm_stages(self, message, user_profile, history):
+        """
+        Concurrent mode: submits the LLM-bound stages and returns their futures
+        keyed "safety"/"intent" (or "fused").  Sequential mode returns {} and
+        the stages run on demand in _await_guardrails/_await_intent.
+        """
+        if not self.concurrent_pre_routing:
+            return {}
+        if self.fused_safety_classification:
+            return {"fused": self._submit(self._screen_and_classify, message, history)}
+        return {
+            "safety": self._submit(guardrails_service.check_query_sync, message),
+            "intent": self._submit(self._classify_intent, message, user_profile, history),
+        }
 
-        return self._route(intent, intent_data, sanitized_message, context_profile, conversation_id)
+    def _await_guardrails(self, pending, message, history):
+        """Returns the Shield's refusal message, or None if the query may proceed."""
+        if self.fused_safety_classification:
+            future = pending.get("fused")
+            pending["fused_result"] = future.result() if future else self._screen_and_classify(message, history)
+            return pending["fused_result"][0]
+        future = pending.get("safety")
+        return future.result() if future else guardrails_service.check_query_sync(message)
+
+    def _await_intent(self, pending, message, context_profile, history):
+        """Returns the classified intent dict."""
+        if "fused_result" in pending:
+            return pending["fused_result"][1]
+        future = pending.get("intent")
+        return future.result() if future else self._classify_intent(message, context_profile, history)
+
+    def _submit(self, fn, *args):
+        """
+        Runs fn on the pre-routing pool, inside the caller's app context if
+        there is one and with its context variables (LLM priority and
+        telemetry tags).
+        """
+        return self._executor.submit(contextvars.copy_context().run, in_own_app_context(fn), *args)
 
     # -----------------------------------------------------------------------
     # Private — Audit helpers
@@ -122,6 +225,28 @@ class Orchestrator:
             step_metadata={"history_length": len(history) if history else 0},
         )
 
+    def _log_guardrails_block(self, refusal, conversation_id):
+        """Logs a Shield refusal to the Historian."""
+        logger.warning("[Dispatcher] Query BLOCKED by The Shield | conv=%s", conversation_id)
+        historian.log_step(
+            session_id=conversation_id,
+            agent_name="Guardian",
+            step_type="ACTION",
+            content="Guardrails triggered: Refusing off-topic or unsafe query.",
+            step_metadata={"refusal_preview": refusal[:60]}
+        )
+
+    def _resolve_intent(self, intent_data, conversation_id):
+        """Logs the resolved intent and returns its name."""
+        intent = intent_data.get("intent", "GENERAL")
+        confidence = intent_data.get("confidence", 0.0)
+
+        logger.info("[Dispatcher] Intent resolved: %s (confidence=%.2f) | conv=%s",
+                    intent, confidence, conversation_id)
+
+        self._log_intent_action(intent_data, conversation_id)
+        return intent
+
     def _log_intent_action(self, intent_data, conversation_id):
         """Logs the resolved intent as an ACTION step to the Historian."""
         historian.log_step(
@@ -137,21 +262,52 @@ class Orchestrator:
     # -----------------------------------------------------------------------
 
     def _classify_intent(self, message, profile, history):
+        """
+        Resolves intent via the local IntentRouter when it is confident,
+        otherwise via the LLM classifier.  Every LLM result is fed back to
+        the router (and a sample of fast-path hits is re-checked in the
+        background) so its threshold can be tuned from /metrics.
+        """
+        decision = intent_router.route(message, history)
+        if decision and decision.accepted:
+            return self._fast_path_intent(decision, message, profile, history)
+
+        intent_data = self._classify_intent_llm(message, profile, history)
+        if decision and intent_data is not self.FALLBACK_INTENT:
+            intent_router.record_llm_outcome(decision, intent_data["intent"])
+        return intent_data
+
+    def _fast_path_intent(self, decision, message, profile, history):
+        if intent_router.should_shadow():
+            self._submit(self._shadow_check_route, decision, message, profile, history)
+        return {
+            "intent": decision.intent,
+            "sub_intent": "local fast-path match",
+            "confidence": decision.confidence,
+            "source": "router",
+        }
+
+    def _shadow_check_route(self, decision, message, profile, history):
+        """Background LLM re-check of a fast-path decision (accuracy sampling only)."""
+        try:
+            intent_data = self._classify_intent_llm(message, profile, history)
+            if intent_data is not self.FALLBACK_INTENT:
+                intent_router.record_llm_outcome(decision, intent_data["intent"])
+        except Exception as e:
+            logger.debug("[Dispatcher] Shadow intent check failed: %s", e)
+
+    def _classify_intent_llm(self, message, profile, history):
         """
         Uses a fast, deterministic LLM call (T=0.0) to classify intent.
         Falls back to GENERAL if classification fails.
         """
         from app.services.llm_service import (
-            call_openai_api, call_azure_openai_api_with_key,
-            call_ollama_api, prepare_openai_messages,
+            call_openai_api, call_azure_openai_api_with_key, call_ollama_api,
         )
 
-        provider = os.getenv("LLM_PROVIDER", "azure_openai")
-        model = os.getenv("LLM_MODEL_NAME", "gpt-4o")
+        provider, model, messages = self._classification_request(self.CLASSIFICATION_SYSTEM_PROMPT, message, history)
         logger.debug("[Dispatcher] Classifying intent | provider=%s model=%s", provider, model)
 
-        messages = prepare_openai_messages(self.CLASSIFICATION_SYSTEM_PROMPT, history, message)
-
         raw_response = self._call_classification_llm(
             provider, messages, model, call_openai_api,
             call_azure_openai_api_with_key, call_ollama_api,
@@ -159,20 +315,69 @@ class Orchestrator:
 
         return self._parse_intent_response(raw_response)
 
+    def _screen_and_classify(self, message, history):
+        """
+        Fused mode: one deterministic LLM call (T=0.0) returning
+        {verdict, category, intent, sub_intent, confidence}.
+        Returns (refusal_or_None, intent_data).  The refusal comes from the
+        Shield's main.co mapping; unparseable output falls back to PASS and
+        the GENERAL intent, exactly as the separate calls do.
+        """
+        from app.services.llm_service import (
+            call_openai_api, call_azure_openai_api_with_key, call_ollama_api,
+        )
+
+        provider, model, messages = self._classification_request(self._fused_system_prompt(), message, history)
+        logger.debug("[Dispatcher] Fused safety + intent call | provider=%s model=%s", provider, model)
+
+        raw_response = self._call_classification_llm(
+            provider, messages, model, call_openai_api,
+            call_azure_openai_api_with_key, call_ollama_api,
+        )
+        return self._parse_fused_response(raw_response)
+
+    def _classification_request(self, system_prompt, message, history):
+        """Returns (provider, model, messages) for a deterministic classification call."""
+        from app.services.llm_service import prepare_openai_messages
+
+        provider = os.getenv("LLM_PROVIDER", "azure_openai")
+        model = os.getenv("LLM_MODEL_NAME", "gpt-4o")
+        history = context_budgeter.fit(
+            history, system_prompt, message, provider, model, budget_tokens=self.classification_budget_tokens
+        )
+        return provider, model, prepare_openai_messages(system_prompt, history, message)
+
+    def _fused_system_prompt(self):
+        return self.FUSED_SYSTEM_PROMPT.format(
+            policy=guardrails_service.instructions,
+            categories=list(guardrails_service.refusal_map.keys()),
+            taxonomy=self.INTENT_TAXONOMY,
+        )
+
+    def _parse_fused_response(self, raw_response):
+        """Splits a fused response into (refusal_or_None, intent_data)."""
+        refusal = guardrails_service.evaluate_response(raw_response)
+        parsed = self._parse_intent_response(raw_response)
+        if "intent" not in parsed:
+            return refusal, self.FALLBACK_INTENT
+        return refusal, {k: parsed[k] for k in self.INTENT_KEYS if k in parsed}
+
     def _call_classification_llm(self, provider, messages, model,
                                   call_openai, call_azure, call_ollama):
         """
-        Delegates the raw LLM call to the correct provider adapter.
+        Delegates the raw LLM call to the correct provider adapter through
+        the provider router (failover, optional hedging).
         Temperature is always 0.0 for deterministic classification.
         """
+        # Vertex AI and Ollama both fall back to Ollama for classification
+        adapters = {"openai": call_openai, "azure_openai": call_azure}
+
+        def invoke(candidate, candidate_model):
+            return adapters.get(candidate, call_ollama)(messages, candidate_model, 0.0)
+
         try:
-            if provider == "openai":
-                return call_openai(messages, model, 0.0)
-            elif provider == "azure_openai":
-                return call_azure(messages, model, 0.0)
-            else:
-                # Vertex AI and Ollama both fall back to Ollama for classification
-                return call_ollama(messages, model, 0.0)
+            with rate_governor.priority("critical"), llm_telemetry.tag(agent="Dispatcher"):
+                return provider_router.call(provider, model, invoke, hedge=self.hedge_classification)
         except Exception as e:
             logger.error("[Dispatcher] LLM classification call failed: %s", e, exc_info=True)
             return None
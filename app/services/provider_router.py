@@ -0,0 +1,343 @@
+import contextvars
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from threading import Lock
+from app.services.async_runtime import in_own_app_context
+from app.services.llm_cache import GovernorBusyText, ProviderErrorText
+from app.services.metrics_service import metrics
+
+logger = logging.getLogger(__name__)
+
+# Model per provider for fallbacks given without one; <PROVIDER>_MODEL_NAME overrides
+DEFAULT_MODELS = {
+    "openai": "gpt-4o",
+    "azure_openai": "gpt-4o",
+    "vertex_ai": "gemini-1.5-pro",
+    "ollama": "llama3",
+}
+
+
+class ProviderHealth:
+    """
+    Rolling health of one (provider, model): the last `window` latencies and
+    outcomes, plus a circuit breaker.
+
+      CLOSED    — calls flow normally.
+      OPEN      — `failure_threshold` consecutive failures, or an error rate
+                  at/above `error_rate_threshold` over a full-enough window;
+                  calls are skipped until `cooldown_s` has passed.
+      HALF_OPEN — after the cooldown one probe call is let through; success
+                  closes the circuit, failure re-opens it.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "CLOSED", "OPEN", "HALF_OPEN"
+    MIN_SAMPLES = 20
+
+    def __init__(self, window, failure_threshold, error_rate_threshold, cooldown_s):
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.cooldown_s = cooldown_s
+        self._latencies_ms = deque(maxlen=window)
+        self._outcomes = deque(maxlen=window)  # True = success
+        self._consecutive_failures = 0
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+    def allow(self, now=None):
+        """True when a call may be sent (claims the probe slot when half-open)."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self._state == self.OPEN and now - self._opened_at >= self.cooldown_s:
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record(self, success, latency_ms, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._outcomes.append(success)
+            if success:
+                self._latencies_ms.append(latency_ms)
+                self._consecutive_failures = 0
+                if self._state != self.CLOSED:
+                    logger.info("[ProviderRouter] Circuit closed after successful probe")
+                self._state = self.CLOSED
+                return
+            self._consecutive_failures += 1
+            if self._state == self.HALF_OPEN or self._should_open():
+                self._state = self.OPEN
+                self._opened_at = now
+                self._probe_in_flight = False
+
+    def release_probe(self):
+        """Frees a claimed half-open probe slot whose call never reached the provider."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def p95_ms(self):
+        """95th-percentile success latency, or None until MIN_SAMPLES are in."""
+        with self._lock:
+            if len(self._latencies_ms) < self.MIN_SAMPLES:
+                return None
+            ordered = sorted(self._latencies_ms)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def snapshot(self):
+        with self._lock:
+            ordered = sorted(self._latencies_ms)
+            outcomes = list(self._outcomes)
+            state = self._state
+        return {
+            "state": state,
+            "samples": len(outcomes),
+            "error_rate": round(outcomes.count(False) / len(outcomes), 3) if outcomes else 0.0,
+            "p50_ms": round(ordered[len(ordered) // 2], 1) if ordered else None,
+            "p95_ms": round(ordered[int(0.95 * (len(ordered) - 1))], 1) if ordered else None,
+        }
+
+    def _should_open(self):
+        if self._consecutive_failures >= self.failure_threshold:
+            return True
+        if len(self._outcomes) >= self.MIN_SAMPLES:
+            return self._outcomes.count(False) / len(self._outcomes) >= self.error_rate_threshold
+        return False
+
+
+class ProviderRouter:
+    """
+    The Provider Router (The Air Traffic Controller).
+
+    Sits between the pipeline and the provider adapters.  Every call is
+    timed and its outcome recorded per (provider, model); a provider whose
+    circuit is open is skipped and the next entry of LLM_FALLBACK_PROVIDERS
+    ("provider:model,provider:model") is tried instead, so one provider's
+    incident no longer fails every turn.
+
+    For latency-critical calls (intent classification) a call can be
+    hedged: if the first request has not answered within that provider's
+    rolling p95, a second request goes to the next healthy candidate (or the
+    same one again) and whichever succeeds first wins.
+
+    Callers pass `invoke(provider, model) -> text`; a failure is an
+    exception, None, or a ProviderErrorText.  When every candidate fails,
+    the last failure is returned, so the adapters' apology text still
+    reaches the user.  A GovernorBusyText (the local rate governor's queue
+    deadline passed) is returned straight away, without touching the
+    provider's health or failing over.
+    """
+
+    def __init__(self):
+        self.fallbacks = self._parse_chain(os.getenv("LLM_FALLBACK_PROVIDERS", ""))
+        self.window = int(os.getenv("LLM_ROUTER_WINDOW", "100"))
+        self.failure_threshold = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "5"))
+        self.error_rate_threshold = float(os.getenv("LLM_CIRCUIT_ERROR_RATE", "0.5"))
+        self.cooldown_s = float(os.getenv("LLM_CIRCUIT_COOLDOWN_S", "30"))
+        self.hedge_min_delay_ms = float(os.getenv("LLM_HEDGE_MIN_DELAY_MS", "50"))
+        self.hedge_default_delay_ms = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY_MS", "1500"))
+
+        self._health = {}
+        self._lock = Lock()
+        self._counters = {"calls": 0, "failovers": 0, "short_circuited": 0,
+                          "hedges": 0, "hedge_wins": 0, "exhausted": 0}
+        self._hedge_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("LLM_HEDGE_WORKERS", "8")), thread_name_prefix="llm-hedge"
+        )
+        logger.info("[ProviderRouter] Initialised | fallbacks=%s circuit=%d failures/%.0f%% cooldown=%ss",
+                    self.fallbacks, self.failure_threshold, self.error_rate_threshold * 100, self.cooldown_s)
+
+    # -----------------------------------------------------------------------
+    # Public API
+    # -----------------------------------------------------------------------
+
+    def call(self, provider, model, invoke, hedge=False):
+        """Calls invoke on the first healthy candidate, failing over down the chain."""
+        self._incr("calls")
+        chain = self._chain(provider, model)
+        result, attempted = None, 0
+        for index, (candidate, candidate_model) in enumerate(chain):
+            if not self.health(candidate, candidate_model).allow():
+                continue
+            self._note_attempt(attempted, candidate, candidate_model)
+            attempted += 1
+            if hedge and attempted == 1:
+                ok, result = self._hedged(candidate, candidate_model, chain[index + 1:], invoke)
+            else:
+                ok, result = self._attempt(candidate, candidate_model, invoke)
+            if ok or isinstance(result, GovernorBusyText):
+                return result
+        return self._exhausted(provider, attempted, result)
+
+    def is_available(self, provider, model):
+        """False while the circuit is open (does not claim a half-open probe)."""
+        return self.health(provider, model).state != ProviderHealth.OPEN
+
+    def record(self, provider, model, success, latency_ms):
+        """Records an outcome observed outside call() (e.g. a stream)."""
+        self.health(provider, model).record(success, latency_ms)
+
+    def health(self, provider, model):
+        key = (provider, model)
+        with self._lock:
+            health = self._health.get(key)
+            if health is None:
+                health = self._health[key] = ProviderHealth(
+                    self.window, self.failure_threshold, self.error_rate_threshold, self.cooldown_s
+                )
+        return health
+
+    def reset(self):
+        """Forgets all health data (tests, credential rotation)."""
+        with self._lock:
+            self._health = {}
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            health = dict(self._health)
+        return {
+            **counters,
+            "fallbacks": [f"{p}:{m}" for p, m in self.fallbacks],
+            "providers": {f"{p}:{m}": h.snapshot() for (p, m), h in health.items()},
+        }
+
+    # -----------------------------------------------------------------------
+    # Private — Candidate selection
+    # -----------------------------------------------------------------------
+
+    @staticmethod
+    def _parse_chain(spec):
+        """
+        Parses provider[:model],...; a fallback without a model gets its
+        provider's default (<PROVIDER>_MODEL_NAME, else DEFAULT_MODELS), never
+        the primary's, which another provider would not recognise.
+        """
+        chain = []
+        for entry in filter(None, (part.strip() for part in spec.split(","))):
+            provider, _, model = (part.strip() for part in entry.partition(":"))
+            model = model or _default_model(provider)
+            if not model:
+                logger.warning("[ProviderRouter] Skipping fallback with no model | provider=%s", provider)
+                continue
+            chain.append((provider, model))
+        return chain
+
+    def _chain(self, provider, model):
+        """Primary then fallbacks."""
+        chain = [(provider, model)]
+        for candidate in self.fallbacks:
+            if candidate not in chain:
+                chain.append(candidate)
+        return chain
+
+    def _note_attempt(self, attempted, provider, model):
+        if attempted:
+            self._incr("failovers")
+            logger.warning("[ProviderRouter] Failing over | to=%s:%s", provider, model)
+
+    def _exhausted(self, provider, attempted, result):
+        if attempted:
+            self._incr("exhausted")
+            return result
+        self._incr("short_circuited")
+        logger.warning("[ProviderRouter] All circuits open | primary=%s", provider)
+        return ProviderErrorText(
+            "I'm sorry, our AI providers are temporarily unavailable. Please try again shortly."
+        )
+
+    def _hedge_target(self, provider, model, alternatives):
+        """First alternative whose circuit allows a call, else the primary itself."""
+        for candidate in alternatives:
+            if self.health(*candidate).allow():
+                return candidate
+        return provider, model
+
+    def _hedge_delay_s(self, provider, model):
+        p95 = self.health(provider, model).p95_ms()
+        delay_ms = self.hedge_default_delay_ms if p95 is None else max(p95, self.hedge_min_delay_ms)
+        return delay_ms / 1000
+
+    # -----------------------------------------------------------------------
+    # Private — Sync calls
+    # -----------------------------------------------------------------------
+
+    def _attempt(self, provider, model, invoke):
+        """Returns (ok, result) and records the outcome."""
+        started = time.perf_counter()
+        try:
+            result = invoke(provider, model)
+        except Exception as e:
+            logger.error("[ProviderRouter] Call failed | provider=%s model=%s error=%s", provider, model, e)
+            result = ProviderErrorText(f"I'm sorry, I encountered an error processing your request: {e}")
+        if isinstance(result, GovernorBusyText):
+            # Queued out locally by the rate governor; the provider was never called
+            self.health(provider, model).release_probe()
+            return False, result
+        ok = _succeeded(result)
+        self.health(provider, model).record(ok, (time.perf_counter() - started) * 1000)
+        return ok, result
+
+    def _hedged(self, provider, model, alternatives, invoke):
+        """Races the primary against a backup sent after the primary's p95 delay."""
+        primary = self._submit(self._attempt, provider, model, invoke)
+        done, _ = wait([primary], timeout=self._hedge_delay_s(provider, model))
+        if done:
+            return primary.result()
+
+        backup_provider, backup_model = self._hedge_target(provider, model, alternatives)
+        self._incr("hedges")
+        logger.info("[ProviderRouter] Hedging | primary=%s:%s backup=%s:%s",
+                    provider, model, backup_provider, backup_model)
+        hedge = self._submit(self._attempt, backup_provider, backup_model, invoke)
+
+        pending = {primary, hedge}
+        result = (False, None)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if result[0]:
+                    if future is hedge:
+                        self._incr("hedge_wins")
+                    return result
+        return result
+
+    def _submit(self, fn, *args):
+        """
+        Runs fn on the hedge pool with the caller's context variables but its
+        own app context: a hedge loser keeps running (and auditing) after the
+        caller has returned, so it must not write through the caller's Session.
+        """
+        return self._hedge_executor.submit(contextvars.copy_context().run, in_own_app_context(fn), *args)
+
+    def _incr(self, key):
+        with self._lock:
+            self._counters[key] += 1
+
+
+def _default_model(provider):
+    """The model a provider is called with when a fallback names none."""
+    return os.getenv(f"{provider.upper()}_MODEL_NAME") or DEFAULT_MODELS.get(provider)
+
+
+def _succeeded(result):
+    return result is not None and not isinstance(result, ProviderErrorText)
+
+
+# Single global instance — shared by the general LLM path and the Dispatcher's classifier
+provider_router = ProviderRouter()
+metrics.register_collector("provider_router", provider_router.stats)
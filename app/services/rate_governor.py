@@ -0,0 +1,396 @@
+import asyncio
+import contextvars
+import functools
+import heapq
+import inspect
+import itertools
+import json
+import logging
+import os
+import time
+from contextlib import asynccontextmanager, contextmanager
+from threading import Condition, Lock
+from app.services.llm_cache import GovernorBusyText, ProviderErrorText
+from app.services.metrics_service import Histogram, metrics
+
+logger = logging.getLogger(__name__)
+
+# Lower rank is served first when callers queue for the same provider
+PRIORITIES = {"critical": 0, "interactive": 1, "background": 2}
+
+_priority = contextvars.ContextVar("llm_priority", default="interactive")
+
+
+class GovernorTimeout(Exception):
+    """Raised when a call could not be admitted before its queueing deadline."""
+
+
+class TokenBucket:
+    """Refills continuously at per_minute / 60 per second, up to per_minute."""
+
+    def __init__(self, per_minute, now):
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.rate = self.capacity / 60
+        self.updated = now
+
+    def wait_s(self, amount, now):
+        """Seconds until amount is available (0 when it is available now)."""
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount):
+        self.level -= min(amount, self.capacity)
+
+    def drain(self, now):
+        self.level, self.updated = 0.0, now
+
+
+class ProviderBudget:
+    """
+    Admission state for one (provider, model): request and token buckets, an
+    in-flight cap, and a priority queue of waiting callers.  Only the head
+    of the queue may take capacity, so a background call never overtakes a
+    queued safety check.
+    """
+
+    def __init__(self, rpm, tpm, max_in_flight):
+        now = time.monotonic()
+        self.limits = {"rpm": rpm, "tpm": tpm, "max_in_flight": max_in_flight}
+        self._requests = TokenBucket(rpm, now) if rpm else None
+        self._tokens = TokenBucket(tpm, now) if tpm else None
+        self._max_in_flight = max_in_flight
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._queue = []  # (priority rank, sequence, ticket)
+        self._sequence = itertools.count()
+        self.cond = Condition(Lock())
+        self.counters = {"granted": 0, "queued": 0, "timeouts": 0, "throttled": 0}
+
+    def enqueue(self, priority):
+        """Joins the queue; the returned ticket is passed to try_admit/leave."""
+        ticket = object()
+        heapq.heappush(self._queue, (PRIORITIES[priority], next(self._sequence), ticket))
+        return ticket
+
+    def try_admit(self, ticket, tokens, now):
+        """
+        Takes capacity for the ticket if it is at the head of the queue.
+        Returns 0 on success, else the seconds worth waiting before retrying.
+        """
+        if self._queue[0][2] is not ticket:
+            return 0.05
+        waits = [self._paused_until - now]
+        if self._requests:
+            waits.append(self._requests.wait_s(1, now))
+        if self._tokens:
+            waits.append(self._tokens.wait_s(tokens, now))
+        if self._max_in_flight and self._in_flight >= self._max_in_flight:
+            waits.append(0.05)  # woken early by release()
+        wait = max(waits)
+        if wait > 0:
+            return wait
+
+        heapq.heappop(self._queue)
+        if self._requests:
+            self._requests.take(1)
+        if self._tokens:
+            self._tokens.take(tokens)
+        self._in_flight += 1
+        self.counters["granted"] += 1
+        return 0.0
+
+    def leave(self, ticket):
+        """Drops a ticket that gave up waiting."""
+        self._queue = [entry for entry in self._queue if entry[2] is not ticket]
+        heapq.heapify(self._queue)
+
+    def release(self):
+        self._in_flight -= 1
+
+    def throttle(self, backoff_s, now):
+        """The provider answered 429: pause admissions and empty the buckets."""
+        self._paused_until = max(self._paused_until, now + backoff_s)
+        for bucket in (self._requests, self._tokens):
+            if bucket:
+                bucket.drain(now)
+        self.counters["throttled"] += 1
+
+    def snapshot(self):
+        return {
+            **self.limits,
+            "in_flight": self._in_flight,
+            "waiting": len(self._queue),
+            **self.counters,
+        }
+
+
+class RateGovernor:
+    """
+    The Rate Governor (The Traffic Warden).
+
+    Client-side admission control in front of every provider adapter, so a
+    burst queues locally instead of hitting provider 429s.  Each
+    (provider, model) gets a requests-per-minute bucket, a tokens-per-minute
+    bucket (estimated prompt + max completion tokens) and a max in-flight
+    count, configured by LLM_RATE_RPM / LLM_RATE_TPM / LLM_RATE_MAX_IN_FLIGHT
+    and overridden per provider or model through LLM_RATE_LIMITS
+    ("openai:gpt-4o=500/30000/16,ollama=0/0/2"; 0 = unlimited).
+
+    Waiting callers are served by priority class — critical (Shield,
+    Dispatcher classification), interactive (the default), background
+    (memory summarisation) — each with its own queueing deadline
+    (LLM_RATE_DEADLINE_<CLASS>_S).  A call that misses its deadline gets a
+    GovernorBusyText, which the provider router returns as-is: local
+    saturation neither counts against the provider's health nor triggers
+    failover.  A 429 that still gets through pauses the provider for
+    LLM_RATE_429_BACKOFF_S and the call re-queues, up to LLM_RATE_429_RETRIES
+    times.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("LLM_RATE_GOVERNOR_ENABLED", "true").lower() == "true"
+        self.default_limits = (
+            int(os.getenv("LLM_RATE_RPM", "0")),
+            int(os.getenv("LLM_RATE_TPM", "0")),
+            int(os.getenv("LLM_RATE_MAX_IN_FLIGHT", "0")),
+        )
+        self.overrides = self._parse_limits(os.getenv("LLM_RATE_LIMITS", ""))
+        self.deadlines_s = {
+            "critical": float(os.getenv("LLM_RATE_DEADLINE_CRITICAL_S", "5")),
+            "interactive": float(os.getenv("LLM_RATE_DEADLINE_INTERACTIVE_S", "20")),
+            "background": float(os.getenv("LLM_RATE_DEADLINE_BACKGROUND_S", "120")),
+        }
+        self.backoff_s = float(os.getenv("LLM_RATE_429_BACKOFF_S", "2"))
+        self.max_retries = int(os.getenv("LLM_RATE_429_RETRIES", "2"))
+        self.completion_tokens = int(os.getenv("LLM_RATE_COMPLETION_TOKENS", "500"))
+
+        self._budgets = {}
+        self._lock = Lock()
+        self._wait_ms = {name: Histogram((10, 50, 100, 500, 1000, 5000, 20000)) for name in PRIORITIES}
+        logger.info("[RateGovernor] Initialised | enabled=%s defaults=%s overrides=%s",
+                    self.enabled, self.default_limits,
+                    [f"{p}:{m}" if m else p for p, m in self.overrides])
+
+    # -----------------------------------------------------------------------
+    # Public API
+    # -----------------------------------------------------------------------
+
+    @contextmanager
+    def priority(self, name):
+        """Runs the enclosed LLM calls (in this thread/task) under a priority class."""
+        if name not in PRIORITIES:
+            raise ValueError(f"Unknown LLM priority class: {name}")
+        token = _priority.set(name)
+        try:
+            yield
+        finally:
+            _priority.reset(token)
+
+    @contextmanager
+    def slot(self, provider, model, tokens):
+        """Holds one admitted call; raises GovernorTimeout past the deadline."""
+        budget = self._admit(provider, model, tokens)
+        try:
+            yield
+        finally:
+            if budget:
+                self._release(budget)
+
+    @asynccontextmanager
+    async def aslot(self, provider, model, tokens):
+        """Async variant of slot(): waits without blocking the event loop."""
+        budget = await self._aadmit(provider, model, tokens)
+        try:
+            yield
+        finally:
+            if budget:
+                self._release(budget)
+
+    def throttled(self, provider, model):
+        """Records a provider 429 for (provider, model)."""
+        budget = self._budget(provider, model)
+        with budget.cond:
+            budget.throttle(self.backoff_s, time.monotonic())
+        logger.warning("[RateGovernor] Provider throttled | %s:%s backoff=%ss", provider, model, self.backoff_s)
+
+    def estimate_tokens(self, payload, max_tokens=None):
+        """Rough prompt size (4 chars per token) plus the completion allowance."""
+        text = payload if isinstance(payload, str) else json.dumps(payload, default=str)
+        return len(text) // 4 + (max_tokens or self.completion_tokens)
+
+    def reset(self):
+        """Forgets all budgets (tests, config reload)."""
+        with self._lock:
+            self._budgets = {}
+
+    def stats(self):
+        with self._lock:
+            budgets = dict(self._budgets)
+        providers = {}
+        for (provider, model), budget in budgets.items():
+            with budget.cond:
+                providers[f"{provider}:{model}"] = budget.snapshot()
+        return {
+            "enabled": self.enabled,
+            "providers": providers,
+            "wait_ms": {name: histogram.snapshot() for name, histogram in self._wait_ms.items()},
+        }
+
+    # -----------------------------------------------------------------------
+    # Private — Admission
+    # -----------------------------------------------------------------------
+
+    def _admit(self, provider, model, tokens):
+        if not self.enabled:
+            return None
+        budget, ticket, priority, started, deadline = self._join(provider, model)
+        with budget.cond:
+            while True:
+                now = time.monotonic()
+                wait = budget.try_admit(ticket, tokens, now)
+                if wait == 0:
+                    break
+                if now >= deadline:
+                    self._give_up(budget, ticket, provider, model, priority)
+                budget.cond.wait(min(wait, deadline - now))
+        self._wait_ms[priority].observe((time.monotonic() - started) * 1000)
+        return budget
+
+    async def _aadmit(self, provider, model, tokens):
+        if not self.enabled:
+            return None
+        budget, ticket, priority, started, deadline = self._join(provider, model)
+        while True:
+            now = time.monotonic()
+            with budget.cond:
+                wait = budget.try_admit(ticket, tokens, now)
+                if wait == 0:
+                    break
+                if now >= deadline:
+                    self._give_up(budget, ticket, provider, model, priority)
+            try:
+                await asyncio.sleep(min(wait, deadline - now))
+            except asyncio.CancelledError:
+                with budget.cond:
+                    budget.leave(ticket)
+                    budget.cond.notify_all()
+                raise
+        self._wait_ms[priority].observe((time.monotonic() - started) * 1000)
+        return budget
+
+    def _join(self, provider, model):
+        priority = _priority.get()
+        budget = self._budget(provider, model)
+        with budget.cond:
+            ticket = budget.enqueue(priority)
+            budget.counters["queued"] += 1
+        started = time.monotonic()
+        return budget, ticket, priority, started, started + self.deadlines_s[priority]
+
+    def _give_up(self, budget, ticket, provider, model, priority):
+        """Called with budget.cond held."""
+        budget.leave(ticket)
+        budget.counters["timeouts"] += 1
+        budget.cond.notify_all()
+        logger.warning("[RateGovernor] Queue deadline missed | %s:%s priority=%s", provider, model, priority)
+        raise GovernorTimeout(f"{provider}:{model} is saturated")
+
+    def _release(self, budget):
+        with budget.cond:
+            budget.release()
+            budget.cond.notify_all()
+
+    def _budget(self, provider, model):
+        key = (provider, model)
+        with self._lock:
+            budget = self._budgets.get(key)
+            if budget is None:
+                limits = self.overrides.get(key) or self.overrides.get((provider, None)) or self.default_limits
+                budget = self._budgets[key] = ProviderBudget(*limits)
+        return budget
+
+    @staticmethod
+    def _parse_limits(spec):
+        """Parses "provider[:model]=rpm/tpm/in_flight,..." into {(provider, model or None): limits}."""
+        overrides = {}
+        for entry in filter(None, (part.strip() for part in spec.split(","))):
+            target, _, values = entry.partition("=")
+            provider, _, model = target.strip().partition(":")
+            try:
+                rpm, tpm, in_flight = (int(v) for v in values.split("/"))
+            except ValueError:
+                logger.warning("[RateGovernor] Ignoring malformed LLM_RATE_LIMITS entry: %s", entry)
+                continue
+            overrides[(provider, model or None)] = (rpm, tpm, in_flight)
+        return overrides
+
+
+def _is_rate_limited(response):
+    if not isinstance(response, ProviderErrorText):
+        return False
+    text = response.lower()
+    return "429" in text or "rate limit" in text or "resource exhausted" in text
+
+
+def _busy_text():
+    return GovernorBusyText("I'm sorry, our AI service is busy right now. Please try again in a moment.")
+
+
+def governed(provider):
+    """
+    Decorator for llm_service provider adapters, sync or async (applied
+    below cached_completion, so cache hits never spend budget).  Admits the
+    call through rate_governor, and retries a 429 after the back-off while
+    the retry budget lasts.
+    """
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        def _request(args, kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            call_args = bound.arguments
+            model = call_args.get("model") or call_args.get("model_name")
+            payload = call_args.get("messages") or call_args.get("prompt") or ""
+            return model, rate_governor.estimate_tokens(payload, call_args.get("max_tokens"))
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                model, tokens = _request(args, kwargs)
+                for _ in range(rate_governor.max_retries + 1):
+                    try:
+                        async with rate_governor.aslot(provider, model, tokens):
+                            response = await fn(*args, **kwargs)
+                    except GovernorTimeout:
+                        return _busy_text()
+                    if not _is_rate_limited(response):
+                        return response
+                    rate_governor.throttled(provider, model)
+                return response
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            model, tokens = _request(args, kwargs)
+            for _ in range(rate_governor.max_retries + 1):
+                try:
+                    with rate_governor.slot(provider, model, tokens):
+                        response = fn(*args, **kwargs)
+                except GovernorTimeout:
+                    return _busy_text()
+                if not _is_rate_limited(response):
+                    return response
+                rate_governor.throttled(provider, model)
+            return response
+
+        return wrapper
+    return decorator
+
+
+# Single global instance — shared by every provider adapter, sync and async
+rate_governor = RateGovernor()
+metrics.register_collector("rate_governor", rate_governor.stats)
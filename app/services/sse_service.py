@@ -2,10 +2,27 @@ import json
 import logging
 import queue
 import time
-from threading import Lock
+from threading import Event, Lock, Thread
+from app.services.metrics_service import Histogram, RateMeter, metrics
 
 logger = logging.getLogger(__name__)
 
+# Queue sentinel used to wake a reaped subscriber so its generator can exit.
+_CLOSE = object()
+
+
+class _Subscriber:
+    """A single SSE connection: its event queue plus liveness bookkeeping."""
+
+    __slots__ = ("queue", "last_active", "last_enqueued", "closed")
+
+    def __init__(self, maxsize):
+        now = time.monotonic()
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.last_active = now    # last time the generator pulled from the queue
+        self.last_enqueued = now  # last time anything was pushed into the queue
+        self.closed = False
+
 
 class SSEService:
     """
@@ -13,15 +30,45 @@ class SSEService:
 
     Manages real-time event distribution for RetireIQ sessions via
     Server-Sent Events (SSE).  Thread-safe via a shared Lock.
+
+    Heartbeats are driven by a single ticker thread rather than a timed wait
+    per connection: idle connections block on their queue without a timeout
+    and cost no CPU until the ticker pushes a ping.  The ticker also reaps
+    subscribers that stopped draining their queue (e.g. a dead client whose
+    generator never received GeneratorExit).
+
+    Throughput and subscription numbers are exposed via stats() and served
+    from GET /metrics under the "sse" key.
     """
 
     QUEUE_MAX_SIZE = 100
-    HEARTBEAT_INTERVAL_S = 20  # seconds before a keep-alive ping is sent
+    HEARTBEAT_INTERVAL_S = 20  # seconds of silence before a keep-alive ping is sent
+    TICK_INTERVAL_S = 5        # how often the heartbeat ticker scans the registry
+    STALE_AFTER_S = 60         # seconds without a queue read before a subscriber is reaped
+
+    LAG_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+    QUEUE_DEPTH_BUCKETS = (0, 1, 5, 10, 25, 50, 100)
+    LISTENER_BUCKETS = (1, 2, 3, 5, 10)
 
     def __init__(self):
-        # session_id → list[queue.Queue]
+        # session_id → list[_Subscriber]
         self.listeners: dict = {}
         self.lock = Lock()
+        self._heartbeat_thread = None
+        self._stop_event = Event()
+
+        # Instrumentation
+        self._stats_lock = Lock()
+        self._counters = {
+            "subscriptions_total": 0,
+            "published_total": 0,
+            "delivered_total": 0,
+            "dropped_total": 0,
+            "reaped_total": 0,
+            "bytes_written_total": 0,
+        }
+        self._publish_rate = RateMeter()
+        self._delivery_lag_ms = Histogram(self.LAG_BUCKETS_MS)
         logger.debug("[SSEService] Initialised.")
 
     # -----------------------------------------------------------------------
@@ -32,21 +79,27 @@ class SSEService:
         """
         Creates a listener queue for a session and yields SSE-formatted events.
 
-        The generator blocks until an event arrives or the heartbeat interval
-        expires.  On client disconnect (GeneratorExit), the queue is removed.
+        The generator blocks until an event (or a ticker-driven heartbeat)
+        arrives.  On client disconnect (GeneratorExit) or when the subscriber
+        is reaped as stale, the queue is removed.
         """
-        q = queue.Queue(maxsize=self.QUEUE_MAX_SIZE)
-        self._register_listener(session_id, q)
+        subscriber = _Subscriber(self.QUEUE_MAX_SIZE)
+        self._register_listener(session_id, subscriber)
+        self._ensure_heartbeat()
+        self._incr("subscriptions_total")
 
         logger.info("[SSEService] Client subscribed | session=%s total_listeners=%d",
                     session_id, len(self.listeners.get(session_id, [])))
 
         try:
-            yield self._format_sse("connected", {"status": "streaming", "session_id": session_id})
-            yield from self._event_loop(session_id, q)
+            connected = self._format_sse("connected", {"status": "streaming", "session_id": session_id})
+            self._incr("bytes_written_total", len(connected.encode("utf-8")))
+            yield connected
+            yield from self._event_loop(session_id, subscriber)
         except GeneratorExit:
-            self._deregister_listener(session_id, q)
             logger.info("[SSEService] Client disconnected | session=%s", session_id)
+        finally:
+            self._deregister_listener(session_id, subscriber)
 
     def publish(self, session_id, event, data):
         """
@@ -54,68 +107,199 @@ class SSEService:
         Events that exceed queue capacity are silently dropped.
         """
         with self.lock:
-            listeners = self.listeners.get(session_id, [])
+            listeners = list(self.listeners.get(session_id, []))
+
+        self._incr("published_total")
+        self._publish_rate.mark()
 
         if not listeners:
             logger.debug("[SSEService] Publish called with no active listeners | session=%s event=%s",
                          session_id, event)
             return
 
+        item = {"event": event, "data": data, "ts": time.monotonic()}
         dropped = 0
-        for q in listeners:
-            try:
-                q.put_nowait({"event": event, "data": data})
-            except queue.Full:
+        for subscriber in listeners:
+            if not self._offer(subscriber, item):
                 dropped += 1
                 logger.warning("[SSEService] Queue full — event dropped | session=%s event=%s",
                                session_id, event)
 
-        if dropped == 0:
+        if dropped:
+            self._incr("dropped_total", dropped)
+        else:
             logger.debug("[SSEService] Event published | session=%s event=%s listeners=%d",
                          session_id, event, len(listeners))
 
+    def shutdown(self):
+        """Stops the heartbeat ticker (used on worker exit and in tests)."""
+        self._stop_event.set()
+        thread = self._heartbeat_thread
+        if thread and thread.is_alive():
+            thread.join(timeout=self.TICK_INTERVAL_S)
+        self._heartbeat_thread = None
+
+    def stats(self):
+        """
+        Returns a JSON-serialisable snapshot of subscription and throughput
+        metrics: active sessions, listeners per session, publish rate,
+        queue-depth distribution, drops, publish→yield lag and bytes written.
+        """
+        with self.lock:
+            listener_counts = [len(subs) for subs in self.listeners.values()]
+            depths = [sub.queue.qsize() for subs in self.listeners.values() for sub in subs]
+
+        listeners_per_session = Histogram(self.LISTENER_BUCKETS)
+        for count in listener_counts:
+            listeners_per_session.observe(count)
+        queue_depth = Histogram(self.QUEUE_DEPTH_BUCKETS)
+        for depth in depths:
+            queue_depth.observe(depth)
+
+        with self._stats_lock:
+            counters = dict(self._counters)
+
+        return {
+            "active_sessions": len(listener_counts),
+            "active_listeners": sum(listener_counts),
+            "listeners_per_session": listeners_per_session.snapshot(),
+            "publish_rate_per_s": self._publish_rate.rate(),
+            "queue_depth": queue_depth.snapshot(),
+            "delivery_lag_ms": self._delivery_lag_ms.snapshot(),
+            **counters,
+        }
+
     # -----------------------------------------------------------------------
     # Private — Listener lifecycle
     # -----------------------------------------------------------------------
 
-    def _register_listener(self, session_id, q):
-        """Adds a new queue to the listener registry for a session."""
+    def _register_listener(self, session_id, subscriber):
+        """Adds a new subscriber to the listener registry for a session."""
         with self.lock:
             if session_id not in self.listeners:
                 self.listeners[session_id] = []
-            self.listeners[session_id].append(q)
+            self.listeners[session_id].append(subscriber)
 
-    def _deregister_listener(self, session_id, q):
-        """Removes a queue and cleans up empty session entries."""
+    def _deregister_listener(self, session_id, subscriber):
+        """Removes a subscriber and cleans up empty session entries."""
+        subscriber.closed = True
         with self.lock:
             if session_id in self.listeners:
                 try:
-                    self.listeners[session_id].remove(q)
+                    self.listeners[session_id].remove(subscriber)
                 except ValueError:
                     pass  # Already removed
                 if not self.listeners[session_id]:
                     del self.listeners[session_id]
                     logger.debug("[SSEService] Session cleaned up | session=%s", session_id)
 
+    def _offer(self, subscriber, item):
+        """Non-blocking enqueue.  Returns False if the subscriber's queue is full."""
+        try:
+            subscriber.queue.put_nowait(item)
+        except queue.Full:
+            return False
+        subscriber.last_enqueued = time.monotonic()
+        return True
+
+    # -----------------------------------------------------------------------
+    # Private — Heartbeat ticker
+    # -----------------------------------------------------------------------
+
+    def _ensure_heartbeat(self):
+        """Lazily starts the shared heartbeat ticker thread."""
+        with self.lock:
+            if self._heartbeat_thread and self._heartbeat_thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._heartbeat_thread = Thread(
+                target=self._heartbeat_loop, name="sse-heartbeat", daemon=True
+            )
+            self._heartbeat_thread.start()
+        logger.debug("[SSEService] Heartbeat ticker started | interval=%ss", self.TICK_INTERVAL_S)
+
+    def _heartbeat_loop(self):
+        """Ticker thread target: scans all subscribers every TICK_INTERVAL_S."""
+        while not self._stop_event.wait(self.TICK_INTERVAL_S):
+            try:
+                self._tick()
+            except Exception as e:
+                logger.error("[SSEService] Heartbeat tick failed: %s", e, exc_info=True)
+
+    def _tick(self, now=None):
+        """
+        One heartbeat pass.  Pings every subscriber that has been silent for
+        HEARTBEAT_INTERVAL_S and reaps those that have not read their queue
+        for STALE_AFTER_S.  Returns (pinged, reaped) counts.
+        """
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            snapshot = [(sid, sub) for sid, subs in self.listeners.items() for sub in subs]
+
+        pinged = reaped = 0
+        ping = {"event": "ping", "data": {"time": time.time()}, "ts": time.monotonic()}
+        for session_id, subscriber in snapshot:
+            if now - subscriber.last_active >= self.STALE_AFTER_S:
+                self._reap(session_id, subscriber)
+                reaped += 1
+            elif now - subscriber.last_enqueued >= self.HEARTBEAT_INTERVAL_S:
+                if self._offer(subscriber, ping):
+                    pinged += 1
+
+        if reaped:
+            self._incr("reaped_total", reaped)
+        if pinged or reaped:
+            logger.debug("[SSEService] Heartbeat tick | pinged=%d reaped=%d", pinged, reaped)
+        return pinged, reaped
+
+    def _reap(self, session_id, subscriber):
+        """Removes a stale subscriber and wakes its generator (if still alive) so it can exit."""
+        logger.warning("[SSEService] Reaping stale subscriber | session=%s idle=%.0fs",
+                       session_id, time.monotonic() - subscriber.last_active)
+        self._deregister_listener(session_id, subscriber)
+        try:
+            subscriber.queue.put_nowait(_CLOSE)
+        except queue.Full:
+            pass  # The closed flag is checked on the next read anyway
+
     # -----------------------------------------------------------------------
     # Private — Event loop
     # -----------------------------------------------------------------------
 
-    def _event_loop(self, session_id, q):
+    def _event_loop(self, session_id, subscriber):
         """
-        Yields formatted SSE events from the queue.
-        Sends a heartbeat ping every HEARTBEAT_INTERVAL_S seconds to
-        prevent proxy/load-balancer idle-connection timeouts.
+        Yields formatted SSE events from the subscriber's queue.
+        Blocks without a timeout; keep-alive pings are pushed by the
+        heartbeat ticker.  Returns once the subscriber has been reaped.
         """
         while True:
-            try:
-                event_data = q.get(timeout=self.HEARTBEAT_INTERVAL_S)
-                logger.debug("[SSEService] Yielding event | session=%s event=%s",
-                             session_id, event_data.get("event"))
-                yield self._format_sse(event_data["event"], event_data["data"])
-            except queue.Empty:
-                logger.debug("[SSEService] Heartbeat ping | session=%s", session_id)
-                yield self._format_sse("ping", {"time": time.time()})
+            event_data = subscriber.queue.get()
+            if event_data is _CLOSE or subscriber.closed:
+                logger.debug("[SSEService] Subscriber closed | session=%s", session_id)
+                return
+            subscriber.last_active = time.monotonic()
+            logger.debug("[SSEService] Yielding event | session=%s event=%s",
+                         session_id, event_data.get("event"))
+            frame = self._format_sse(event_data["event"], event_data["data"])
+            self._record_delivery(event_data, frame, subscriber.last_active)
+            yield frame
+
+    # -----------------------------------------------------------------------
+    # Private — Instrumentation
+    # -----------------------------------------------------------------------
+
+    def _incr(self, counter, amount=1):
+        with self._stats_lock:
+            self._counters[counter] += amount
+
+    def _record_delivery(self, event_data, frame, now):
+        """Records publish→yield lag and wire bytes for one delivered frame."""
+        published_at = event_data.get("ts")
+        if published_at is not None:
+            self._delivery_lag_ms.observe((now - published_at) * 1000)
+        with self._stats_lock:
+            self._counters["delivered_total"] += 1
+            self._counters["bytes_written_total"] += len(frame.encode("utf-8"))
 
     # -----------------------------------------------------------------------
     # Private — Formatting
@@ -128,3 +312,4 @@ class SSEService:
 
 # Single global instance — shared across all request threads
 sse_service = SSEService()
+metrics.register_collector("sse", sse_service.stats)
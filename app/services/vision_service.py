@@ -2,6 +2,7 @@ import logging
 from typing import Dict, Any, Optional, List
 from app.services.llm_service import call_vertex_ai_api
 from app.services.audit_service import historian
+from app.services.llm_telemetry import llm_telemetry
 
 logger = logging.getLogger(__name__)
 
@@ -44,12 +45,13 @@ class VisionAgent:
             )
 
         # Call Gemini 1.5 Pro via Vertex AI multimodal
-        raw_json = call_vertex_ai_api(
-            prompt=self.SYSTEM_PROMPT,
-            model_name="gemini-1.5-pro",
-            temperature=0.0, # Deterministic extraction
-            attachments=[base64_image]
-        )
+        with llm_telemetry.tag(agent="Vision", session_id=conversation_id):
+            raw_json = call_vertex_ai_api(
+                prompt=self.SYSTEM_PROMPT,
+                model_name="gemini-1.5-pro",
+                temperature=0.0, # Deterministic extraction
+                attachments=[base64_image]
+            )
         
         # In a real system, we'd use PII Sanitizer on the output before logging 
         # (though here the Vision output is for the bot's internal use)
@@ -0,0 +1,230 @@
+import itertools
+import logging
+import math
+import os
+import queue
+import time
+from concurrent.futures import Future
+from threading import Lock, Thread
+from app.services.metrics_service import Histogram, metrics
+
+logger = logging.getLogger(__name__)
+
+
+class PoolSaturated(Exception):
+    """Raised by AgentWorkerPool.submit when the backlog is at capacity."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Agent worker pool saturated; retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class Reservation:
+    """
+    One backlog slot claimed with AgentWorkerPool.reserve().  submit() on
+    it cannot be refused; leaving the with-block without submitting hands
+    the slot back.
+    """
+
+    def __init__(self, pool):
+        self._pool = pool
+        self.used = False
+
+    def submit(self, fn, *args, priority=None, **kwargs):
+        self.used = True
+        if priority is None:
+            priority = self._pool.PRIORITY_STREAMING
+        return self._pool._enqueue(fn, args, kwargs, priority)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if not self.used:
+            self.used = True
+            self._pool._release()
+        return False
+
+
+class AgentWorkerPool:
+    """
+    The Agent Worker Pool (The Scheduler).
+
+    A bounded, priority-ordered executor for agentic pipeline runs.  A fixed
+    number of worker threads drain a priority queue; once the backlog reaches
+    `max_queue`, new work is refused with PoolSaturated (carrying a
+    Retry-After estimate) instead of spawning yet another thread.
+    """
+
+    PRIORITY_INTERACTIVE = 0  # synchronous callers holding an HTTP worker
+    PRIORITY_STREAMING = 1    # streaming callers watching the SSE feed
+    PRIORITY_BACKGROUND = 2   # housekeeping (memory summarisation etc.)
+
+    WAIT_BUCKETS_MS = (10, 50, 100, 500, 1000, 5000, 15000, 60000)
+    RUN_BUCKETS_MS = (100, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+    MAX_RETRY_AFTER_S = 60
+
+    def __init__(self, max_workers=None, max_queue=None, name="agent"):
+        self.name = name
+        self.max_workers = max_workers or int(os.getenv("AGENT_POOL_MAX_WORKERS", "8"))
+        self.max_queue = max_queue or int(os.getenv("AGENT_POOL_MAX_QUEUE", "64"))
+
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._lock = Lock()
+        self._workers = []
+
+        self._queued = 0
+        self._in_flight = 0
+        self._counters = {"submitted": 0, "rejected": 0, "completed": 0, "failed": 0}
+        self._avg_run_s = 5.0  # EWMA seed — a typical agent turn
+        self._wait_ms = Histogram(self.WAIT_BUCKETS_MS)
+        self._run_ms = Histogram(self.RUN_BUCKETS_MS)
+        logger.info("[AgentPool] Initialised | name=%s workers=%d max_queue=%d",
+                    name, self.max_workers, self.max_queue)
+
+    # -----------------------------------------------------------------------
+    # Public API
+    # -----------------------------------------------------------------------
+
+    def submit(self, fn, *args, priority=PRIORITY_STREAMING, **kwargs):
+        """
+        Queues fn(*args, **kwargs) and returns a concurrent.futures.Future.
+        Raises PoolSaturated when the backlog is full.
+        """
+        self._admit()
+        return self._enqueue(fn, args, kwargs, priority)
+
+    def reserve(self):
+        """
+        Claims a backlog slot ahead of the work, so callers can refuse a
+        request before persisting anything.  Raises PoolSaturated.
+
+            with agent_pool.reserve() as slot:
+                ...
+                slot.submit(fn, *args, priority=...)
+        """
+        self._admit()
+        return Reservation(self)
+
+    def has_capacity(self):
+        """Cheap admission pre-check (racy by design; submit() is authoritative)."""
+        with self._lock:
+            return self._queued < self.max_queue
+
+    def retry_after(self):
+        """Seconds a rejected client should wait before retrying."""
+        with self._lock:
+            return self._estimate_retry_after()
+
+    def stats(self):
+        """Returns queue depth, in-flight count, counters and wait/run-time histograms."""
+        with self._lock:
+            snapshot = {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queue_depth": self._queued,
+                "in_flight": self._in_flight,
+                "avg_run_s": round(self._avg_run_s, 3),
+                **self._counters,
+            }
+        snapshot["wait_ms"] = self._wait_ms.snapshot()
+        snapshot["run_ms"] = self._run_ms.snapshot()
+        return snapshot
+
+    def shutdown(self, wait=True):
+        """Stops all workers after the current backlog drains."""
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for _ in workers:
+            self._queue.put((math.inf, next(self._sequence), 0, None, None, (), {}))
+        if wait:
+            for worker in workers:
+                worker.join()
+
+    # -----------------------------------------------------------------------
+    # Private — Admission
+    # -----------------------------------------------------------------------
+
+    def _admit(self):
+        """Takes one backlog slot or raises PoolSaturated."""
+        with self._lock:
+            if self._queued >= self.max_queue:
+                self._counters["rejected"] += 1
+                retry_after = self._estimate_retry_after()
+                logger.warning("[AgentPool] Saturated — rejecting task | queued=%d retry_after=%ss",
+                               self._queued, retry_after)
+                raise PoolSaturated(retry_after)
+            self._queued += 1
+            self._counters["submitted"] += 1
+
+    def _release(self):
+        """Returns a reserved slot that was never used."""
+        with self._lock:
+            self._queued -= 1
+            self._counters["submitted"] -= 1
+
+    def _enqueue(self, fn, args, kwargs, priority):
+        self._ensure_workers()
+        future = Future()
+        self._queue.put((priority, next(self._sequence), time.monotonic(), future, fn, args, kwargs))
+        logger.debug("[AgentPool] Task queued | priority=%d fn=%s", priority, getattr(fn, "__name__", fn))
+        return future
+
+    # -----------------------------------------------------------------------
+    # Private — Workers
+    # -----------------------------------------------------------------------
+
+    def _ensure_workers(self):
+        """Lazily starts the fixed set of worker threads."""
+        with self._lock:
+            if self._workers:
+                return
+            for i in range(self.max_workers):
+                worker = Thread(target=self._worker_loop, name=f"{self.name}-worker-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+        logger.info("[AgentPool] Started %d worker thread(s) | name=%s", self.max_workers, self.name)
+
+    def _worker_loop(self):
+        while True:
+            _, _, enqueued_at, future, fn, args, kwargs = self._queue.get()
+            if future is None:
+                return  # shutdown sentinel
+
+            started_at = time.monotonic()
+            with self._lock:
+                self._queued -= 1
+                self._in_flight += 1
+            self._wait_ms.observe((started_at - enqueued_at) * 1000)
+
+            if not future.set_running_or_notify_cancel():
+                with self._lock:
+                    self._in_flight -= 1
+                continue
+
+            try:
+                future.set_result(fn(*args, **kwargs))
+                outcome = "completed"
+            except BaseException as e:
+                logger.error("[AgentPool] Task raised: %s", e, exc_info=True)
+                future.set_exception(e)
+                outcome = "failed"
+
+            run_s = time.monotonic() - started_at
+            self._run_ms.observe(run_s * 1000)
+            with self._lock:
+                self._in_flight -= 1
+                self._counters[outcome] += 1
+                self._avg_run_s = 0.8 * self._avg_run_s + 0.2 * run_s
+
+    def _estimate_retry_after(self):
+        """Backlog drain time estimate; caller must hold the lock."""
+        backlog = self._queued + self._in_flight
+        estimate = math.ceil(backlog * self._avg_run_s / self.max_workers)
+        return max(1, min(self.MAX_RETRY_AFTER_S, estimate))
+
+
+# Single global instance — shared by the chat routes
+agent_pool = AgentWorkerPool()
+metrics.register_collector("agent_pool", agent_pool.stats)
@@ -0,0 +1,140 @@
+import importlib
+import logging
+import os
+import resource
+import time
+from threading import Lock
+from app.services.metrics_service import metrics
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------------
+# Lazy Imports
+# ---------------------------------------------------------------------------
+
+class LazyImport:
+    """
+    Stand-in for a heavy module (or a class inside one) that is only imported
+    on first use:
+
+        openai = lazy_import("openai")
+        GenerativeModel = lazy_import("vertexai.generative_models", "GenerativeModel")
+
+    Attribute access and calls are forwarded to the real object.  Truthiness
+    reports whether the import succeeds, so optional-SDK guards such as
+    `if not vertexai:` keep working without importing anything at startup.
+    """
+
+    def __init__(self, module, attribute=None):
+        self._module = module
+        self._attribute = attribute
+        self._target = None
+        self._error = None
+
+    def resolve(self):
+        if self._target is None:
+            if self._error is not None:
+                raise self._error
+            started = time.perf_counter()
+            try:
+                target = importlib.import_module(self._module)
+            except ImportError as e:
+                self._error = e
+                raise
+            self._target = getattr(target, self._attribute) if self._attribute else target
+            record_load(f"import:{self._module}", started)
+        return self._target
+
+    def __getattr__(self, name):
+        return getattr(self.resolve(), name)
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+    def __bool__(self):
+        try:
+            self.resolve()
+        except ImportError:
+            return False
+        return True
+
+    def __repr__(self):
+        name = f"{self._module}.{self._attribute}" if self._attribute else self._module
+        return f"<LazyImport {name} loaded={self._target is not None}>"
+
+
+def lazy_import(module, attribute=None):
+    return LazyImport(module, attribute)
+
+
+# ---------------------------------------------------------------------------
+# Warmup Registry
+# ---------------------------------------------------------------------------
+
+_lock = Lock()
+_warmers = {}   # component -> zero-arg loader
+_load_ms = {}   # component -> milliseconds spent loading it
+_warmup_ms = None
+
+
+def register_warmup(component, loader):
+    """Registers a heavy singleton's loader so warmup() can build it up front."""
+    with _lock:
+        _warmers[component] = loader
+
+
+def record_load(component, started):
+    """Records how long a lazily loaded component took (first load only)."""
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+    with _lock:
+        _load_ms.setdefault(component, elapsed_ms)
+    logger.info("[Startup] Loaded %s in %.1f ms", component, elapsed_ms)
+
+
+def warmup(components=None):
+    """
+    Builds every registered heavy singleton (spaCy/Presidio, the guardrails
+    policy, the configured provider SDK) now instead of on the first
+    request.  Call it from a gunicorn master after preload_app so the
+    loaded pages are shared copy-on-write by all workers, or per worker
+    otherwise (see gunicorn.conf.py).  A failing loader is logged and left
+    to load lazily.  Returns startup_report().
+    """
+    global _warmup_ms
+    started = time.perf_counter()
+    with _lock:
+        selected = [(name, loader) for name, loader in _warmers.items()
+                    if components is None or name in components]
+
+    for name, loader in selected:
+        component_started = time.perf_counter()
+        try:
+            loader()
+        except Exception as e:
+            logger.warning("[Startup] Warmup of %s failed: %s", name, e)
+            continue
+        record_load(name, component_started)
+
+    _warmup_ms = round((time.perf_counter() - started) * 1000, 1)
+    report = startup_report()
+    logger.info("[Startup] Warmup complete in %.1f ms | pid=%d peak_rss_mb=%.1f components=%s",
+                _warmup_ms, os.getpid(), report["peak_rss_mb"], report["load_ms"])
+    return report
+
+
+def startup_report():
+    """What has been loaded so far, how long each took, and peak RSS."""
+    with _lock:
+        load_ms = dict(_load_ms)
+        registered = sorted(_warmers)
+    return {
+        "warmed_up": _warmup_ms is not None,
+        "warmup_ms": _warmup_ms,
+        "registered": registered,
+        "load_ms": load_ms,
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+metrics.register_collector("startup", startup_report)
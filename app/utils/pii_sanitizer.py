@@ -1,57 +1,408 @@
+import hashlib
 import json
 import logging
-from presidio_analyzer import AnalyzerEngine, nlp_engine, PatternRecognizer, Pattern
-from presidio_anonymizer import AnonymizerEngine
+import os
+import re
+import time
+from collections import OrderedDict
+from threading import Lock
+from app.services.metrics_service import Histogram, metrics
+from app.utils.lazy import record_load, register_warmup
 
 logger = logging.getLogger(__name__)
 
 
 # ---------------------------------------------------------------------------
-# Custom Financial Entity Recognizers (Bank-Grade Security)
+# Presidio Engines (built lazily, shared by every PIISanitizer context)
 # ---------------------------------------------------------------------------
 
-logger.debug("[PIISanitizer] Registering custom financial entity recognizers.")
+class PresidioEngines:
+    """
+    The Presidio/spaCy state, built in two stages on first use:
+      1. registry  — predefined pattern recognizers plus the custom financial
+                     ones (SSN, account, NI, IBAN); no spaCy model needed.
+      2. analyzer  — the full AnalyzerEngine with the en_core_web_sm pipeline,
+                     only needed when a text has a word that could be a name.
+    Importing this module is therefore cheap; warmup() builds both stages
+    up front (e.g. in a gunicorn master before forking).
+    """
+
+    NLP_CONFIGURATION = {
+        "nlp_engine_name": "spacy",
+        "models": [{"lang_code": "en", "model_name": "en_core_web_sm"}],
+    }
+
+    def __init__(self):
+        self._lock = Lock()
+        self._recognizers = None  # stage 1 state, see _build_recognizers()
+        self._analyzer = None
+
+    @property
+    def registry(self):
+        return self._stage_one()["registry"]
+
+    @property
+    def regex_recognizers(self):
+        return self._stage_one()["regex_recognizers"]
+
+    @property
+    def ner_only_entities(self):
+        return self._stage_one()["ner_only_entities"]
+
+    def remove_duplicates(self, results):
+        return self._stage_one()["remove_duplicates"](results)
+
+    @property
+    def analyzer(self):
+        if self._analyzer is None:
+            registry = self.registry
+            with self._lock:
+                if self._analyzer is None:
+                    self._analyzer = self._build_analyzer(registry)
+        return self._analyzer
+
+    @property
+    def nlp_engine(self):
+        return self.analyzer.nlp_engine
+
+    def warmup(self):
+        return self.analyzer
+
+    def _stage_one(self):
+        if self._recognizers is None:
+            with self._lock:
+                if self._recognizers is None:
+                    self._recognizers = self._build_recognizers()
+        return self._recognizers
+
+    def _build_recognizers(self):
+        started = time.perf_counter()
+        from presidio_analyzer import EntityRecognizer, Pattern, PatternRecognizer, RecognizerRegistry
+        from presidio_analyzer.predefined_recognizers import SpacyRecognizer
+
+        registry = RecognizerRegistry()
+        registry.load_predefined_recognizers(languages=["en"])
+
+        logger.debug("[PIISanitizer] Registering custom financial entity recognizers.")
+        # US Social Security Number: 123-45-6789
+        registry.add_recognizer(PatternRecognizer(supported_entity="SSN", patterns=[
+            Pattern(name="ssn_pattern", regex=r"\b\d{3}-\d{2}-\d{4}\b", score=0.5),
+        ]))
+        # Bank-format account numbers: GB29NWBK, US1234567890
+        registry.add_recognizer(PatternRecognizer(supported_entity="ACCOUNT_NUMBER", patterns=[
+            Pattern(name="account_pattern", regex=r"\b[A-Z]{2,4}\d{5,12}\b", score=0.6),
+        ]))
+        # UK National Insurance Number: QQ 12 34 56 C
+        registry.add_recognizer(PatternRecognizer(supported_entity="UK_NI", patterns=[
+            Pattern(name="ni_pattern", regex=r"\b[A-Z]{2}\s?\d{2}\s?\d{2}\s?\d{2}\s?[A-Z]\b", score=0.8),
+        ]))
+        # IBAN (International Bank Account Number)
+        registry.add_recognizer(PatternRecognizer(supported_entity="IBAN", patterns=[
+            Pattern(name="iban_pattern", regex=r"\b[A-Z]{2}\d{2}[A-Z0-9]{4}\d{7}([A-Z0-9]?){0,16}\b", score=0.8),
+        ]))
+
+        # Every recognizer that works on the raw text alone (compiled patterns,
+        # checksums, phonenumbers) — SSN, NI, IBAN, account, email, phone...
+        regex_recognizers = [
+            r for r in registry.get_recognizers(language="en", all_fields=True)
+            if not isinstance(r, SpacyRecognizer)
+        ]
+        record_load("pii_recognizers", started)
+        return {
+            "registry": registry,
+            "regex_recognizers": regex_recognizers,
+            # Entities only the spaCy NER model can find (PERSON, LOCATION, NRP)
+            "ner_only_entities": frozenset(SpacyRecognizer.ENTITIES) - {
+                entity for r in regex_recognizers for entity in r.supported_entities
+            },
+            "remove_duplicates": EntityRecognizer.remove_duplicates,
+        }
+
+    def _build_analyzer(self, registry):
+        started = time.perf_counter()
+        from presidio_analyzer import AnalyzerEngine, nlp_engine
+
+        provider = nlp_engine.NlpEngineProvider(nlp_configuration=self.NLP_CONFIGURATION)
+        analyzer = AnalyzerEngine(
+            registry=registry, nlp_engine=provider.create_engine(), supported_languages=["en"]
+        )
+        logger.debug("[PIISanitizer] AnalyzerEngine initialised with custom financial recognizers.")
+        record_load("pii_analyzer", started)
+        return analyzer
+
+
+_engines = PresidioEngines()
+register_warmup("pii_engines", _engines.warmup)
+
+
+# ---------------------------------------------------------------------------
+# Tiered Detection (regex first, spaCy NER only when needed)
+# ---------------------------------------------------------------------------
+
+# Emails, URLs and handles are left to the regex recognizers, not read as words
+_MACHINE_TOKEN = re.compile(r"\S+@\S+|https?://\S+|www\.\S+")
+# Words, case-insensitive; digits glued to letters (401k, 60th) are not words
+_WORD = re.compile(r"\b[A-Za-z][A-Za-z']*\b")
+# Acronyms such as IRA, RMD or NI are never names on their own
+_ACRONYM = re.compile(r"[A-Z]{2,5}")
+# Words that are never a name or place.  Deliberately conservative: any word
+# outside this list (lowercase or not) sends the text to spaCy, and words
+# that double as first names (will, may, mark, bill, sue, frank...) are
+# left out on purpose.
+_NON_NAME_WORDS = frozenset("""
+    a about above after again against all also am an and any are as at be because been
+    before being below between both but by can can't cannot could couldn't did didn't do
+    does doesn't doing don't down during each either else enough every few for from
+    further get gets getting got had hadn't has hasn't have haven't having he her here
+    hers herself him himself his how i i'd i'll i'm i've if in into is isn't it it's
+    its itself just let let's me more most much must my myself need needs no nor not now
+    of off ok okay on once only or other our ours ourselves out over own please quite
+    rather same she should shouldn't so some still such than that that's the their
+    theirs them themselves then there these they this those through to too under until
+    up upon us very was wasn't we were weren't what what's whats when where which while
+    who whom whose why with within without would wouldn't yes yet you you'd you'll
+    you're you've your yours yourself
+    hello hi hey thanks thank cheers sure great good fine morning afternoon evening
+    bye goodbye sorry right wrong really maybe perhaps another many lot lots little
+    new old next last first second third each per one two three four five ten hundred
+    thousand million year years month months monthly week weeks day days today tomorrow
+    age old time early earlier later soon ago
+    tell show explain give help run want wants wanted like would know think mean means
+    make makes made take takes go going put puts keep look looking pay paying paid send
+    sent receive move moving transfer buy sell sold update change changed check compare
+    calculate plan planning start stop leave live living work working worth afford
+    retire retired retiring retirement save saving savings invest investing investment
+    investments fund funds index stock stocks bond bonds share shares portfolio
+    pension pensions account accounts balance contribution contributions contribute
+    withdraw withdrawal withdrawals withdrawing income tax taxes taxed rate rates return
+    returns risk risks fee fees cost costs money cash spend spending budget debt loan
+    loans mortgage house home property annuity annuities insurance benefit benefits
+    allowance lump sum salary wage wages interest inflation market markets growth
+    dividend dividends profit loss gain gains capital asset assets estate wealth financial
+    finance finances advice adviser advisor plan plans scenario goal goals target
+    option options strategy simulation projection forecast report summary
+    roth traditional monte carlo social security medicare medicaid
+    email phone number address details profile name
+""".split())
+
+_tier_lock = Lock()
+_tier_counts = {"regex": 0, "ner": 0}
+_tier_latency_ms = {tier: Histogram((0.1, 0.5, 1, 5, 10, 50, 100, 500)) for tier in _tier_counts}
+
+
+def _needs_ner(text, entities):
+    """
+    True when the text could contain an entity only spaCy NER can find,
+    i.e. it has any word outside _NON_NAME_WORDS — whatever its case, so
+    names typed in lowercase are still scanned.
+    """
+    if not _engines.ner_only_entities.intersection(entities):
+        return False
+    for word in _WORD.findall(_MACHINE_TOKEN.sub(" ", text)):
+        if len(word) == 1 or _ACRONYM.fullmatch(word):
+            continue
+        if word.lower() not in _NON_NAME_WORDS:
+            return True
+    return False
+
+
+def _regex_analyze(text, entities):
+    """Tier 1: runs only the pattern/checksum recognizers — no spaCy pipeline."""
+    results = []
+    for recognizer in _engines.regex_recognizers:
+        wanted = [e for e in recognizer.supported_entities if e in entities]
+        if wanted:
+            results.extend(recognizer.analyze(text=text, entities=wanted, nlp_artifacts=None) or [])
+    return _engines.remove_duplicates(results)
+
+
+def _record_tier(tier, started, texts=1):
+    _tier_latency_ms[tier].observe((time.perf_counter() - started) * 1000 / texts)
+    with _tier_lock:
+        _tier_counts[tier] += texts
 
-# US Social Security Number: 123-45-6789
-_ssn_pattern = Pattern(name="ssn_pattern", regex=r"\b\d{3}-\d{2}-\d{4}\b", score=0.5)
-_ssn_recognizer = PatternRecognizer(supported_entity="SSN", patterns=[_ssn_pattern])
 
-# Bank-format account numbers: GB29NWBK, US1234567890
-_account_pattern = Pattern(name="account_pattern", regex=r"\b[A-Z]{2,4}\d{5,12}\b", score=0.6)
-_account_recognizer = PatternRecognizer(
-    supported_entity="ACCOUNT_NUMBER", patterns=[_account_pattern]
-)
+def scrub_stats():
+    """How often the spaCy NER tier was needed, and per-tier latency."""
+    with _tier_lock:
+        counts = dict(_tier_counts)
+    total = sum(counts.values())
+    return {
+        **{f"{tier}_scans": count for tier, count in counts.items()},
+        "ner_rate": round(counts["ner"] / total, 3) if total else 0.0,
+        "latency_ms": {tier: histogram.snapshot() for tier, histogram in _tier_latency_ms.items()},
+    }
 
-# UK National Insurance Number: QQ 12 34 56 C
-_ni_pattern = Pattern(name="ni_pattern", regex=r"\b[A-Z]{2}\s?\d{2}\s?\d{2}\s?\d{2}\s?[A-Z]\b", score=0.8)
-_ni_recognizer = PatternRecognizer(supported_entity="UK_NI", patterns=[_ni_pattern])
 
-# IBAN (International Bank Account Number)
-_iban_pattern = Pattern(name="iban_pattern", regex=r"\b[A-Z]{2}\d{2}[A-Z0-9]{4}\d{7}([A-Z0-9]?){0,16}\b", score=0.8)
-_iban_recognizer = PatternRecognizer(supported_entity="IBAN", patterns=[_iban_pattern])
+metrics.register_collector("pii_scrubber", scrub_stats)
+
 
 # ---------------------------------------------------------------------------
-# Engine Initialisation
+# Placeholder Restoration
 # ---------------------------------------------------------------------------
 
-_nlp_configuration = {
-    "nlp_engine_name": "spacy",
-    "models": [{"lang_code": "en", "model_name": "en_core_web_sm"}],
+# Placeholder grammar produced by _replace_entities: <ENTITY_TYPE_N>
+_PLACEHOLDER_PATTERN = re.compile(r"<[A-Z][A-Z0-9_]*_\d+>")
+
+
+def _restore_placeholders(text, mapping):
+    """
+    Replaces every placeholder in text with its original value in a single
+    linear scan: each grammar match is looked up in the mapping, so
+    <PERSON_10> can never be partially matched by <PERSON_1>.
+    Returns (restored_text, number_of_placeholders_restored).
+    """
+    if not mapping or "<" not in text:
+        return text, 0
+
+    replacements = 0
+
+    def _lookup(match):
+        nonlocal replacements
+        original_value = mapping.get(match.group(0))
+        if original_value is None:
+            return match.group(0)
+        replacements += 1
+        return str(original_value)
+
+    return _PLACEHOLDER_PATTERN.sub(_lookup, text), replacements
+
+
+class StreamingDeanonymizer:
+    """
+    Incremental de-anonymiser for token streams.
+
+    feed(chunk) returns the restored text that is safe to emit now; only the
+    shortest tail that could still grow into a placeholder (e.g. "<PER") is
+    held back, so buffering never exceeds the longest placeholder length.
+    flush() returns whatever is left once the stream ends.
+    """
+
+    def __init__(self, mapping):
+        self.mapping = dict(mapping)
+        self._max_hold = max((len(k) for k in self.mapping), default=1) - 1
+        # Every proper prefix of every placeholder, e.g. "<", "<P", ... "<PERSON_0"
+        self._prefixes = {key[:i] for key in self.mapping for i in range(1, len(key))}
+        self._buffer = ""
+
+    def feed(self, chunk):
+        if not self.mapping:
+            return chunk
+
+        text = self._buffer + chunk
+        hold = 0
+        for n in range(min(len(text), self._max_hold), 0, -1):
+            if text[-n:] in self._prefixes:
+                hold = n
+                break
+
+        ready, self._buffer = text[:len(text) - hold], text[len(text) - hold:]
+        return _restore_placeholders(ready, self.mapping)[0]
+
+    def flush(self):
+        tail, self._buffer = self._buffer, ""
+        return _restore_placeholders(tail, self.mapping)[0]
+
+
+# ---------------------------------------------------------------------------
+# Profile Anonymisation Cache
+# ---------------------------------------------------------------------------
+
+# Structured profile fields whose whole value is a known entity: masked
+# deterministically, without a detection pass.  Keys are matched lower-case.
+PROFILE_FIELD_ENTITIES = {
+    "first_name": "PERSON", "middle_name": "PERSON", "last_name": "PERSON",
+    "name": "PERSON", "full_name": "PERSON", "preferred_name": "PERSON",
+    "email": "EMAIL_ADDRESS", "email_address": "EMAIL_ADDRESS",
+    "phone": "PHONE_NUMBER", "phone_number": "PHONE_NUMBER", "mobile": "PHONE_NUMBER",
+    "address": "LOCATION", "street": "LOCATION", "city": "LOCATION",
+    "postcode": "LOCATION", "post_code": "LOCATION", "zip_code": "LOCATION",
+    "ssn": "SSN", "ni_number": "UK_NI", "national_insurance_number": "UK_NI",
+    "iban": "IBAN", "account_number": "ACCOUNT_NUMBER",
 }
 
-_provider = nlp_engine.NlpEngineProvider(nlp_configuration=_nlp_configuration)
-_nlp_engine_instance = _provider.create_engine()
 
-# Presidio Analyzer — detects PII entities
-_analyzer = AnalyzerEngine(nlp_engine=_nlp_engine_instance, supported_languages=["en"])
-_analyzer.registry.add_recognizer(_ssn_recognizer)
-_analyzer.registry.add_recognizer(_account_recognizer)
-_analyzer.registry.add_recognizer(_ni_recognizer)
-_analyzer.registry.add_recognizer(_iban_recognizer)
-logger.debug("[PIISanitizer] AnalyzerEngine initialised with custom financial recognizers.")
+class _FreeText:
+    """Marks where a free-text profile value goes once the batch scan returns."""
+    __slots__ = ("index",)
 
-# Presidio Anonymizer — replaces detected entities with placeholders
-_anonymizer = AnonymizerEngine()
+    def __init__(self, index):
+        self.index = index
+
+
+def _fill_free_text(value, scrubbed):
+    if isinstance(value, dict):
+        return {k: _fill_free_text(v, scrubbed) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_fill_free_text(item, scrubbed) for item in value]
+    if isinstance(value, _FreeText):
+        return scrubbed[value.index]
+    return value
+
+
+class ProfileAnonymizationCache:
+    """
+    Caches the anonymised profile string per user, keyed by a content hash
+    of the profile, together with the Ghost Map and counters it produced.
+    A profile rarely changes between turns, so every turn after the first
+    re-uses the scrub instead of re-scanning the whole blob.
+
+    One entry per user id (a changed profile replaces the old entry),
+    bounded by PII_PROFILE_CACHE_MAX_ENTRIES users, least recently used
+    evicted first.  Entries hold original PII values, in process memory only.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("PII_PROFILE_CACHE_ENABLED", "true").lower() == "true"
+        self.max_entries = int(os.getenv("PII_PROFILE_CACHE_MAX_ENTRIES", "512"))
+        self._entries = OrderedDict()  # user_id -> (fingerprint, text, mapping, counters)
+        self._lock = Lock()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def fingerprint(profile_dict, *variant):
+        payload = json.dumps([profile_dict, variant], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, user_id, fingerprint):
+        """Returns (text, mapping, counters), or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[0] == fingerprint:
+                self._entries.move_to_end(user_id)
+                self._counters["hits"] += 1
+                return entry[1], dict(entry[2]), dict(entry[3])
+            self._counters["misses"] += 1
+            return None
+
+    def put(self, user_id, fingerprint, text, mapping, counters):
+        with self._lock:
+            self._entries[user_id] = (fingerprint, text, dict(mapping), dict(counters))
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def invalidate(self, user_id=None):
+        """Drops one user's entry, or every entry."""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            size = len(self._entries)
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            "enabled": self.enabled,
+            "size": size,
+            "max_entries": self.max_entries,
+            **counters,
+            "hit_rate": round(counters["hits"] / lookups, 3) if lookups else 0.0,
+        }
 
 
 # ---------------------------------------------------------------------------
@@ -64,7 +415,12 @@ class PIISanitizer:
       1. sanitize_text        — anonymises raw text (builds the Ghost Map)
       2. sanitize_profile_to_string — serialises and anonymises a profile dict
       3. deanonymize_response — restores original values from the Ghost Map
-      4. clear_mapping        — resets the Ghost Map between requests (session isolation)
+      4. clear_mapping        — resets the Ghost Map and counters for reuse
+
+    An instance is a request-scoped PII context: create one per request.
+    It owns only the Ghost Map and counters; the Presidio engines are
+    module-level and shared, so instances are cheap and concurrent requests
+    can scrub in parallel without locking or seeing each other's PII.
     """
 
     # Entity types to detect and redact by default
@@ -73,7 +429,13 @@ class PIISanitizer:
         "LOCATION", "SSN", "ACCOUNT_NUMBER", "UK_NI", "IBAN",
     ]
 
-    def __init__(self):
+    def __init__(self, strict=None, field_aware=None):
+        # strict: always run the full spaCy NER pass instead of the regex-first tiers
+        self.strict = (os.getenv("PII_SCRUB_STRICT", "false").lower() == "true") if strict is None else strict
+        # field_aware: mask known profile fields directly, scan only free-text values
+        self.field_aware = (
+            os.getenv("PII_PROFILE_FIELD_AWARE", "true").lower() == "true"
+        ) if field_aware is None else field_aware
         # The 'Ghost Map': placeholder → original value
         self.mapping: dict[str, str] = {}
         # Keeps track of how many of each entity type we've seen to ensure unique placeholders
@@ -95,7 +457,30 @@ class PIISanitizer:
         if entities is None:
             entities = self.DEFAULT_ENTITIES
 
-        results = self._detect_entities(raw_text, entities)
+        return self._apply_results(raw_text, self._detect_entities(raw_text, entities))
+
+    def sanitize_batch(self, texts, entities=None, batch_size=None, n_process=None):
+        """
+        Batch variant of sanitize_text for scrubbing many texts at once
+        (history re-sanitisation, memory ingestion, bulk redaction).  Texts
+        that need NER go through spaCy's nlp.pipe in batches of batch_size
+        (PII_BATCH_SIZE) across n_process worker processes
+        (PII_BATCH_N_PROCESS); the rest take the regex tier.  Placeholders
+        are numbered across the whole batch.
+
+        Returns:
+            [(sanitized_text, local_mapping), ...] in input order.
+        """
+        if entities is None:
+            entities = self.DEFAULT_ENTITIES
+        batch_size = batch_size or int(os.getenv("PII_BATCH_SIZE", "64"))
+        n_process = n_process or int(os.getenv("PII_BATCH_N_PROCESS", "1"))
+
+        results = self._detect_entities_batch(list(texts), entities, batch_size, n_process)
+        return [self._apply_results(text, text_results) for text, text_results in results]
+
+    def _apply_results(self, raw_text, results):
+        """Replaces detected spans and merges them into the Ghost Map."""
         if not results:
             logger.debug("[Guardian] No PII detected in text (len=%d).", len(raw_text))
             return raw_text, {}
@@ -114,38 +499,59 @@ class PIISanitizer:
     def sanitize_profile_to_string(self, profile_dict):
         """
         Serialises a user profile dict to JSON and anonymises it.
+
+        When this is the first thing scrubbed into the Ghost Map and the
+        profile has an id, the result is served from profile_cache while the
+        profile content is unchanged.
         """
-        raw_text = json.dumps(profile_dict)
-        logger.debug("[Guardian] Sanitising profile dict (%d bytes).", len(raw_text))
-        sanitized_text, _ = self.sanitize_text(raw_text)
+        user_id = profile_dict.get("id") if isinstance(profile_dict, dict) else None
+        cacheable = profile_cache.enabled and user_id is not None and not self.mapping and not self.counters
+        if cacheable:
+            fingerprint = profile_cache.fingerprint(profile_dict, self.strict, self.field_aware)
+            cached = profile_cache.get(user_id, fingerprint)
+            if cached:
+                sanitized_text, self.mapping, self.counters = cached
+                logger.debug("[Guardian] Profile anonymisation cache hit | entities=%d", len(self.mapping))
+                return sanitized_text
+
+        if self.field_aware and isinstance(profile_dict, dict):
+            logger.debug("[Guardian] Sanitising profile dict field by field.")
+            free_text = []
+            skeleton = self._sanitize_profile_value(None, profile_dict, free_text)
+            scrubbed = [text for text, _ in self.sanitize_batch(free_text)]
+            sanitized_text = json.dumps(_fill_free_text(skeleton, scrubbed))
+        else:
+            raw_text = json.dumps(profile_dict)
+            logger.debug("[Guardian] Sanitising profile dict (%d bytes).", len(raw_text))
+            sanitized_text, _ = self.sanitize_text(raw_text)
+
+        if cacheable:
+            profile_cache.put(user_id, fingerprint, sanitized_text, self.mapping, self.counters)
         return sanitized_text
 
     def deanonymize_response(self, llm_response_text):
         """
-        Iterates the Ghost Map (longest-key-first to avoid substring collisions)
-        and restores every placeholder to its original value.
+        Restores every placeholder in the response to its original value in
+        one compiled-regex pass over the text; placeholders that are not in
+        the Ghost Map (e.g. invented by the model) are left untouched.
         """
         if not self.mapping:
             logger.debug("[Guardian] Ghost map empty — no de-anonymisation needed.")
             return llm_response_text
 
-        text = llm_response_text
-        # Sort descending by key length to prevent <PERSON_10> being partially matched by <PERSON_1>
-        sorted_pairs = sorted(self.mapping.items(), key=lambda x: len(x[0]), reverse=True)
-
-        replacements = 0
-        for placeholder, original_value in sorted_pairs:
-            if placeholder in text:
-                text = text.replace(placeholder, str(original_value))
-                replacements += 1
-
+        text, replacements = _restore_placeholders(llm_response_text, self.mapping)
         logger.info("[Guardian] De-anonymised %d token(s) in response.", replacements)
         return text
 
+    def stream_deanonymizer(self):
+        """Returns a StreamingDeanonymizer bound to a snapshot of the current Ghost Map."""
+        return StreamingDeanonymizer(self.mapping)
+
     def clear_mapping(self):
         """
-        Resets the Ghost Map and counters. Must be called at the start of every
-        new request to guarantee session isolation.
+        Resets the Ghost Map and counters so the instance can be reused.
+        Requests don't need this: each one creates its own PIISanitizer,
+        which is what isolates their PII.
         """
         self.mapping = {}
         self.counters = {}
@@ -155,12 +561,90 @@ class PIISanitizer:
     # Private helpers
     # -----------------------------------------------------------------------
 
+    def _sanitize_profile_value(self, key, value, free_text):
+        """
+        Field-aware profile walk: known PII fields are masked whole, numbers,
+        booleans and ids pass through, and other strings are collected into
+        free_text (left as _FreeText markers) to be scanned in one batch.
+        """
+        if isinstance(value, dict):
+            return {k: self._sanitize_profile_value(k, v, free_text) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._sanitize_profile_value(key, item, free_text) for item in value]
+        if not isinstance(value, str) or not value.strip() or key == "id":
+            return value
+
+        entity_type = PROFILE_FIELD_ENTITIES.get(str(key).lower()) if key is not None else None
+        if entity_type:
+            return self._placeholder_for(entity_type, value)
+        free_text.append(value)
+        return _FreeText(len(free_text) - 1)
+
+    def _placeholder_for(self, entity_type, value):
+        """Deterministic placeholder for a known value, re-used if already mapped."""
+        prefix = f"<{entity_type}_"
+        for placeholder, original_value in self.mapping.items():
+            if original_value == value and placeholder.startswith(prefix):
+                return placeholder
+        idx = self.counters.get(entity_type, 0)
+        self.counters[entity_type] = idx + 1
+        placeholder = f"{prefix}{idx}>"
+        self.mapping[placeholder] = value
+        return placeholder
+
     def _detect_entities(self, text, entities):
-        """Runs Presidio analysis and returns results sorted start-descending."""
-        results = _analyzer.analyze(text=text, entities=entities, language="en")
+        """
+        Runs Presidio analysis and returns results sorted start-descending.
+        Tier 1 (regex) suffices only when every word of the text is known not
+        to be a name and the context is not strict; otherwise the spaCy
+        pipeline is invoked.
+        """
+        started = time.perf_counter()
+        if self.strict or _needs_ner(text, entities):
+            results = _engines.analyzer.analyze(text=text, entities=entities, language="en")
+            _record_tier("ner", started)
+        else:
+            results = _regex_analyze(text, entities)
+            _record_tier("regex", started)
         # Sort descending by start index so replacements don't shift un-processed indices
         return sorted(results, key=lambda x: x.start, reverse=True)
 
+    def _detect_entities_batch(self, texts, entities, batch_size, n_process):
+        """
+        _detect_entities for many texts: regex-tier texts are analysed
+        directly, the rest share one nlp.pipe pass whose docs feed the
+        analyzer (custom pattern recognizers included).
+        Returns [(text, results), ...] in input order.
+        """
+        results = [None] * len(texts)
+        ner_indices = []
+        started = time.perf_counter()
+        for i, text in enumerate(texts):
+            if self.strict or _needs_ner(text, entities):
+                ner_indices.append(i)
+            else:
+                results[i] = _regex_analyze(text, entities)
+        if len(ner_indices) < len(texts):
+            _record_tier("regex", started, texts=len(texts) - len(ner_indices))
+
+        if ner_indices:
+            started = time.perf_counter()
+            nlp_engine = _engines.nlp_engine
+            docs = nlp_engine.nlp["en"].pipe(
+                (texts[i] for i in ner_indices), batch_size=batch_size, n_process=n_process
+            )
+            for i, doc in zip(ner_indices, docs):
+                nlp_artifacts = nlp_engine._doc_to_nlp_artifact(doc, "en")
+                results[i] = _engines.analyzer.analyze(
+                    text=texts[i], entities=entities, language="en", nlp_artifacts=nlp_artifacts
+                )
+            _record_tier("ner", started, texts=len(ner_indices))
+
+        return [
+            (text, sorted(text_results, key=lambda x: x.start, reverse=True))
+            for text, text_results in zip(texts, results)
+        ]
+
     def _replace_entities(self, raw_text, results):
         """
         Iterates detected entity spans (right-to-left) and substitutes each
@@ -191,5 +675,6 @@ class PIISanitizer:
         return sanitized_text, local_mapping
 
 
-# Singleton — shared across all requests (mapping is reset per-request via clear_mapping)
-sanitizer = PIISanitizer()
+# Single global instance — profile scrubs shared across requests (keyed per user)
+profile_cache = ProfileAnonymizationCache()
+metrics.register_collector("pii_profile_cache", profile_cache.stats)
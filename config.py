@@ -13,6 +13,9 @@ class Config:
     if not SECRET_KEY:
         raise RuntimeError("JWT_SECRET_KEY environment variable is not set!")
 
+    # Bearer token required by GET /metrics; the endpoint is disabled when unset
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
     # Defaulting to sqlite if no DB url is provided
     SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL") or "sqlite:///" + os.path.join(
         instance_path, "app.db"
@@ -0,0 +1,38 @@
+"""
+Gunicorn settings for production serving:
+
+    gunicorn -c gunicorn.conf.py run:app
+
+With preload_app (the default) the app is imported once in the master and
+warmup() builds the heavy singletons (spaCy/Presidio, guardrails policy,
+provider SDK) there before forking, so workers share those pages
+copy-on-write.  With GUNICORN_PRELOAD=false each worker warms itself up
+after loading the app instead.
+"""
+import gc
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+
+
+def when_ready(server):
+    if preload_app:
+        from app.utils.lazy import warmup
+        warmup()
+        # Keep the warmed objects out of the collector's generations so
+        # workers don't touch (and un-share) their pages on every GC pass
+        gc.freeze()
+
+
+def post_worker_init(worker):
+    if not preload_app:
+        from app.utils.lazy import warmup
+        warmup()
+    # Each worker recovers retried/abandoned agent jobs from start-up, not
+    # only once it receives its first chat message (threads don't survive fork)
+    from app.routes.chat import start_job_poller
+    start_job_poller(worker.wsgi)
@@ -1,6 +1,12 @@
+import os
 from app import create_app, db
+from app.routes.chat import start_job_poller
 
 app = create_app()
 
 if __name__ == "__main__":
+    # Recover jobs left behind by a previous run; under the reloader only
+    # the serving child (not the file watcher) runs them
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_job_poller(app)
     app.run(debug=True, port=5000)
@@ -0,0 +1,172 @@
+import sys
+import os
+import argparse
+import json
+import re
+import subprocess
+import time
+from collections import defaultdict
+
+# Add the parent directory to the path so we can import 'app'
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT)
+
+# "import time: <self us> | <cumulative us> | <indented module name>"
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+\d+\s+\|\s*(\S+)$")
+
+
+def _child(measure_memory, run_warmup):
+    """Runs inside the profiled interpreter: cold-starts the app and prints a JSON summary."""
+    import resource
+    if measure_memory:
+        import tracemalloc
+        tracemalloc.start()
+
+    started = time.perf_counter()
+    from app import create_app
+    create_app()
+    if run_warmup:
+        from app.utils.lazy import warmup
+        warmup()
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    summary = {
+        "cold_start_ms": round(elapsed_ms, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+    if measure_memory:
+        memory = defaultdict(int)
+        for stat in tracemalloc.take_snapshot().statistics("filename"):
+            memory[_package_for_file(stat.traceback[0].filename)] += stat.size
+        summary["memory_bytes"] = dict(memory)
+    print(json.dumps(summary))
+
+
+def _package_for_file(filename):
+    """Maps a source file to its top-level package ('spacy', 'app', ...)."""
+    path = os.path.abspath(filename)
+    for marker in ("site-packages", "dist-packages"):
+        if f"{os.sep}{marker}{os.sep}" in path:
+            relative = path.split(f"{os.sep}{marker}{os.sep}", 1)[1]
+            return _top_level(relative.split(os.sep)[0])
+    if path.startswith(ROOT + os.sep):
+        return path[len(ROOT) + 1:].split(os.sep)[0].removesuffix(".py")
+    if filename.startswith("<"):
+        return "<frozen>"
+    return "stdlib"
+
+
+def _top_level(name):
+    return name.removesuffix(".py").split(".")[0]
+
+
+def _run_child(extra_flags, measure_memory, run_warmup):
+    cmd = [sys.executable, *extra_flags, os.path.abspath(__file__), "--child"]
+    if measure_memory:
+        cmd.append("--memory")
+    if run_warmup:
+        cmd.append("--warmup")
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    proc = subprocess.run(cmd, capture_output=True, text=True, cwd=ROOT, env=env)
+    summary_lines = [line for line in proc.stdout.splitlines() if line.startswith("{")]
+    if proc.returncode != 0 or not summary_lines:
+        sys.stderr.write(proc.stderr[-4000:])
+        raise SystemExit(f"Profiled app start-up failed (exit {proc.returncode})")
+    return json.loads(summary_lines[-1]), proc.stderr
+
+
+def parse_importtime(stderr):
+    """
+    Aggregates `-X importtime` output per top-level package.  Only each
+    module's self time is summed, so nothing is counted twice.
+    """
+    packages = defaultdict(lambda: {"self_us": 0, "modules": 0})
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        entry = packages[_top_level(match[2])]
+        entry["self_us"] += int(match[1])
+        entry["modules"] += 1
+    return packages
+
+
+def build_report(packages, summary, memory=None):
+    total_us = sum(entry["self_us"] for entry in packages.values()) or 1
+    rows = []
+    for name, entry in packages.items():
+        rows.append({
+            "package": name,
+            "self_ms": round(entry["self_us"] / 1000, 1),
+            "share_pct": round(100 * entry["self_us"] / total_us, 1),
+            "modules": entry["modules"],
+            "memory_mb": round((memory or {}).get(name, 0) / 1024 / 1024, 2),
+        })
+    rows.sort(key=lambda row: row["self_ms"], reverse=True)
+    return {
+        **summary,
+        "import_ms": round(total_us / 1000, 1),
+        "packages": rows,
+    }
+
+
+def _print_report(report, top):
+    print(f"Cold start: {report['cold_start_ms']:.0f} ms "
+          f"(imports {report['import_ms']:.0f} ms) | peak RSS {report['peak_rss_mb']:.0f} MB")
+    print(f"{'package':<28}{'import ms':>10}{'share %':>9}{'modules':>9}{'alloc MB':>10}")
+    for row in report["packages"][:top]:
+        print(f"{row['package']:<28}{row['self_ms']:>10.1f}{row['share_pct']:>9.1f}"
+              f"{row['modules']:>9}{row['memory_mb']:>10.2f}")
+
+
+def main():
+    """
+    Import-time profiler for worker cold start.  Starts the app in a fresh
+    interpreter under `-X importtime`, attributes import time (and, in a
+    second run under tracemalloc, allocated memory) to each top-level
+    package, and prints them sorted by self time.  Exits non-zero when cold
+    start exceeds --budget-ms (STARTUP_BUDGET_MS) or peak RSS exceeds
+    --budget-mb (STARTUP_BUDGET_MB), so CI can guard autoscaling latency.
+    """
+    parser = argparse.ArgumentParser(description="RetireIQ start-up import profiler")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("STARTUP_BUDGET_MS", "0")),
+                        help="fail when cold start exceeds this many ms (0 = no budget)")
+    parser.add_argument("--budget-mb", type=float, default=float(os.getenv("STARTUP_BUDGET_MB", "0")),
+                        help="fail when peak RSS exceeds this many MB (0 = no budget)")
+    parser.add_argument("--warmup", action="store_true", help="include warmup() in the measured start-up")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc attribution run")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--memory", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.memory, args.warmup)
+        return
+
+    summary, stderr = _run_child(["-X", "importtime"], measure_memory=False, run_warmup=args.warmup)
+    memory = None
+    if not args.no_memory:
+        # Separate run: tracemalloc slows imports down and would skew timings
+        memory = _run_child([], measure_memory=True, run_warmup=args.warmup)[0]["memory_bytes"]
+    report = build_report(parse_importtime(stderr), summary, memory)
+
+    failures = []
+    if args.budget_ms and report["cold_start_ms"] > args.budget_ms:
+        failures.append(f"cold start {report['cold_start_ms']:.0f} ms > budget {args.budget_ms:.0f} ms")
+    if args.budget_mb and report["peak_rss_mb"] > args.budget_mb:
+        failures.append(f"peak RSS {report['peak_rss_mb']:.0f} MB > budget {args.budget_mb:.0f} MB")
+    report["budget_failures"] = failures
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        _print_report(report, args.top)
+        for failure in failures:
+            print(f"BUDGET EXCEEDED: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import sys
+import os
+import argparse
+import logging
+import signal
+import threading
+
+# Add the parent directory to the path so we can import 'app'
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app import create_app
+from app.services.job_queue import job_queue
+from app.routes.chat import execute_agent_job
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+app = create_app()
+
+
+def _consume(stop_event):
+    with app.app_context():
+        job_queue.run_worker(execute_agent_job, stop_event=stop_event)
+
+
+def main():
+    """
+    Standalone agent worker.  Consumes the durable AgentJob queue so agent
+    turns can scale independently of the web tier (AGENT_QUEUE_MODE=external),
+    and recovers jobs abandoned by crashed processes in either mode.
+    SIGTERM/SIGINT finish in-flight turns before exiting.
+    """
+    parser = argparse.ArgumentParser(description="RetireIQ agent job worker")
+    parser.add_argument("--concurrency", type=int,
+                        default=int(os.getenv("AGENT_WORKER_CONCURRENCY", "4")))
+    args = parser.parse_args()
+
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+
+    threads = [
+        threading.Thread(target=_consume, args=(stop_event,), name=f"agent-job-worker-{i}")
+        for i in range(args.concurrency)
+    ]
+    for t in threads:
+        t.start()
+    logger.info("Agent worker running with %d consumer(s).", args.concurrency)
+
+    while any(t.is_alive() for t in threads):
+        for t in threads:
+            t.join(timeout=1)
+    logger.info("Agent worker stopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,10 +4,12 @@ import os
 # Add parent directory to sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from app.utils.pii_sanitizer import sanitizer
+from app.utils.pii_sanitizer import PIISanitizer
 
 def test_pii_sanitization():
     print("--- PII Sanitization Security Test ---")
+    # One sanitizer per conversation turn, as generate_ai_response does
+    sanitizer = PIISanitizer()
     
     # 1. Test Redaction
     raw_input = "My name is John Doe, my SSN is 123-45-6789 and my account is RET123456789. Contact me at john.doe@example.com."
@@ -29,11 +31,12 @@ def test_pii_sanitization():
         print("\n[SUCCESS] No PII leaks found in sanitized output.")
 
     # 2. Test Re-hydration
-    # Update singleton mapping for the test
-    sanitizer.mapping.update(mapping)
-    
-    # Mock bot response using tokens
-    mock_bot_response = "Hello <PERSON_0>, I have processed the request for account <ACCOUNT_NUMBER_2>. We will email <EMAIL_ADDRESS_3>."
+    # Mock bot response using the tokens this sanitizer actually issued
+    token_for = {v: k for k, v in mapping.items()}
+    mock_bot_response = (
+        f"Hello {token_for.get('John Doe', 'John Doe')}, I have processed the request for account "
+        f"{token_for.get('RET123456789')}. We will email {token_for.get('john.doe@example.com')}."
+    )
     print(f"\n[STEP 4] Mock Assistant Response (Masked Tokens):\n{mock_bot_response}")
     
     final_response = sanitizer.deanonymize_response(mock_bot_response)
@@ -2,6 +2,13 @@ import pytest
 from app import create_app, db
 from app.models.user import User
 from app.models.product import Product
+from app.services.llm_cache import llm_cache
+from app.services.llm_clients import provider_clients
+from app.services.provider_router import provider_router
+from app.services.rate_governor import rate_governor
+from app.services.llm_telemetry import llm_telemetry
+from app.services.context_budget import context_budgeter
+from app.utils.pii_sanitizer import profile_cache
 
 class TestConfig:
     TESTING = True
@@ -12,6 +19,19 @@ class TestConfig:
     OPENAI_API_KEY = "dummy-key"
     ANTHROPIC_API_KEY = "dummy-key"
 
+@pytest.fixture(autouse=True)
+def _reset_llm_state():
+    # Cached responses, profile scrubs, circuit state and pooled (possibly mocked) clients must not leak between tests
+    llm_cache.clear()
+    provider_clients.reset()
+    provider_router.reset()
+    rate_governor.reset()
+    llm_telemetry.reset()
+    context_budgeter.reset()
+    profile_cache.invalidate()
+    yield
+
+
 @pytest.fixture
 def app():
     app = create_app(TestConfig)
@@ -22,3 +22,18 @@ def test_health_check(client):
     response = client.get("/health")
     assert response.status_code == 200
     assert response.json == {"status": "healthy"}
+
+
+def test_metrics_endpoint(app, client):
+    app.config["METRICS_TOKEN"] = "scrape-token"
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape-token"})
+    assert response.status_code == 200
+    assert "active_sessions" in response.json["sse"]
+
+
+def test_metrics_endpoint_requires_token(app, client):
+    assert client.get("/metrics").status_code == 404  # disabled without METRICS_TOKEN
+
+    app.config["METRICS_TOKEN"] = "scrape-token"
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
@@ -0,0 +1,49 @@
+import asyncio
+import contextvars
+import threading
+import pytest
+from app import db
+from app.services.async_runtime import in_own_app_context, run_sync, to_thread
+
+
+def test_run_sync_bridges_into_shared_loop():
+    marker = contextvars.ContextVar("marker", default=None)
+    marker.set("caller")
+
+    async def read_marker():
+        await asyncio.sleep(0)
+        return marker.get(), threading.current_thread().name
+
+    value, first_thread = run_sync(read_marker(), timeout=5)
+    _, second_thread = run_sync(read_marker(), timeout=5)
+
+    assert value == "caller"
+    # Every call lands on the same long-lived loop thread
+    assert first_thread == second_thread == "async-runtime"
+
+
+def test_run_sync_times_out_and_cancels():
+    cancelled = threading.Event()
+
+    async def slow():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    with pytest.raises(TimeoutError):
+        run_sync(slow(), timeout=0.05)
+    assert cancelled.wait(2)
+
+
+def test_to_thread_gets_its_own_session(app):
+    async def worker_session():
+        return await to_thread(db.session)
+
+    assert run_sync(worker_session(), timeout=5) is not db.session()
+
+
+def test_in_own_app_context_is_a_no_op_outside_an_app_context():
+    fn = lambda: "ok"
+    assert in_own_app_context(fn) is fn
@@ -0,0 +1,56 @@
+from app.services.context_budget import SUMMARY_HEADER, ContextBudgeter
+from app.services.llm_service import prepare_openai_messages
+
+
+def _history(turns, bot_words=20):
+    history = []
+    for i in range(turns):
+        history.append({"type": "user", "content": f"Question {i} about my pension?"})
+        history.append({"type": "bot", "content": f"Answer {i}. " + "detail " * bot_words})
+    return history
+
+
+def test_short_history_is_passed_through_verbatim():
+    history = _history(2)
+    assert ContextBudgeter().fit(history, "System", "Next question") == history
+
+
+def test_older_turns_are_replaced_by_a_summary():
+    budgeter = ContextBudgeter()
+    history = _history(10)
+
+    fitted = budgeter.fit(history, "System", "Next question")
+
+    assert fitted[0]["type"] == "summary"
+    assert fitted[0]["content"].startswith(SUMMARY_HEADER)
+    assert fitted[1:] == history[-budgeter.keep_messages:]
+    assert "Question 0" in fitted[0]["content"]
+
+
+def test_prompt_stays_within_budget_as_conversation_grows():
+    budgeter = ContextBudgeter()
+    sizes = []
+    for turns in (10, 50, 200):
+        fitted = budgeter.fit(_history(turns, bot_words=400), "System", "Next", budget_tokens=1500)
+        sizes.append(sum(budgeter.count_tokens(msg["content"]) for msg in fitted))
+
+    assert all(size <= 1500 for size in sizes)
+    assert abs(sizes[2] - sizes[1]) < 20  # flat once the budget is reached
+
+
+def test_compressed_turns_are_cached_across_calls():
+    budgeter = ContextBudgeter()
+    history = _history(10)
+
+    budgeter.fit(history, "System", "Next")
+    misses = budgeter.stats()["summary_misses"]
+    budgeter.fit(history + _history(1), "System", "Next")
+
+    assert budgeter.stats()["summary_hits"] > 0
+    assert budgeter.stats()["summary_misses"] - misses <= 2
+
+
+def test_summary_is_sent_as_a_system_message():
+    fitted = [{"type": "summary", "content": "Summary"}, {"type": "bot", "content": "Hi"}]
+    roles = [m["role"] for m in prepare_openai_messages("System", fitted, "Next")]
+    assert roles == ["system", "system", "assistant", "user"]
@@ -0,0 +1,78 @@
+from unittest.mock import patch
+from app.services.intent_router import IntentRouter
+from app.services.orchestrator import dispatcher
+
+
+def test_router_accepts_obvious_knowledge_query():
+    router = IntentRouter()
+    decision = router.route("What is a 401k?")
+    assert decision.intent == "KNOWLEDGE_BASE"
+    assert decision.accepted
+
+
+def test_router_never_fast_paths_transactions():
+    router = IntentRouter()
+    decision = router.route("Sell everything")
+    assert decision.intent == "TRANSACTIONAL"
+    assert not decision.accepted
+
+
+def test_router_vetoes_fast_path_for_mixed_question_and_trade():
+    router = IntentRouter()
+    for message in (
+        "Explain what an index fund is and buy me one",
+        "Can I withdraw from my 401k early? Do it now for 20k",
+        "What is a 401k? Also sell my bonds",
+        "Explain what an index fund is and then move 5k into it",
+    ):
+        decision = router.route(message)
+        assert not decision.accepted, message
+    assert router.stats()["vetoed"] >= 2
+
+
+def test_router_veto_ignores_words_every_intent_uses():
+    router = IntentRouter()
+    for message in ("How does a Roth IRA work?", "Run a retirement projection for me",
+                    "What are my chances of running out of money?"):
+        assert router.route(message).accepted, message
+    assert router.stats()["vetoed"] == 0
+
+
+def test_router_skips_short_follow_ups_with_history():
+    router = IntentRouter()
+    history = [{"role": "assistant", "content": "Shall I run a projection?"}]
+    assert router.route("yes please", history) is None
+    assert router.stats()["skipped"] == 1
+
+
+def test_router_records_agreement_by_confidence_band():
+    router = IntentRouter()
+    decision = router.route("Will I have enough to retire?")
+    router.record_llm_outcome(decision, "RETIREMENT_SIMULATION")
+    router.record_llm_outcome(decision, "KNOWLEDGE_BASE")
+
+    stats = router.stats()
+    band = stats["agreement_by_confidence"][">=0.9"]
+    assert band == {"compared": 2, "agreement": 0.5}
+    assert stats["hit_rate"] == 1.0
+
+
+def test_dispatcher_fast_path_skips_llm_classifier(app):
+    with app.app_context():
+        with patch.object(dispatcher, '_classify_intent_llm') as mock_llm, \
+             patch('app.services.orchestrator.intent_router.should_shadow', return_value=False):
+            intent_data = dispatcher._classify_intent("What is a 401k?", {}, [])
+
+    assert intent_data["intent"] == "KNOWLEDGE_BASE"
+    assert intent_data["source"] == "router"
+    mock_llm.assert_not_called()
+
+
+def test_dispatcher_falls_back_to_llm_when_unsure(app):
+    llm_intent = {"intent": "PORTFOLIO_ANALYSIS", "sub_intent": "balance", "confidence": 0.9}
+    with app.app_context():
+        with patch.object(dispatcher, '_classify_intent_llm', return_value=llm_intent) as mock_llm:
+            intent_data = dispatcher._classify_intent("How is my money doing lately?", {}, [])
+
+    assert intent_data == llm_intent
+    mock_llm.assert_called_once()
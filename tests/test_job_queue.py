@@ -0,0 +1,151 @@
+import datetime
+import threading
+from unittest.mock import patch
+import pytest
+from app import db
+from app.models.agent_job import AgentJob
+from app.models.chat import Conversation
+from app.services.job_queue import DuplicateJob, job_queue
+
+
+@pytest.fixture
+def conversation(app, seed_data):
+    convo = Conversation(user_id=seed_data["user_id"])
+    db.session.add(convo)
+    db.session.commit()
+    return convo
+
+
+def _enqueue(conversation, **kwargs):
+    return job_queue.enqueue(conversation.id, conversation.user_id, {"message": "hi"}, **kwargs)
+
+
+def test_claim_leases_job_once(conversation):
+    job = _enqueue(conversation)
+
+    claimed = job_queue.claim("worker-a")
+    assert claimed.id == job.id
+    assert claimed.status == AgentJob.RUNNING
+    assert claimed.attempts == 1
+
+    # Leased jobs are invisible to other workers until the lease expires
+    assert job_queue.claim("worker-b") is None
+
+
+def test_leased_enqueue_is_reserved_for_enqueuer(conversation):
+    job = _enqueue(conversation, lease=True)
+
+    assert job_queue.claim("poller") is None
+    assert job_queue.claim("enqueuer", job_id=job.id).id == job.id
+
+
+def test_expired_lease_is_recovered(conversation):
+    job = _enqueue(conversation)
+    job_queue.claim("crashed-worker")
+
+    # Simulate the worker dying: the visibility timeout elapses
+    AgentJob.query.filter_by(id=job.id).update(
+        {"visible_at": datetime.datetime.utcnow() - datetime.timedelta(seconds=1)}
+    )
+    db.session.commit()
+
+    recovered = job_queue.claim("healthy-worker")
+    assert recovered.id == job.id
+    assert recovered.attempts == 2
+    assert recovered.locked_by == "healthy-worker"
+
+
+def test_fail_retries_then_dead_letters(conversation):
+    job = _enqueue(conversation)
+    job.max_attempts = 2
+    db.session.commit()
+
+    lease = job_queue.lease(job_queue.claim("w", job_id=job.id))
+    assert job_queue.fail(job.id, lease, "provider timeout") is True
+    assert job_queue.get(job.id).status == AgentJob.PENDING
+
+    AgentJob.query.filter_by(id=job.id).update({"visible_at": datetime.datetime.utcnow()})
+    db.session.commit()
+    lease = job_queue.lease(job_queue.claim("w"))
+    assert job_queue.fail(job.id, lease, "provider timeout") is False
+
+    failed = job_queue.get(job.id)
+    assert failed.status == AgentJob.FAILED
+    assert failed.last_error == "provider timeout"
+
+
+def test_expired_lease_cannot_settle_a_reclaimed_job(conversation):
+    job = _enqueue(conversation)
+    stale = job_queue.lease(job_queue.claim("slow-worker"))
+
+    AgentJob.query.filter_by(id=job.id).update(
+        {"visible_at": datetime.datetime.utcnow() - datetime.timedelta(seconds=1)}
+    )
+    db.session.commit()
+    current = job_queue.lease(job_queue.claim("healthy-worker"))
+
+    assert job_queue.complete(job.id, stale) is False
+    assert job_queue.fail(job.id, stale, "late error") is True  # left to the current holder
+    assert job_queue.get(job.id).status == AgentJob.RUNNING
+    assert job_queue.complete(job.id, current) is True
+
+
+def test_renew_extends_a_held_lease_only(conversation):
+    job = _enqueue(conversation)
+    claimed = job_queue.claim("worker-a")
+    lease = job_queue.lease(claimed)
+    AgentJob.query.filter_by(id=job.id).update(
+        {"visible_at": datetime.datetime.utcnow() + datetime.timedelta(seconds=1)}
+    )
+    db.session.commit()
+
+    assert job_queue.renew(job.id, lease)
+    db.session.expire_all()
+    remaining = db.session.get(AgentJob, job.id).visible_at - datetime.datetime.utcnow()
+    assert remaining > datetime.timedelta(seconds=job_queue.visibility_timeout_s - 5)
+
+    # A worker that lost the lease cannot keep the job hidden
+    assert not job_queue.renew(job.id, lease._replace(worker_id="worker-b"))
+
+
+def test_keep_alive_renews_until_the_block_exits():
+    renewed = threading.Event()
+    with patch.object(job_queue, "heartbeat_s", 0.01), \
+         patch.object(job_queue, "renew", side_effect=lambda *a: renewed.set() or True) as renew:
+        with job_queue.keep_alive(7, ("worker-a", 1)):
+            assert renewed.wait(2)
+        calls = renew.call_count
+
+    renew.assert_called_with(7, ("worker-a", 1))
+    assert renew.call_count == calls  # the heartbeat stopped with the block
+
+
+def test_fail_after_completion_does_not_requeue(conversation):
+    job = _enqueue(conversation)
+    lease = job_queue.lease(job_queue.claim("w", job_id=job.id))
+    job_queue.complete(job.id, lease)
+
+    job_queue.fail(job.id, lease, "broadcast failed")
+    assert job_queue.get(job.id).status == AgentJob.DONE
+
+
+def test_one_in_flight_job_per_idempotency_key(conversation):
+    first = _enqueue(conversation, idempotency_key="k1")
+
+    with pytest.raises(DuplicateJob) as exc_info:
+        _enqueue(conversation, idempotency_key="k1")
+    assert exc_info.value.job.id == first.id
+
+    # Once the first job settles the key may be used again
+    job_queue.complete(first.id, job_queue.lease(job_queue.claim("w", job_id=first.id)))
+    assert _enqueue(conversation, idempotency_key="k1").id != first.id
+
+
+def test_stats_counts_by_status(conversation):
+    _enqueue(conversation)
+    done = job_queue.claim("w", job_id=_enqueue(conversation).id)
+    job_queue.complete(done.id, job_queue.lease(done))
+
+    stats = job_queue.stats()
+    assert stats["pending"] == 1
+    assert stats["done"] == 1
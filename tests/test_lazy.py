@@ -0,0 +1,39 @@
+import sys
+from unittest.mock import MagicMock, patch
+from app.utils import lazy
+from app.utils.lazy import lazy_import, register_warmup, startup_report, warmup
+
+
+def test_lazy_import_defers_until_first_use():
+    sys.modules.pop("colorsys", None)
+    colorsys = lazy_import("colorsys")
+    assert "colorsys" not in sys.modules
+
+    assert colorsys.rgb_to_hsv(1.0, 0.0, 0.0) == (0.0, 1.0, 1.0)
+    assert "colorsys" in sys.modules
+    assert "import:colorsys" in startup_report()["load_ms"]
+
+
+def test_lazy_import_attribute_is_callable():
+    ordered_dict = lazy_import("collections", "OrderedDict")
+    assert list(ordered_dict(a=1)) == ["a"]
+
+
+def test_missing_optional_sdk_is_falsy():
+    assert not lazy_import("not_an_installed_sdk")
+
+
+def test_warmup_runs_registered_loaders_and_reports():
+    loader = MagicMock()
+    broken = MagicMock(side_effect=RuntimeError("no model"))
+    with patch.dict(lazy._warmers, clear=True):
+        register_warmup("test_component", loader)
+        register_warmup("test_broken", broken)
+        report = warmup()
+
+    loader.assert_called_once()
+    assert report["warmed_up"] is True
+    assert "test_component" in report["load_ms"]
+    # A failing loader is skipped and left to load lazily
+    assert "test_broken" not in report["load_ms"]
+    assert report["peak_rss_mb"] > 0
@@ -0,0 +1,77 @@
+from unittest.mock import patch, MagicMock
+from app.services.llm_cache import LLMResponseCache, ProviderErrorText, llm_cache
+from app.services.llm_service import call_openai_api
+
+
+def _mock_openai(mock_client_cls, content):
+    client = MagicMock()
+    client.api_key = "dummy-key"
+    client.chat.completions.create.return_value.choices = [MagicMock(message=MagicMock(content=content))]
+    mock_client_cls.return_value = client
+    return client
+
+
+@patch("openai.OpenAI")
+def test_zero_temperature_calls_are_served_from_cache(mock_openai):
+    client = _mock_openai(mock_openai, '{"intent": "GENERAL"}')
+    messages = [{"role": "user", "content": "Hello"}]
+
+    assert call_openai_api(messages, "gpt-4o", 0.0) == '{"intent": "GENERAL"}'
+    assert call_openai_api(messages, "gpt-4o", 0.0) == '{"intent": "GENERAL"}'
+
+    assert client.chat.completions.create.call_count == 1
+    assert llm_cache.stats()["memory_hits"] >= 1
+
+
+@patch("openai.OpenAI")
+def test_sampling_calls_bypass_cache(mock_openai):
+    client = _mock_openai(mock_openai, "Hi!")
+    messages = [{"role": "user", "content": "Hello"}]
+
+    call_openai_api(messages, "gpt-4o", 0.7)
+    call_openai_api(messages, "gpt-4o", 0.7)
+
+    assert client.chat.completions.create.call_count == 2
+
+
+def test_error_responses_are_not_cached():
+    cache = LLMResponseCache()
+    cache.put("k", ProviderErrorText("I'm sorry, I encountered an error"))
+    assert cache.get("k") is None
+
+
+def test_lru_bound_and_ttl():
+    cache = LLMResponseCache()
+    cache.max_entries = 2
+    cache.put("a", "1", now=0)
+    cache.put("b", "2", now=0)
+    cache.get("a", now=1)          # refresh "a"
+    cache.put("c", "3", now=1)     # evicts "b"
+
+    assert cache.get("b", now=1) is None
+    assert cache.get("a", now=1) == "1"
+    assert cache.get("a", now=cache.ttl_s + 1) is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_disk_tier_is_shared_between_instances(tmp_path):
+    with patch.dict("os.environ", {"LLM_CACHE_DIR": str(tmp_path)}):
+        writer, reader = LLMResponseCache(), LLMResponseCache()
+
+    key = LLMResponseCache.make_key("openai", messages=[{"role": "user", "content": "Hi"}], temperature=0.0)
+    writer.put(key, "cached reply")
+
+    assert reader.get(key) == "cached reply"
+    assert reader.stats()["disk_hits"] == 1
+
+
+def test_memory_only_calls_never_touch_the_disk_tier(tmp_path):
+    with patch.dict("os.environ", {"LLM_CACHE_DIR": str(tmp_path)}):
+        cache = LLMResponseCache()
+    key = LLMResponseCache.make_key("openai", messages=[{"role": "system", "content": "raw transcript"}])
+
+    with cache.memory_only():
+        cache.put(key, "extracted facts")
+        assert cache.get(key) == "extracted facts"
+
+    assert not any(tmp_path.iterdir())
@@ -0,0 +1,50 @@
+import threading
+from unittest.mock import patch, MagicMock
+from app.services.llm_clients import ProviderClientRegistry, provider_clients
+from app.services.llm_service import call_openai_api
+
+
+def test_get_creates_each_client_once_across_threads():
+    registry = ProviderClientRegistry()
+    factory = MagicMock(side_effect=lambda: object())
+    results = []
+
+    threads = [threading.Thread(target=lambda: results.append(registry.get(("p", "e"), factory)))
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert factory.call_count == 1
+    assert len({id(r) for r in results}) == 1
+
+
+@patch("openai.OpenAI")
+def test_openai_client_is_reused_between_calls(mock_openai):
+    mock_openai.return_value.chat.completions.create.return_value.choices[0].message.content = "ok"
+
+    call_openai_api([{"role": "user", "content": "a"}], "gpt-4o", 0.7)
+    call_openai_api([{"role": "user", "content": "b"}], "gpt-4o", 0.7)
+
+    assert mock_openai.call_count == 1
+    assert provider_clients.stats()["clients"] == 2  # OpenAI client + shared httpx pool
+
+
+def test_requests_session_is_pooled_per_endpoint():
+    registry = ProviderClientRegistry()
+    a = registry.requests_session("http://ollama:11434")
+    assert registry.requests_session("http://ollama:11434") is a
+    assert registry.requests_session("http://other:11434") is not a
+    registry.reset()
+    assert registry.stats()["clients"] == 0
+
+
+def test_get_current_replaces_the_client_when_its_version_changes():
+    registry = ProviderClientRegistry()
+    first = registry.get_current(("vertex_ai", "m"), "cache-1", object)
+    assert registry.get_current(("vertex_ai", "m"), "cache-1", object) is first
+
+    second = registry.get_current(("vertex_ai", "m"), "cache-2", object)
+    assert second is not first
+    assert registry.stats()["clients"] == 1
@@ -18,6 +18,18 @@ def test_build_system_prompt():
     assert "Fact 1" in prompt
     assert "Test" in prompt
 
+def test_system_prompt_prefix_is_identical_across_users():
+    first = build_system_prompt(json.dumps({"personal_details": {"first_name": "Ann"}, "memories": ["Fact 1"]}))
+    second = build_system_prompt(json.dumps({"behavioral_sentiment": {"bias": "PANIC"}}))
+
+    assert first.prefix == second.prefix
+    assert "Ann" in first.context and "PANIC" not in first.context
+    assert "CALMING" in second.context and "CALMING" not in second.prefix
+
+    messages = prepare_openai_messages(first, [], "hi")
+    assert [m["role"] for m in messages] == ["system", "system", "user"]
+    assert messages[0]["content"] == first.prefix
+
 def test_prepare_openai_messages():
     system_prompt = "System Rule"
     history = [
@@ -33,7 +45,7 @@ def test_prepare_openai_messages():
     assert messages[2]["role"] == "assistant"
     assert messages[3]["content"] == "how are you?"
 
-@patch("requests.post")
+@patch("requests.Session.post")
 def test_call_ollama_api_success(mock_post):
     # Mock successful response
     mock_response = MagicMock()
@@ -44,7 +56,7 @@ def test_call_ollama_api_success(mock_post):
     res = call_ollama_api([{"role": "user", "content": "hi"}], "llama3", 0.7)
     assert res == "Ollama response"
 
-@patch("requests.post")
+@patch("requests.Session.post")
 def test_call_ollama_api_failure(mock_post):
     # Mock failure
     mock_post.side_effect = Exception("Connection error")
@@ -87,9 +99,9 @@ def test_call_openai_api_success(mock_openai):
     res = call_openai_api([], "gpt-4", 0.7)
     assert res == "OpenAI response"
 
-@patch("openai.ChatCompletion.create")
-def test_call_azure_openai_api_success(mock_create):
-    mock_create.return_value = {"choices": [{"message": {"content": "Azure response"}}]}
+@patch("openai.AzureOpenAI")
+def test_call_azure_openai_api_success(mock_azure):
+    mock_azure.return_value.chat.completions.create.return_value.choices[0].message.content = "Azure response"
     
     os.environ["AZURE_OPENAI_API_KEY"] = "test"
     os.environ["AZURE_OPENAI_ENDPOINT"] = "test"
@@ -150,11 +162,37 @@ def test_call_azure_openai_api_no_config():
     res = call_azure_openai_api_with_key([], "gpt-4")
     assert "not configured correctly" in res
 
-@patch("openai.ChatCompletion.create")
-def test_call_azure_openai_api_exception(mock_create):
-    mock_create.side_effect = Exception("Azure Error")
+@patch("openai.AzureOpenAI")
+def test_call_azure_openai_api_exception(mock_azure):
+    mock_azure.return_value.chat.completions.create.side_effect = Exception("Azure Error")
     os.environ["AZURE_OPENAI_API_KEY"] = "test"
     os.environ["AZURE_OPENAI_ENDPOINT"] = "test"
     from app.services.llm_service import call_azure_openai_api_with_key
     res = call_azure_openai_api_with_key([], "gpt-4")
     assert "encountered an error" in res
+
+def _stream_chunks(*deltas):
+    return [MagicMock(choices=[MagicMock(delta=MagicMock(content=d))]) for d in deltas]
+
+@patch("openai.OpenAI")
+def test_general_llm_streams_tokens(mock_openai):
+    mock_openai.return_value.chat.completions.create.return_value = _stream_chunks("Hi", " there", None)
+    tokens = []
+    with patch.dict(os.environ, {"LLM_PROVIDER": "openai"}), \
+         patch("app.services.llm_service.dispatcher.dispatch", return_value=None):
+        res = generate_ai_response("hi", on_token=tokens.append)
+
+    assert tokens == ["Hi", " there"]
+    assert res == "Hi there"
+    assert mock_openai.return_value.chat.completions.create.call_args.kwargs["stream"] is True
+
+def test_stream_falls_back_to_blocking_call_before_first_token():
+    from app.services.llm_service import _stream_llm_provider
+    tokens = []
+    with patch("app.services.llm_service.stream_ollama_api", side_effect=ConnectionError("refused")), \
+         patch("app.services.llm_service.call_ollama_api", return_value="Blocking answer") as mock_call:
+        res = _stream_llm_provider("ollama", "llama3", 0.7, "sys", [], "hi", tokens.append)
+
+    assert res == "Blocking answer"
+    assert tokens == []
+    mock_call.assert_called_once()
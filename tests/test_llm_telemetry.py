@@ -0,0 +1,124 @@
+import asyncio
+import os
+import time
+from unittest.mock import MagicMock, patch
+from app import db
+from app.services.llm_cache import ProviderErrorText
+from app.services.llm_service import call_openai_api
+from app.services.llm_telemetry import instrumented, llm_telemetry
+from app.services.provider_router import ProviderRouter
+
+
+@patch("openai.OpenAI")
+def test_openai_usage_is_recorded_per_agent_and_model(mock_openai):
+    client = MagicMock()
+    client.api_key = "dummy-key"
+    response = client.chat.completions.create.return_value
+    response.choices = [MagicMock(message=MagicMock(content="Hello!"))]
+    response.usage.prompt_tokens = 1000
+    response.usage.completion_tokens = 200
+    mock_openai.return_value = client
+
+    with llm_telemetry.tag(agent="Dispatcher"):
+        call_openai_api([{"role": "user", "content": "Hi"}], "gpt-4o", 0.7)
+
+    stats = llm_telemetry.stats()
+    model = stats["by_model"]["openai:gpt-4o"]
+    assert model["prompt_tokens"] == 1000 and model["completion_tokens"] == 200
+    assert model["cost_usd"] == 0.0045  # 1000 * 2.50 + 200 * 10.00 per million
+    assert stats["by_agent"]["Dispatcher"]["calls"] == 1
+
+
+def test_missing_usage_is_estimated_and_errors_counted():
+    @instrumented("ollama")
+    def adapter(messages, model, temperature):
+        return ProviderErrorText("I'm sorry, I encountered an error with the local Ollama service")
+
+    adapter([{"role": "user", "content": "x" * 400}], "llama3", 0.0)
+
+    model = llm_telemetry.stats()["by_model"]["ollama:llama3"]
+    assert model["errors"] == 1
+    assert model["prompt_tokens"] > 0 and model["completion_tokens"] == 0
+
+
+def test_tagged_calls_are_written_to_the_historian():
+    @instrumented("vertex_ai")
+    async def adapter(prompt, model_name="gemini-1.5-pro", temperature=0.7, attachments=None):
+        return "ok"
+
+    async def run():
+        with llm_telemetry.tag(agent="Vision", session_id="conv-1"):
+            return await adapter("Extract the statement", model_name="gemini-1.5-flash")
+
+    with patch("app.services.audit_service.historian.log_step") as log_step:
+        assert asyncio.run(run()) == "ok"
+
+    kwargs = log_step.call_args.kwargs
+    assert kwargs["agent_name"] == "Vision" and kwargs["step_type"] == "LLM_CALL"
+    assert kwargs["step_metadata"]["model_name"] == "gemini-1.5-flash"
+    assert kwargs["step_metadata"]["tokens_estimated"] is True
+
+
+def _record_audit_sessions():
+    # Holds the Session objects themselves so their ids can't be recycled mid-test
+    sessions = []
+    return sessions, lambda **kwargs: sessions.append(db.session())
+
+
+def test_concurrent_async_audits_do_not_share_the_callers_session(app):
+    @instrumented("openai")
+    async def adapter(messages, model, temperature):
+        return "ok"
+
+    async def run():
+        with llm_telemetry.tag(agent="Debater", session_id="conv-1"):
+            return await asyncio.gather(*(adapter([], "gpt-4o", 0.7) for _ in range(3)))
+
+    sessions, record = _record_audit_sessions()
+    with patch("app.services.audit_service.historian.log_step", side_effect=record):
+        assert asyncio.run(run()) == ["ok"] * 3
+
+    assert len(sessions) == 3
+    assert all(session is not db.session() for session in sessions)
+    assert len({id(session) for session in sessions}) == 3
+
+
+def test_hedge_threads_audit_on_their_own_session(app):
+    with patch.dict(os.environ, {"LLM_FALLBACK_PROVIDERS": "ollama:llama3", "LLM_HEDGE_DEFAULT_DELAY_MS": "20"}):
+        router = ProviderRouter()
+
+    @instrumented("openai")
+    def adapter(messages, model, temperature):
+        if model == "gpt-4o":
+            time.sleep(0.3)
+        return model
+
+    sessions, record = _record_audit_sessions()
+    with patch("app.services.audit_service.historian.log_step", side_effect=record), \
+         llm_telemetry.tag(agent="Orchestrator", session_id="conv-1"):
+        result = router.call("openai", "gpt-4o", lambda p, m: adapter([], m, 0.0), hedge=True)
+        router._hedge_executor.shutdown(wait=True)  # let the losing primary finish and audit
+
+    assert result == "llama3"
+    assert len(sessions) == 2
+    assert all(session is not db.session() for session in sessions)
+
+
+def test_untagged_calls_are_not_audited():
+    @instrumented("openai")
+    def adapter(messages, model, temperature):
+        return "ok"
+
+    with patch("app.services.audit_service.historian.log_step") as log_step:
+        adapter([], "gpt-4o", 0.0)
+
+    log_step.assert_not_called()
+    assert llm_telemetry.stats()["by_agent"]["Unattributed"]["calls"] == 1
+
+
+def test_cached_prompt_tokens_are_billed_at_the_cached_rate():
+    # 1000 prompt tokens, 800 from the provider's prompt cache, no completion
+    full = llm_telemetry.estimate_cost("gpt-4o", 1000, 0)
+    cached = llm_telemetry.estimate_cost("gpt-4o", 1000, 0, cached_tokens=800)
+    assert full == 0.0025
+    assert cached == (200 * 2.50 + 800 * 1.25) / 1_000_000
@@ -100,3 +100,28 @@ def test_summarize_into_facts_openai_provider(mock_openai, mock_create_app, app,
         assert mock_openai.called
         memories = UserMemory.query.filter_by(user_id=user_id).all()
         assert len(memories) == 1
+
+@patch("app.services.memory_service.create_app")
+@patch("app.services.memory_service.call_azure_openai_api_with_key")
+def test_fact_extraction_is_kept_off_the_disk_cache(mock_azure, mock_create_app, app, seed_data, tmp_path):
+    from app.services.llm_cache import llm_cache
+    mock_create_app.return_value = app
+
+    def _cached_call(messages, model, temperature):
+        # What cached_completion does for this deterministic call
+        llm_cache.put(llm_cache.make_key("azure_openai", messages=messages), json.dumps(["Fact 1"]))
+        return json.dumps(["Fact 1"])
+
+    mock_azure.side_effect = _cached_call
+    with app.app_context():
+        convo = Conversation(user_id=seed_data["user_id"])
+        db.session.add(convo)
+        db.session.flush()
+        db.session.add(Message(conversation_id=convo.id, type="user", content="I'm Sarah, NI QQ 12 34 56 C"))
+        db.session.commit()
+
+        with patch.object(llm_cache, "disk_dir", str(tmp_path)):
+            summarize_into_facts(seed_data["user_id"], convo.id)
+
+    assert mock_azure.called
+    assert not any(tmp_path.iterdir())
@@ -0,0 +1,31 @@
+from app.services.metrics_service import Histogram, RateMeter, MetricsRegistry
+
+
+def test_histogram_buckets_and_summary():
+    hist = Histogram((1, 10, 100))
+    for value in (0.5, 1, 5, 50, 500):
+        hist.observe(value)
+
+    snap = hist.snapshot()
+    assert snap["count"] == 5
+    assert snap["max"] == 500
+    assert snap["buckets"] == {"<=1": 2, "<=10": 1, "<=100": 1, "+Inf": 1}
+
+
+def test_rate_meter_rolls_off_old_events():
+    meter = RateMeter(window_s=10)
+    meter.mark(20, now=100)
+    assert meter.rate(now=105) == 2.0
+    # Outside the window the slot no longer counts
+    assert meter.rate(now=111) == 0.0
+    assert meter.total == 20
+
+
+def test_registry_isolates_failing_collectors():
+    registry = MetricsRegistry()
+    registry.register_collector("ok", lambda: {"value": 1})
+    registry.register_collector("broken", lambda: 1 / 0)
+
+    snap = registry.snapshot()
+    assert snap["ok"] == {"value": 1}
+    assert "error" in snap["broken"]
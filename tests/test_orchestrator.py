@@ -82,3 +82,68 @@ def test_orchestrator_fallback_to_general(app):
             audit = AgentAudit.query.filter_by(session_id="test-session-789", step_type="ACTION").first()
             assert audit.content == "Intent resolved: GENERAL"
 
+
+def test_orchestrator_pre_routing_runs_llm_stages_concurrently(app):
+    """Guardrails and classification overlap instead of running back-to-back."""
+    import threading
+
+    # Each stub only returns once both have been entered; run back-to-back,
+    # the first would time out and break the barrier
+    both_entered = threading.Barrier(2, timeout=5)
+
+    def safety(message):
+        both_entered.wait()
+        return None
+
+    def classify(message, profile, history):
+        both_entered.wait()
+        return {"intent": "GENERAL", "sub_intent": "greeting", "confidence": 0.9}
+
+    with app.app_context():
+        with patch.object(dispatcher, 'concurrent_pre_routing', True), \
+             patch('app.services.orchestrator.guardrails_service.check_query_sync', side_effect=safety), \
+             patch.object(dispatcher, '_classify_intent', side_effect=classify):
+            response = dispatcher.dispatch("Hello there!", {}, [], "test-session-concurrent")
+
+    assert response is None
+    assert not both_entered.broken
+
+def test_orchestrator_guardrails_block_discards_classification(app):
+    """A Shield refusal wins even when classification would have routed elsewhere."""
+    with app.app_context():
+        mock_intent = {"intent": "KNOWLEDGE_BASE", "sub_intent": "policy", "confidence": 0.9}
+        with patch.object(dispatcher, 'concurrent_pre_routing', True), \
+             patch('app.services.orchestrator.guardrails_service.check_query_sync', return_value="Refused."), \
+             patch.object(dispatcher, '_classify_intent', return_value=mock_intent), \
+             patch.object(dispatcher, '_route') as mock_route:
+            response = dispatcher.dispatch("Tell me about chest pain", {}, [], "test-session-blocked")
+
+    assert response == "Refused."
+    mock_route.assert_not_called()
+
+def test_orchestrator_fused_mode_blocks_with_single_call(app):
+    """Fused mode: one LLM call yields the Shield's refusal and skips routing."""
+    raw = '{"verdict": "BLOCK", "category": "medical advice", "intent": "GENERAL", "sub_intent": "health", "confidence": 0.8}'
+    with app.app_context():
+        with patch.object(dispatcher, 'fused_safety_classification', True), \
+             patch.object(dispatcher, '_call_classification_llm', return_value=raw) as mock_llm, \
+             patch('app.services.orchestrator.guardrails_service.check_query_sync') as mock_safety, \
+             patch.object(dispatcher, '_route') as mock_route:
+            response = dispatcher.dispatch("Tell me about chest pain", {}, [], "test-session-fused-block")
+
+    assert response
+    assert mock_llm.call_count == 1
+    mock_safety.assert_not_called()
+    mock_route.assert_not_called()
+
+def test_orchestrator_fused_mode_routes_on_pass(app):
+    """Fused mode: a PASS verdict routes on the intent from the same response."""
+    raw = '{"verdict": "PASS", "category": "", "intent": "KNOWLEDGE_BASE", "sub_intent": "401k rules", "confidence": 0.9}'
+    with app.app_context():
+        with patch.object(dispatcher, 'fused_safety_classification', True), \
+             patch.object(dispatcher, '_call_classification_llm', return_value=raw) as mock_llm, \
+             patch.object(dispatcher, '_handle_knowledge_query', return_value="Knowledge Results"):
+            response = dispatcher.dispatch("What is a 401k?", {}, [], "test-session-fused-pass")
+
+    assert response == "Knowledge Results"
+    assert mock_llm.call_count == 1
@@ -1,3 +1,4 @@
+import json
 import pytest
 from app.utils.pii_sanitizer import PIISanitizer
 
@@ -48,3 +49,167 @@ def test_deanonymize_descending_length(sanitizer):
     restored = sanitizer.deanonymize_response(response)
     
     assert restored == "Hello Bob and Alice."
+
+def test_stream_deanonymizer_placeholder_split_across_chunks(sanitizer):
+    sanitizer.mapping["<PERSON_0>"] = "Alice"
+    sanitizer.mapping["<UK_NI_0>"] = "QQ 12 34 56 C"
+    streamer = sanitizer.stream_deanonymizer()
+
+    chunks = ["Hi <PER", "SON", "_0>, your NI is <U", "K_NI_0", ">. 3 < 5", " ok"]
+    emitted = [streamer.feed(c) for c in chunks] + [streamer.flush()]
+
+    assert "".join(emitted) == "Hi Alice, your NI is QQ 12 34 56 C. 3 < 5 ok"
+    # Nothing that could be a placeholder prefix leaks out early
+    assert emitted[0] == "Hi "
+    assert emitted[1] == ""
+    assert emitted[2] == "Alice, your NI is "
+
+def test_stream_deanonymizer_holds_longer_placeholder(sanitizer):
+    sanitizer.mapping["<PERSON_1>"] = "Alice"
+    sanitizer.mapping["<PERSON_10>"] = "Bob"
+    streamer = sanitizer.stream_deanonymizer()
+
+    out = streamer.feed("Hello <PERSON_1")
+    out += streamer.feed("0> and <PERSON_1>")
+    out += streamer.flush()
+
+    assert out == "Hello Bob and Alice"
+
+def test_stream_deanonymizer_passthrough_without_mapping(sanitizer):
+    streamer = sanitizer.stream_deanonymizer()
+    assert streamer.feed("a <b") == "a <b"
+    assert streamer.flush() == ""
+
+def test_deanonymize_ignores_unknown_placeholders(sanitizer):
+    sanitizer.mapping["<IBAN_CODE_0>"] = "GB82WEST12345698765432"
+
+    response = "Pay <IBAN_CODE_0> not <IBAN_CODE_1> or <html>."
+    restored = sanitizer.deanonymize_response(response)
+
+    assert restored == "Pay GB82WEST12345698765432 not <IBAN_CODE_1> or <html>."
+
+def test_request_contexts_do_not_share_ghost_maps():
+    from concurrent.futures import ThreadPoolExecutor
+
+    def scrub_and_restore(ni_number):
+        context = PIISanitizer()
+        sanitized, _ = context.sanitize_text(f"My NI number is {ni_number}.")
+        return sanitized, context.deanonymize_response(sanitized)
+
+    numbers = ["QQ 12 34 56 C", "AB 98 76 54 D"] * 4
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(scrub_and_restore, numbers))
+
+    for ni_number, (sanitized, restored) in zip(numbers, results):
+        # Every context numbers from zero and restores only its own value
+        assert sanitized == "My NI number is <UK_NI_0>."
+        assert restored == f"My NI number is {ni_number}."
+
+def test_regex_tier_skips_spacy_for_plain_chat(sanitizer):
+    from unittest.mock import patch
+    from app.utils import pii_sanitizer
+
+    with patch.object(pii_sanitizer._engines.analyzer, "analyze") as mock_ner:
+        assert sanitizer.sanitize_text("thanks!") == ("thanks!", {})
+        sanitized, mapping = sanitizer.sanitize_text("Email me at bob@example.com, NI QQ 12 34 56 C")
+
+    mock_ner.assert_not_called()
+    assert sanitized == "Email me at <EMAIL_ADDRESS_0>, NI <UK_NI_0>"
+    assert set(mapping.values()) == {"bob@example.com", "QQ 12 34 56 C"}
+
+def test_ner_tier_runs_for_name_cues_and_strict_mode():
+    from unittest.mock import patch
+    from app.utils import pii_sanitizer
+
+    with patch.object(pii_sanitizer._engines.analyzer, "analyze", return_value=[]) as mock_ner:
+        PIISanitizer().sanitize_text("Can I retire at 60 with Sarah?")
+        PIISanitizer().sanitize_text("my name is sarah")
+        PIISanitizer(strict=True).sanitize_text("thanks!")
+        # No NER-only entity requested — the regex tier is enough
+        PIISanitizer().sanitize_text("Sarah's email is s@example.com", entities=["EMAIL_ADDRESS"])
+
+    assert mock_ner.call_count == 3
+
+def test_ner_tier_runs_for_lowercase_names():
+    from unittest.mock import patch
+    from app.utils import pii_sanitizer
+
+    texts = [
+        "john smith wants to retire at 60",
+        "please send it to mary jones",
+        "how much can bob put in his 401k",
+    ]
+    with patch.object(pii_sanitizer._engines.analyzer, "analyze", return_value=[]) as mock_ner:
+        for text in texts:
+            PIISanitizer().sanitize_text(text)
+        # Only common non-name words (and acronyms) stay on the regex tier
+        PIISanitizer().sanitize_text("How much should I save for my IRA pension?")
+
+    assert [c.kwargs["text"] for c in mock_ner.call_args_list] == texts
+
+PROFILE = {
+    "id": "user-1",
+    "personal_details": {
+        "contact_details": {"email": "sarah@connor.com"},
+        "first_name": "Sarah",
+        "last_name": "Connor",
+    },
+    "financial_profile": {"totalAssets": 100000.0, "currency": "GBP"},
+    "memories": ["NI number is QQ 12 34 56 C"],
+}
+
+def test_field_aware_profile_masks_known_fields_without_scanning():
+    from unittest.mock import patch
+    from app.utils import pii_sanitizer
+
+    context = PIISanitizer(field_aware=True)
+    with patch.object(pii_sanitizer._engines.analyzer, "analyze", return_value=[]) as mock_ner:
+        sanitized = context.sanitize_profile_to_string(PROFILE)
+
+    mock_ner.assert_not_called()
+    for value in ("Sarah", "Connor", "sarah@connor.com", "QQ 12 34 56 C"):
+        assert value not in sanitized
+    assert '"totalAssets": 100000.0' in sanitized
+    assert '"id": "user-1"' in sanitized
+    assert context.deanonymize_response(sanitized) == json.dumps(PROFILE)
+
+def test_profile_scrub_is_cached_until_profile_changes():
+    from unittest.mock import patch
+
+    first = PIISanitizer()
+    expected = first.sanitize_profile_to_string(PROFILE)
+
+    with patch.object(PIISanitizer, "_sanitize_profile_value") as mock_scan:
+        second = PIISanitizer()
+        assert second.sanitize_profile_to_string(PROFILE) == expected
+    mock_scan.assert_not_called()
+    # The cached Ghost Map and counters are adopted, so new placeholders don't collide
+    assert second.mapping == first.mapping
+    assert second.counters == first.counters
+
+    changed = {**PROFILE, "memories": ["Moved house"]}
+    assert PIISanitizer().sanitize_profile_to_string(changed) != expected
+
+def test_sanitize_batch_returns_per_text_mappings_in_order(sanitizer):
+    from unittest.mock import patch
+    from presidio_analyzer import RecognizerResult
+    from app.utils import pii_sanitizer
+
+    nlp = pii_sanitizer._engines.nlp_engine.nlp["en"]
+    texts = ["thanks!", "NI QQ 12 34 56 C", "Sarah sent AB 98 76 54 D", "NI QQ 12 34 56 C"]
+    # NER results are stubbed so the test doesn't depend on which spaCy model is installed
+    ner_results = [RecognizerResult("PERSON", 0, 5, 0.85), RecognizerResult("UK_NI", 11, 24, 0.9)]
+    with patch.object(nlp, "pipe", wraps=nlp.pipe) as mock_pipe, \
+         patch.object(pii_sanitizer._engines.analyzer, "analyze", return_value=ner_results) as mock_ner:
+        results = sanitizer.sanitize_batch(texts, batch_size=8)
+
+    # Only the text with a name cue needs spaCy, in a single pipe call
+    mock_pipe.assert_called_once()
+    assert mock_pipe.call_args.kwargs["batch_size"] == 8
+    assert mock_ner.call_args.kwargs["text"] == "Sarah sent AB 98 76 54 D"
+    assert [text for text, _ in results] == [
+        "thanks!", "NI <UK_NI_0>", "<PERSON_0> sent <UK_NI_1>", "NI <UK_NI_2>",
+    ]
+    assert results[0][1] == {}
+    assert results[2][1] == {"<PERSON_0>": "Sarah", "<UK_NI_1>": "AB 98 76 54 D"}
+    assert len(sanitizer.mapping) == 4
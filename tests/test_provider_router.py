@@ -0,0 +1,122 @@
+import os
+import time
+from unittest.mock import patch
+from app.services.llm_cache import GovernorBusyText, ProviderErrorText
+from app.services.provider_router import ProviderHealth, ProviderRouter
+
+
+def _router(**env):
+    settings = {"LLM_FALLBACK_PROVIDERS": "ollama:llama3", "LLM_CIRCUIT_FAILURE_THRESHOLD": "2",
+                "LLM_CIRCUIT_COOLDOWN_S": "30", **env}
+    with patch.dict(os.environ, settings):
+        return ProviderRouter()
+
+
+def test_fails_over_to_next_provider_on_error():
+    router = _router()
+    calls = []
+
+    def invoke(provider, model):
+        calls.append((provider, model))
+        if provider == "openai":
+            return ProviderErrorText("I'm sorry, OpenAI API key is not configured.")
+        return "fallback answer"
+
+    assert router.call("openai", "gpt-4o", invoke) == "fallback answer"
+    assert calls == [("openai", "gpt-4o"), ("ollama", "llama3")]
+    assert router.stats()["failovers"] == 1
+
+
+def test_returns_last_failure_when_every_provider_fails():
+    router = _router()
+
+    def invoke(provider, model):
+        raise RuntimeError(f"{provider} down")
+
+    result = router.call("openai", "gpt-4o", invoke)
+    assert isinstance(result, ProviderErrorText)
+    assert "ollama down" in result
+
+
+def test_open_circuit_skips_provider_until_cooldown():
+    router = _router()
+    calls = []
+
+    def invoke(provider, model):
+        calls.append(provider)
+        return None if provider == "openai" else "ok"
+
+    router.call("openai", "gpt-4o", invoke)
+    router.call("openai", "gpt-4o", invoke)
+    assert router.health("openai", "gpt-4o").state == ProviderHealth.OPEN
+
+    calls.clear()
+    assert router.call("openai", "gpt-4o", invoke) == "ok"
+    assert calls == ["ollama"]
+
+
+def test_half_open_allows_a_single_probe():
+    health = ProviderHealth(window=10, failure_threshold=1, error_rate_threshold=0.5, cooldown_s=30)
+    health.record(False, 10.0, now=100.0)
+
+    assert health.allow(now=110.0) is False
+    assert health.allow(now=131.0) is True   # the probe
+    assert health.allow(now=131.5) is False  # nobody else while it is in flight
+
+    health.record(True, 10.0, now=132.0)
+    assert health.state == ProviderHealth.CLOSED
+    assert health.allow(now=132.5) is True
+
+
+def test_short_circuits_when_every_circuit_is_open():
+    router = _router(LLM_FALLBACK_PROVIDERS="")
+    router.call("openai", "gpt-4o", lambda p, m: None)
+    router.call("openai", "gpt-4o", lambda p, m: None)
+
+    result = router.call("openai", "gpt-4o", lambda p, m: "never called")
+    assert isinstance(result, ProviderErrorText)
+    assert router.stats()["short_circuited"] == 1
+
+
+def test_hedged_call_returns_the_faster_backup():
+    router = _router(LLM_HEDGE_DEFAULT_DELAY_MS="20")
+
+    def invoke(provider, model):
+        if provider == "openai":
+            time.sleep(0.3)
+            return "slow primary"
+        return "fast backup"
+
+    assert router.call("openai", "gpt-4o", invoke, hedge=True) == "fast backup"
+    stats = router.stats()
+    assert stats["hedges"] == 1 and stats["hedge_wins"] == 1
+
+
+def test_fallback_without_a_model_uses_its_providers_default():
+    router = _router(LLM_FALLBACK_PROVIDERS="vertex_ai,ollama")
+    assert router._chain("azure_openai", "gpt-4o") == [
+        ("azure_openai", "gpt-4o"), ("vertex_ai", "gemini-1.5-pro"), ("ollama", "llama3"),
+    ]
+
+    with patch.dict(os.environ, {"OLLAMA_MODEL_NAME": "mistral"}):
+        router = _router(LLM_FALLBACK_PROVIDERS="ollama,custom")
+    # A provider with no known default is dropped rather than sent the primary's model
+    assert router.fallbacks == [("ollama", "mistral")]
+
+
+def test_governor_busy_is_returned_without_failover_or_health_damage():
+    router = _router()
+    calls = []
+
+    def invoke(provider, model):
+        calls.append(provider)
+        return GovernorBusyText("I'm sorry, our AI service is busy right now.")
+
+    for _ in range(3):
+        result = router.call("openai", "gpt-4o", invoke)
+
+    assert isinstance(result, GovernorBusyText)
+    assert calls == ["openai"] * 3
+    assert router.stats()["failovers"] == 0
+    assert router.is_available("openai", "gpt-4o")
+    assert router.health("openai", "gpt-4o").snapshot()["samples"] == 0
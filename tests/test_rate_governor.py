@@ -0,0 +1,84 @@
+import asyncio
+import os
+import threading
+import time
+from unittest.mock import patch
+from app.services.llm_cache import GovernorBusyText, ProviderErrorText
+from app.services.rate_governor import GovernorTimeout, RateGovernor, TokenBucket, governed
+
+
+def _governor(**env):
+    with patch.dict(os.environ, env):
+        return RateGovernor()
+
+
+def test_token_bucket_refills_per_minute():
+    bucket = TokenBucket(60, now=0.0)
+    bucket.take(60)
+    assert bucket.wait_s(1, now=0.0) == 1.0
+    assert bucket.wait_s(1, now=1.0) == 0.0
+
+
+def test_parses_per_provider_and_model_limits():
+    governor = _governor(LLM_RATE_LIMITS="openai:gpt-4o=500/30000/16, ollama=0/0/2, bad=1/2")
+    assert governor.overrides == {("openai", "gpt-4o"): (500, 30000, 16), ("ollama", None): (0, 0, 2)}
+    assert governor._budget("ollama", "llama3").limits["max_in_flight"] == 2
+
+
+def test_deadline_miss_raises_governor_timeout():
+    governor = _governor(LLM_RATE_LIMITS="openai=1/0/0", LLM_RATE_DEADLINE_INTERACTIVE_S="0.05")
+    with governor.slot("openai", "gpt-4o", 10):
+        pass
+    try:
+        with governor.slot("openai", "gpt-4o", 10):
+            raise AssertionError("second request within the minute must not be admitted")
+    except GovernorTimeout:
+        pass
+    assert governor.stats()["providers"]["openai:gpt-4o"]["timeouts"] == 1
+
+
+def test_critical_calls_overtake_queued_background_calls():
+    governor = _governor(LLM_RATE_LIMITS="openai=0/0/1")
+    order = []
+
+    def call(priority):
+        with governor.priority(priority), governor.slot("openai", "gpt-4o", 10):
+            order.append(priority)
+
+    with governor.slot("openai", "gpt-4o", 10):  # saturate the single in-flight slot
+        background = threading.Thread(target=call, args=("background",))
+        background.start()
+        time.sleep(0.05)
+        critical = threading.Thread(target=call, args=("critical",))
+        critical.start()
+        time.sleep(0.05)
+    background.join()
+    critical.join()
+
+    assert order == ["critical", "background"]
+
+
+def test_governed_adapter_retries_after_a_429():
+    responses = [ProviderErrorText("I'm sorry: Error code: 429 - rate limit exceeded"), "ok"]
+
+    @governed("openai")
+    def adapter(messages, model, temperature):
+        return responses.pop(0)
+
+    with patch("app.services.rate_governor.rate_governor", _governor(LLM_RATE_429_BACKOFF_S="0.01")) as governor:
+        assert adapter([{"role": "user", "content": "hi"}], "gpt-4o", 0.0) == "ok"
+        assert governor.stats()["providers"]["openai:gpt-4o"]["throttled"] == 1
+
+
+def test_async_governed_adapter_returns_busy_text_on_deadline():
+    @governed("openai")
+    async def adapter(messages, model, temperature):
+        return "ok"
+
+    governor = _governor(LLM_RATE_LIMITS="openai=1/0/0", LLM_RATE_DEADLINE_INTERACTIVE_S="0.05")
+    with patch("app.services.rate_governor.rate_governor", governor):
+        assert asyncio.run(adapter([], "gpt-4o", 0.0)) == "ok"
+        result = asyncio.run(adapter([], "gpt-4o", 0.0))
+
+    assert isinstance(result, GovernorBusyText)
+    assert "busy" in result
@@ -58,3 +58,197 @@ def test_recommend(mock_rec, client, app, seed_data):
     )
     assert res.status_code == 200
     assert len(res.get_json()["recommendations"]) == 1
+
+def test_chat_rejected_when_agent_pool_saturated(client, app, seed_data):
+    token = jwt.encode({"user_id": seed_data["user_id"]}, app.config["SECRET_KEY"], algorithm="HS256")
+
+    with patch("app.routes.chat.agent_pool.has_capacity", return_value=False), \
+         patch("app.routes.chat.agent_pool.retry_after", return_value=7):
+        res = client.post('/api/chat/message',
+            headers={"Authorization": f"Bearer {token}"},
+            json={"message": "Hello", "stream": False}
+        )
+    assert res.status_code == 503
+    assert res.headers["Retry-After"] == "7"
+
+def test_rejected_turn_leaves_no_user_message(client, app, seed_data):
+    from app.models.chat import Message
+    from app.services.worker_pool import PoolSaturated
+    token = jwt.encode({"user_id": seed_data["user_id"]}, app.config["SECRET_KEY"], algorithm="HS256")
+
+    # Capacity pre-check passes, but the slot is gone by the time it is reserved
+    with patch("app.routes.chat.agent_pool.reserve", side_effect=PoolSaturated(3)):
+        res = client.post('/api/chat/message',
+            headers={"Authorization": f"Bearer {token}"},
+            json={"message": "Hello", "stream": True}
+        )
+    assert res.status_code == 503
+    assert Message.query.count() == 0
+
+@patch("app.services.llm_service.generate_ai_response", return_value="Durable reply")
+def test_chat_turn_is_recorded_as_completed_job(mock_gen, client, app, seed_data):
+    from app.models.agent_job import AgentJob
+    token = jwt.encode({"user_id": seed_data["user_id"]}, app.config["SECRET_KEY"], algorithm="HS256")
+
+    res = client.post('/api/chat/message',
+        headers={"Authorization": f"Bearer {token}"},
+        json={"message": "Hello", "stream": False}
+    )
+    assert res.status_code == 200
+
+    job = AgentJob.query.filter_by(conversation_id=res.get_json()["conversation_id"]).one()
+    assert job.status == AgentJob.DONE
+    assert job.attempts == 1
+
+@patch("app.services.llm_service.generate_ai_response", return_value="Once only")
+def test_chat_duplicate_submission_is_coalesced(mock_gen, client, app, seed_data):
+    token = jwt.encode({"user_id": seed_data["user_id"]}, app.config["SECRET_KEY"], algorithm="HS256")
+    headers = {"Authorization": f"Bearer {token}", "Idempotency-Key": "client-retry-1"}
+
+    first = client.post('/api/chat/message', headers=headers, json={"message": "Hello", "stream": False})
+    second = client.post('/api/chat/message', headers=headers, json={"message": "Hello", "stream": True})
+
+    assert first.status_code == 200
+    assert second.status_code == 202
+    assert second.get_json()["coalesced"] is True
+    assert second.get_json()["conversation_id"] == first.get_json()["conversation_id"]
+    assert mock_gen.call_count == 1
+
+@patch("app.services.llm_service.generate_ai_response")
+def test_coalesced_sync_duplicate_returns_its_own_reply(mock_gen, client, app, seed_data):
+    from app import db
+    from app.models.chat import Message
+    token = jwt.encode({"user_id": seed_data["user_id"]}, app.config["SECRET_KEY"], algorithm="HS256")
+    headers = {"Authorization": f"Bearer {token}", "Idempotency-Key": "client-retry-2"}
+    mock_gen.return_value = "First answer"
+
+    first = client.post('/api/chat/message', headers=headers, json={"message": "Hello", "stream": False})
+    conv_id = first.get_json()["conversation_id"]
+    db.session.add(Message(conversation_id=conv_id, content="A later turn", type="bot"))
+    db.session.commit()
+
+    replay = client.post('/api/chat/message', headers=headers, json={"message": "Hello", "stream": False})
+    assert replay.get_json()["message"]["content"] == "First answer"
+    assert replay.get_json()["message"]["id"] == first.get_json()["message"]["id"]
+
+
+def test_racing_duplicate_is_coalesced_by_the_database(client, app, seed_data):
+    from app import db
+    from app.models.agent_job import AgentJob
+    from app.models.chat import Conversation, Message
+    from app.routes.chat import _resolve_idempotency_key
+    from app.services.job_queue import job_queue
+    token = jwt.encode({"user_id": seed_data["user_id"]}, app.config["SECRET_KEY"], algorithm="HS256")
+
+    convo = Conversation(user_id=seed_data["user_id"])
+    db.session.add(convo)
+    db.session.commit()
+    with app.test_request_context():
+        key, _ = _resolve_idempotency_key(seed_data["user_id"], convo.id, "Hello", {})
+    original = job_queue.enqueue(convo.id, seed_data["user_id"], {"message": "Hello"},
+                                 lease=True, idempotency_key=key)
+
+    # The route's pre-checks run before the original commits (a race);
+    # enqueue's own lookup after the unique-index violation still works
+    find = job_queue.find_by_idempotency_key
+    with patch.object(job_queue, "find_by_idempotency_key",
+                      side_effect=lambda *a, **k: None if len(a) > 2 else find(*a, **k)), \
+         patch.object(job_queue, "count_in_flight", return_value=0):
+        res = client.post('/api/chat/message',
+            headers={"Authorization": f"Bearer {token}"},
+            json={"message": "Hello", "conversation_id": convo.id, "stream": True}
+        )
+
+    assert res.status_code == 202
+    assert res.get_json()["coalesced"] is True
+    assert res.get_json()["job_id"] == original.id
+    assert AgentJob.query.count() == 1
+    assert Message.query.count() == 0  # the duplicate's user message was rolled back
+
+
+@patch("app.services.llm_service.generate_ai_response", return_value="Follow-up answer")
+def test_follow_up_accepted_while_a_turn_is_in_flight(mock_gen, client, app, seed_data):
+    from app import db
+    from app.models.chat import Conversation
+    from app.services.job_queue import job_queue
+    token = jwt.encode({"user_id": seed_data["user_id"]}, app.config["SECRET_KEY"], algorithm="HS256")
+
+    convo = Conversation(user_id=seed_data["user_id"])
+    db.session.add(convo)
+    db.session.commit()
+    job_queue.enqueue(convo.id, seed_data["user_id"], {"message": "earlier"}, lease=True)
+
+    res = client.post('/api/chat/message',
+        headers={"Authorization": f"Bearer {token}"},
+        json={"message": "And another thing", "conversation_id": convo.id, "stream": False}
+    )
+    assert res.status_code == 200
+    assert res.get_json()["message"]["content"] == "Follow-up answer"
+
+def test_chat_rejected_when_conversation_is_at_its_in_flight_cap(client, app, seed_data):
+    from app import db
+    from app.models.chat import Conversation, Message
+    from app.services.job_queue import job_queue
+    token = jwt.encode({"user_id": seed_data["user_id"]}, app.config["SECRET_KEY"], algorithm="HS256")
+
+    convo = Conversation(user_id=seed_data["user_id"])
+    db.session.add(convo)
+    db.session.commit()
+    for message in ("first", "second"):
+        job_queue.enqueue(convo.id, seed_data["user_id"], {"message": message}, lease=True)
+
+    res = client.post('/api/chat/message',
+        headers={"Authorization": f"Bearer {token}"},
+        json={"message": "Another one", "conversation_id": convo.id, "stream": True}
+    )
+    assert res.status_code == 429
+    assert res.headers["Retry-After"] == str(res.get_json()["retry_after"])
+    assert Message.query.count() == 0
+
+def test_streaming_turn_publishes_token_events(app, seed_data):
+    from app.models.agent_job import AgentJob
+    from app.models.chat import Conversation
+    from app.routes.chat import execute_agent_job
+    from app.services.job_queue import job_queue
+    from app import db
+
+    def fake_pipeline(message, on_token=None, **kwargs):
+        for delta in ("Hel", "lo!"):
+            on_token(delta)
+        return "Hello!"
+
+    convo = Conversation(user_id=seed_data["user_id"])
+    db.session.add(convo)
+    db.session.commit()
+    job = job_queue.enqueue(convo.id, seed_data["user_id"], {"message": "Hi", "stream": True})
+    job = job_queue.claim("test-worker", job_id=job.id)
+
+    with patch("app.services.llm_service.generate_ai_response", side_effect=fake_pipeline), \
+         patch("app.routes.chat.sse_service.publish") as mock_publish:
+        execute_agent_job(job)
+
+    tokens = [c.kwargs["data"] for c in mock_publish.call_args_list if c.kwargs["event"] == "token"]
+    assert [t["delta"] for t in tokens] == ["Hel", "lo!"]
+    assert [t["index"] for t in tokens] == [0, 1]
+    assert mock_publish.call_args_list[-1].kwargs["event"] == "final_response"
+    assert db.session.get(AgentJob, job.id).status == AgentJob.DONE
+
+def test_post_reply_failure_does_not_rerun_the_turn(app, seed_data):
+    from app.models.agent_job import AgentJob
+    from app.models.chat import Conversation, Message
+    from app.routes.chat import execute_agent_job
+    from app.services.job_queue import job_queue
+    from app import db
+
+    convo = Conversation(user_id=seed_data["user_id"])
+    db.session.add(convo)
+    db.session.commit()
+    job = job_queue.enqueue(convo.id, seed_data["user_id"], {"message": "Hi"})
+    job = job_queue.claim("test-worker", job_id=job.id)
+
+    with patch("app.services.llm_service.generate_ai_response", return_value="Answer"), \
+         patch("app.routes.chat._broadcast_final_response", side_effect=RuntimeError("SSE down")):
+        execute_agent_job(job)
+
+    assert db.session.get(AgentJob, job.id).status == AgentJob.DONE
+    assert Message.query.filter_by(conversation_id=convo.id, type="bot").count() == 1
@@ -69,3 +69,71 @@ def test_sse_cleanup_on_disconnect():
         next(gen)
         
     assert session_id not in service.listeners
+
+def test_sse_heartbeat_tick_pings_idle_subscribers():
+    """Verify the shared ticker pushes a ping into queues that have been silent."""
+    service = SSEService()
+    session_id = "heartbeat-session"
+
+    gen = service.subscribe(session_id)
+    next(gen)
+    subscriber = service.listeners[session_id][0]
+
+    # Nothing is due immediately after subscribing
+    assert service._tick() == (0, 0)
+
+    now = subscriber.last_enqueued + service.HEARTBEAT_INTERVAL_S + 1
+    subscriber.last_active = now
+    assert service._tick(now=now) == (1, 0)
+    assert 'event: ping' in next(gen)
+
+    gen.close()
+    service.shutdown()
+
+def test_sse_stale_subscriber_is_reaped():
+    """Verify that subscribers which stop draining their queue are removed."""
+    service = SSEService()
+    session_id = "stale-session"
+
+    gen = service.subscribe(session_id)
+    next(gen)
+    subscriber = service.listeners[session_id][0]
+
+    pinged, reaped = service._tick(now=subscriber.last_active + service.STALE_AFTER_S + 1)
+    assert reaped == 1
+    assert session_id not in service.listeners
+
+    # The abandoned generator exits cleanly on its next read
+    with pytest.raises(StopIteration):
+        next(gen)
+    service.shutdown()
+
+def test_sse_stats_track_publish_delivery_and_drops():
+    """Verify that stats() reflects subscriptions, deliveries, bytes and drops."""
+    service = SSEService()
+    session_id = "stats-session"
+
+    gen = service.subscribe(session_id)
+    next(gen)
+    service.publish(session_id, "agent_step", {"text": "hi"})
+    frame = next(gen)
+
+    stats = service.stats()
+    assert stats["active_sessions"] == 1
+    assert stats["active_listeners"] == 1
+    assert stats["subscriptions_total"] == 1
+    assert stats["published_total"] == 1
+    assert stats["delivered_total"] == 1
+    assert stats["bytes_written_total"] >= len(frame)
+    assert stats["delivery_lag_ms"]["count"] == 1
+
+    # Overflow the queue to register drops
+    for i in range(service.QUEUE_MAX_SIZE + 3):
+        service.publish(session_id, "flood", {"i": i})
+    stats = service.stats()
+    assert stats["dropped_total"] == 3
+    assert stats["queue_depth"]["buckets"]["<=100"] == 1
+
+    gen.close()
+    assert service.stats()["active_sessions"] == 0
+    service.shutdown()
@@ -1,8 +1,9 @@
 import pytest
 import os
+import json
 from unittest.mock import patch, MagicMock
 from app.services.llm_service import call_vertex_ai_api, generate_ai_response
-from app.services.knowledge_service import cache_manager
+from app.services.knowledge_service import VertexCacheManager, cache_manager
 
 def test_vertex_ai_api_call_mock():
     """Verify that vertex ai api call correctly uses the SDK."""
@@ -52,3 +53,46 @@ def test_vertex_context_cache_creation():
             mock_caching.CachedContent.create.assert_called_once()
             _, kwargs = mock_caching.CachedContent.create.call_args
             assert "gemini" in kwargs['model_name']
+
+def test_vertex_context_cache_is_reused_until_expiry():
+    """Identical content is uploaded once; small prefixes are not cached at all."""
+    manager = VertexCacheManager()
+    with patch('app.services.knowledge_service.vertexai'), \
+         patch('app.services.knowledge_service.caching') as mock_caching:
+        mock_caching.CachedContent.create.return_value.name = "cached_prefix_1"
+
+        assert manager.prefix_cache("gemini-1.5-pro", "x" * 4 * manager.min_tokens) == "cached_prefix_1"
+        assert manager.prefix_cache("gemini-1.5-pro", "x" * 4 * manager.min_tokens) == "cached_prefix_1"
+        assert manager.prefix_cache("gemini-1.5-pro", "short instructions") is None
+
+        mock_caching.CachedContent.create.assert_called_once()
+        assert manager.stats()["hits"] == 1 and manager.stats()["below_minimum"] == 1
+
+def test_vertex_layered_prompt_sends_prefix_as_system_instruction():
+    """The static advisor prefix becomes the Gemini system instruction, the per-user context the prompt."""
+    from app.services.llm_service import _call_provider_adapter, build_system_prompt
+
+    system_prompt = build_system_prompt(json.dumps({"personal_details": {"first_name": "Ann"}}))
+    with patch('app.services.llm_service.call_vertex_ai_api', return_value="ok") as mock_vertex_call:
+        _call_provider_adapter("vertex_ai", "gemini-1.5-pro", 0.7, system_prompt, [], "Hello")
+
+    args, kwargs = mock_vertex_call.call_args
+    assert kwargs["system_instruction"] == system_prompt.prefix
+    assert "Ann" in args[0] and args[0].endswith("User: Hello")
+
+def test_vertex_model_pool_replaces_models_when_the_cache_rotates():
+    """One pooled model per (model, instruction), rebuilt in place when its cache name changes."""
+    from app.services.llm_clients import provider_clients
+    from app.services.llm_service import ADVISOR_INSTRUCTIONS, _vertex_model
+
+    with patch('app.services.llm_service.vertexai'), \
+         patch('app.services.llm_service.GenerativeModel') as mock_model, \
+         patch('app.services.llm_service.cache_manager.prefix_cache', side_effect=["c1", "c1", "c2"]):
+        first = _vertex_model("gemini-1.5-pro", "big instruction")
+        assert _vertex_model("gemini-1.5-pro", "big instruction") is first
+        _vertex_model("gemini-1.5-pro", "big instruction")
+
+    assert [c.kwargs["cached_content"] for c in mock_model.from_cached_content.call_args_list] == ["c1", "c2"]
+    assert sum(key.startswith("vertex_ai:") for key in provider_clients.stats()["keys"]) == 1
+    # The advisor prefix is far below Gemini's context-cache minimum
+    assert len(ADVISOR_INSTRUCTIONS) // 4 < cache_manager.min_tokens
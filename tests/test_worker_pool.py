@@ -0,0 +1,84 @@
+import threading
+import pytest
+from app.services.worker_pool import AgentWorkerPool, PoolSaturated
+
+
+@pytest.fixture
+def pool():
+    p = AgentWorkerPool(max_workers=1, max_queue=3, name="test")
+    yield p
+    p.shutdown()
+
+
+def _blocker(pool):
+    """Occupies the single worker until the returned event is set."""
+    started, release = threading.Event(), threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    pool.submit(block)
+    assert started.wait(5)
+    return release
+
+
+def test_submit_returns_future_result(pool):
+    assert pool.submit(lambda x: x * 2, 21).result(timeout=5) == 42
+
+
+def test_higher_priority_runs_first(pool):
+    release = _blocker(pool)
+    order = []
+    done = [
+        pool.submit(order.append, "background", priority=AgentWorkerPool.PRIORITY_BACKGROUND),
+        pool.submit(order.append, "streaming", priority=AgentWorkerPool.PRIORITY_STREAMING),
+        pool.submit(order.append, "interactive", priority=AgentWorkerPool.PRIORITY_INTERACTIVE),
+    ]
+    release.set()
+    for future in done:
+        future.result(timeout=5)
+
+    assert order == ["interactive", "streaming", "background"]
+
+
+def test_saturated_pool_rejects_with_retry_after(pool):
+    release = _blocker(pool)
+    for _ in range(pool.max_queue):
+        pool.submit(lambda: None)
+
+    assert not pool.has_capacity()
+    with pytest.raises(PoolSaturated) as exc_info:
+        pool.submit(lambda: None)
+    assert exc_info.value.retry_after >= 1
+
+    stats = pool.stats()
+    assert stats["queue_depth"] == pool.max_queue
+    assert stats["in_flight"] == 1
+    assert stats["rejected"] == 1
+    release.set()
+
+
+def test_task_exception_propagates_to_future(pool):
+    def boom():
+        raise ValueError("bad turn")
+
+    with pytest.raises(ValueError):
+        pool.submit(boom).result(timeout=5)
+    assert pool.stats()["failed"] == 1
+
+
+def test_reserved_slot_counts_against_capacity_until_released(pool):
+    release = _blocker(pool)
+    with pool.reserve():
+        for _ in range(pool.max_queue - 1):
+            pool.submit(lambda: None)
+        with pytest.raises(PoolSaturated):
+            pool.submit(lambda: None)
+
+    # Leaving the block unused handed the slot back
+    assert pool.has_capacity()
+    with pool.reserve() as slot:
+        future = slot.submit(lambda: "reserved")
+    release.set()
+    assert future.result(timeout=5) == "reserved"